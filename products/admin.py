@@ -1,17 +1,33 @@
+from django import forms
 from django.contrib import admin
+from django.db import transaction
+from django.db.models import F
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
-from .models import User, Product, Category, ProductDocument, Warehouse, UserProfile
+from . import search, stock
+from .models import User, Product, Category, ProductDocument, Warehouse, UserProfile, StockMovement
+from .pagination import EstimatedCountPaginator
+
+
+class LargeTableAdmin(admin.ModelAdmin):
+    """Список большой таблицы: без полного COUNT(*) и с приблизительным числом строк"""
+    paginator = EstimatedCountPaginator
+    show_full_result_count = False
+    # Счётчики фильтров — отдельный COUNT(*) на каждое значение
+    show_facets = admin.ShowFacets.NEVER
+
 
 class UserProfileInline(admin.StackedInline):
     model = UserProfile
     can_delete = False
     verbose_name_plural = 'Профиль пользователя'
+    autocomplete_fields = ('warehouse',)
 
 class UserAdmin(BaseUserAdmin):
     inlines = (UserProfileInline,)
     list_display = ('username', 'email', 'first_name', 'last_name', 'role', 'is_staff', 'get_warehouse')
     list_filter = ('is_staff', 'is_superuser', 'is_active', 'role', ('profile__warehouse', admin.RelatedFieldListFilter))
-    search_fields = ('username', 'first_name', 'last_name', 'email', 'userprofile__warehouse__name')
+    search_fields = ('username', 'first_name', 'last_name', 'email', 'profile__warehouse__name')
+    list_select_related = ('profile__warehouse',)
     fieldsets = (
         (None, {'fields': ('username', 'password')}),
         ('Персональная информация', {'fields': ('first_name', 'last_name', 'email', 'phone', 'address')}),
@@ -20,7 +36,8 @@ class UserAdmin(BaseUserAdmin):
     )
 
     def get_warehouse(self, obj):
-        return obj.userprofile.warehouse.name if hasattr(obj, 'userprofile') and obj.userprofile.warehouse else '-'
+        profile = getattr(obj, 'profile', None)
+        return profile.warehouse.name if profile and profile.warehouse else '-'
     get_warehouse.short_description = 'Склад'
 
 @admin.register(Warehouse)
@@ -29,28 +46,57 @@ class WarehouseAdmin(admin.ModelAdmin):
     search_fields = ('name', 'address')
     readonly_fields = ('created_at',)
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
     def get_employee_count(self, obj):
-        return obj.userprofile_set.count()
+        return obj.employee_count
     get_employee_count.short_description = 'Количество сотрудников'
+    get_employee_count.admin_order_field = 'employee_count'
 
 @admin.register(Category)
 class CategoryAdmin(admin.ModelAdmin):
     list_display = ('name', 'get_product_count', 'description')
     search_fields = ('name', 'description')
 
+    def get_queryset(self, request):
+        return super().get_queryset(request).with_counts()
+
     def get_product_count(self, obj):
-        return obj.product_set.count()
+        return obj.product_count
     get_product_count.short_description = 'Количество товаров'
+    get_product_count.admin_order_field = 'product_count'
 
 class ProductDocumentInline(admin.TabularInline):
     model = ProductDocument
     extra = 1
+    autocomplete_fields = ('uploaded_by',)
+    raw_id_fields = ('blob',)
+
+class ProductAdminForm(forms.ModelForm):
+    # Остаток на момент открытия формы, как в ProductForm: при POST форма строится заново из базы,
+    # и form.initial уже содержит остаток с учётом движений, проведённых за время редактирования
+    quantity_seen = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
+    class Meta:
+        model = Product
+        fields = '__all__'
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.fields['quantity_seen'].initial = self.instance.quantity
+
 
 @admin.register(Product)
-class ProductAdmin(admin.ModelAdmin):
-    list_display = ('name', 'sku', 'category', 'warehouse', 'price', 'quantity', 'is_active', 'created_by')
+class ProductAdmin(LargeTableAdmin):
+    form = ProductAdminForm
+    list_display = ('name', 'sku', 'category', 'warehouse', 'price', 'quantity', 'get_stock_value', 'is_active',
+                    'created_by')
     list_filter = ('category', 'warehouse', 'is_active', 'created_at')
+    # Поиск идёт по полнотекстовому индексу (get_search_results), поля нужны для автодополнения
     search_fields = ('name', 'sku', 'description')
+    list_select_related = ('category', 'warehouse', 'created_by')
+    autocomplete_fields = ('category', 'warehouse')
     readonly_fields = ('created_at', 'created_by')
     inlines = [ProductDocumentInline]
     fieldsets = (
@@ -58,7 +104,7 @@ class ProductAdmin(admin.ModelAdmin):
             'fields': ('name', 'sku', 'description', 'category', 'warehouse')
         }),
         ('Цена и наличие', {
-            'fields': ('price', 'quantity', 'is_active')
+            'fields': ('price', 'quantity', 'quantity_seen', 'reorder_level', 'is_active')
         }),
         ('Системная информация', {
             'fields': ('created_at', 'created_by'),
@@ -66,16 +112,60 @@ class ProductAdmin(admin.ModelAdmin):
         }),
     )
 
+    def get_queryset(self, request):
+        # Связи загружаются здесь, а не только в списке: __str__ товара показывает склад, и без этого
+        # автодополнение делало бы запрос на каждый товар. ChangeList не добавляет list_select_related
+        # к queryset, где select_related уже задан, поэтому списку передаётся тот же набор связей
+        queryset = super().get_queryset(request).select_related(*self.list_select_related)
+        return queryset.annotate(stock_value=F('price') * F('quantity'))
+
+    def get_search_results(self, request, queryset, search_term):
+        if not search_term:
+            return queryset, False
+        return search.filter_products(queryset, search_term), False
+
+    # Без admin_order_field: сортировка по выражению перебрала бы всю таблицу
+    @admin.display(description='Стоимость остатка')
+    def get_stock_value(self, obj):
+        return obj.stock_value
+
     def save_model(self, request, obj, form, change):
         if not change:  # Если это создание нового объекта
             obj.created_by = request.user
-        super().save_model(request, obj, form, change)
+            with transaction.atomic():
+                super().save_model(request, obj, form, change)
+                stock.record_opening_balances([obj], request.user)
+        else:
+            # Изменение количества проводится корректировкой от остатка, который видел пользователь
+            seen_quantity = form.cleaned_data.get('quantity_seen')
+            if seen_quantity is None:
+                seen_quantity = form.initial['quantity']
+            stock.save_product(obj, seen_quantity, request.user, reason='Изменение в админ-панели')
+
+
+@admin.register(StockMovement)
+class StockMovementAdmin(LargeTableAdmin):
+    list_display = ('created_at', 'product', 'kind', 'quantity', 'reason', 'user')
+    list_filter = ('kind', 'created_at')
+    search_fields = ('product__name', 'product__sku', 'reason')
+    list_select_related = ('product__warehouse', 'user')
+    readonly_fields = ('product', 'kind', 'quantity', 'reason', 'user', 'created_at')
+
+    # Журнал меняется только через products/stock.py, иначе остатки разойдутся с ним
+    def has_add_permission(self, request):
+        return False
+
+    def has_delete_permission(self, request, obj=None):
+        return False
 
 @admin.register(ProductDocument)
-class ProductDocumentAdmin(admin.ModelAdmin):
+class ProductDocumentAdmin(LargeTableAdmin):
     list_display = ('product', 'name', 'uploaded_at')
     list_filter = ('uploaded_at',)
     search_fields = ('product__name', 'name')
+    list_select_related = ('product__warehouse',)
+    autocomplete_fields = ('product', 'uploaded_by')
+    raw_id_fields = ('blob',)
     readonly_fields = ('uploaded_at',)
 
 # Просто регистрируем User с кастомным UserAdmin
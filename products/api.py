@@ -0,0 +1,379 @@
+"""JSON API: товары, категории, склады, пакетная корректировка остатков и загрузка документов частями.
+
+Права доступа совпадают с HTML-представлениями. Поддерживаются выборка
+полей (``?fields=sku,price,quantity``), курсорная пагинация
+(``?cursor=...&limit=...``) и условные запросы: ETag строится из
+``updated_at`` отданных объектов, и при совпадении ``If-None-Match``
+возвращается 304 без сериализации ответа.
+"""
+import json
+from functools import wraps
+
+from django.conf import settings
+from django.db import IntegrityError
+from django.http import JsonResponse
+from django.utils.cache import get_conditional_response, patch_cache_control, patch_vary_headers
+from django.urls import reverse
+from django.utils.http import http_date
+from django.views.decorators.http import require_http_methods, require_POST, require_safe
+
+from . import catalog, permissions, stock, uploads
+from .conditional import make_etag, user_scope
+from .models import Category, DocumentUpload, Product, StockMovement, Warehouse
+from .pagination import InvalidCursor, KeysetPaginator
+from .querybudget import query_budget
+
+DEFAULT_LIMIT = 50
+MAX_LIMIT = 500
+MAX_STOCK_LINES = 10000
+
+# Поле ответа -> (поля модели для only(), функция получения значения)
+PRODUCT_FIELDS = {
+    'id': ((), lambda p: p.pk),
+    'sku': (('sku',), lambda p: p.sku),
+    'name': (('name',), lambda p: p.name),
+    'description': (('description',), lambda p: p.description),
+    'category': (('category_id',), lambda p: p.category_id),
+    'category_name': (('category__name',), lambda p: p.category.name),
+    'warehouse': (('warehouse_id',), lambda p: p.warehouse_id),
+    'warehouse_name': (('warehouse__name',), lambda p: p.warehouse.name if p.warehouse_id else None),
+    'price': (('price',), lambda p: str(p.price)),
+    'quantity': (('quantity',), lambda p: p.quantity),
+    'is_active': (('is_active',), lambda p: p.is_active),
+    'image': (('image',), lambda p: p.image.url if p.image else None),
+    'created_at': ((), lambda p: p.created_at.isoformat()),
+    'updated_at': ((), lambda p: p.updated_at.isoformat()),
+}
+
+
+class ApiError(Exception):
+    def __init__(self, message, status=400):
+        super().__init__(message)
+        self.status = status
+
+
+def api_view(view_func):
+    """Авторизация, обработка ошибок и заголовки кеширования для API"""
+    @wraps(view_func)
+    def wrapper(request, *args, **kwargs):
+        if not request.user.is_authenticated:
+            return JsonResponse({'error': 'Требуется авторизация'}, status=401)
+        try:
+            response = view_func(request, *args, **kwargs)
+        except ApiError as e:
+            return JsonResponse({'error': str(e)}, status=e.status)
+        # Ответ зависит от пользователя: разрешаем кешировать только клиенту и только с проверкой
+        patch_cache_control(response, private=True, no_cache=True)
+        patch_vary_headers(response, ['Cookie'])
+        return response
+    return wrapper
+
+
+def _conditional_json(request, etag, build_payload, last_modified=None):
+    """304, если клиент уже получил эту версию, иначе JSON с ETag"""
+    timestamp = int(last_modified.timestamp()) if last_modified else None
+    not_modified = get_conditional_response(request, etag=etag, last_modified=timestamp)
+    if not_modified is not None:
+        return not_modified
+    response = JsonResponse(build_payload(), json_dumps_params={'ensure_ascii': False})
+    response['ETag'] = etag
+    if timestamp is not None:
+        response['Last-Modified'] = http_date(timestamp)
+    return response
+
+
+def _json_body(request):
+    try:
+        payload = json.loads(request.body)
+    except ValueError:
+        raise ApiError('Тело запроса должно быть в формате JSON')
+    if not isinstance(payload, dict):
+        raise ApiError('Тело запроса должно быть объектом JSON')
+    return payload
+
+
+def _parse_fields(request):
+    value = request.GET.get('fields')
+    if not value:
+        return list(PRODUCT_FIELDS)
+    fields = [name.strip() for name in value.split(',') if name.strip()]
+    unknown = [name for name in fields if name not in PRODUCT_FIELDS]
+    if unknown:
+        raise ApiError(f'Неизвестные поля: {", ".join(unknown)}. Доступны: {", ".join(PRODUCT_FIELDS)}')
+    return fields
+
+
+def _parse_limit(request):
+    try:
+        limit = int(request.GET.get('limit', DEFAULT_LIMIT))
+    except ValueError:
+        raise ApiError('Параметр limit должен быть числом')
+    return max(1, min(limit, MAX_LIMIT))
+
+
+def _only(queryset, fields):
+    """Загрузка только запрошенных столбцов и связей"""
+    # id, created_at и updated_at нужны всегда: для курсора и ETag
+    only = {'created_at', 'updated_at'}
+    for name in fields:
+        only.update(PRODUCT_FIELDS[name][0])
+    queryset = queryset.select_related(None)
+    related = {column.split('__')[0] for column in only if '__' in column}
+    if related:
+        queryset = queryset.select_related(*related)
+    return queryset.only(*only)
+
+
+def _serialize(product, fields):
+    return {name: PRODUCT_FIELDS[name][1](product) for name in fields}
+
+
+@query_budget(6)
+@require_safe
+@api_view
+def product_list(request):
+    """Список товаров с фильтрами каталога: q, category, warehouse"""
+    fields = _parse_fields(request)
+    products, ordering = catalog.filter_catalog(request)
+    products = _only(products, fields)
+
+    paginator = KeysetPaginator(products, _parse_limit(request), ordering)
+    try:
+        page = paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        raise ApiError('Некорректный курсор')
+
+    etag = make_etag(
+        user_scope(request.user), request.GET.urlencode(),
+        *(f'{p.pk}@{p.updated_at.isoformat()}' for p in page),
+    )
+    return _conditional_json(request, etag, lambda: {
+        'results': [_serialize(product, fields) for product in page],
+        'next_cursor': page.next_cursor,
+        'previous_cursor': page.previous_cursor,
+    }, last_modified=max((product.updated_at for product in page), default=None))
+
+
+@query_budget(5)
+@require_safe
+@api_view
+def product_detail(request, pk):
+    fields = _parse_fields(request)
+    queryset = _only(Product.objects.select_related('category', 'warehouse'), fields)
+    # Срез, а не first(): строка одна, ORDER BY по ней добавил бы сортировку во временном B-дереве
+    product = next(iter(catalog.visible_products(request.user, queryset).filter(pk=pk).order_by()[:1]), None)
+    if product is None:
+        raise ApiError('Товар не найден', status=404)
+
+    etag = make_etag(user_scope(request.user), ','.join(fields), product.pk, product.updated_at.isoformat())
+    return _conditional_json(
+        request, etag, lambda: _serialize(product, fields), last_modified=product.updated_at,
+    )
+
+
+@query_budget(4)
+@require_safe
+@api_view
+def category_list(request):
+    categories = list(Category.objects.values('id', 'name', 'description', 'updated_at'))
+    etag = make_etag(*(f'{c["id"]}@{c["updated_at"].isoformat()}' for c in categories))
+    return _conditional_json(request, etag, lambda: {
+        'results': [
+            {**category, 'updated_at': category['updated_at'].isoformat()}
+            for category in categories
+        ],
+    })
+
+
+@query_budget(5)
+@require_safe
+@api_view
+def warehouse_list(request):
+    """Администраторы видят все склады, остальные — только свой"""
+    warehouses = Warehouse.objects.values('id', 'name', 'address', 'updated_at')
+    if not request.user.is_staff:
+        warehouses = warehouses.filter(pk=permissions.warehouse_id(request.user))
+    warehouses = list(warehouses)
+    etag = make_etag(user_scope(request.user), *(f'{w["id"]}@{w["updated_at"].isoformat()}' for w in warehouses))
+    return _conditional_json(request, etag, lambda: {
+        'results': [
+            {**warehouse, 'updated_at': warehouse['updated_at'].isoformat()}
+            for warehouse in warehouses
+        ],
+    })
+
+
+def _parse_stock_lines(payload):
+    lines = payload.get('lines') if isinstance(payload, dict) else None
+    if not isinstance(lines, list) or not lines:
+        raise ApiError('Ожидается объект {"lines": [{"sku": ..., "delta": ...}, ...]}')
+    if len(lines) > MAX_STOCK_LINES:
+        raise ApiError(f'Не более {MAX_STOCK_LINES} строк в одном запросе')
+    parsed = []
+    for line in lines:
+        # Строка — объект {"sku", "delta"} или пара [sku, delta]
+        if isinstance(line, dict):
+            parsed.append((line.get('sku'), line.get('delta')))
+        elif isinstance(line, list) and len(line) == 2:
+            parsed.append(tuple(line))
+        else:
+            parsed.append((None, None))
+    return parsed
+
+
+@require_POST
+@api_view
+def stock_adjust(request):
+    """Пакетное изменение остатков по артикулам (для терминалов сбора данных)
+
+    Тело: ``{"kind": "adjustment", "reason": "...", "lines": [{"sku": ..., "delta": ...}]}``.
+    Права проверяются как в ``edit_product``: администратор меняет остатки
+    любых товаров, остальные — только товаров своего склада.
+    """
+    payload = _json_body(request)
+    lines = _parse_stock_lines(payload)
+    kind = payload.get('kind', StockMovement.ADJUSTMENT)
+    if kind not in dict(StockMovement.KINDS):
+        raise ApiError(f'Неизвестный тип движения: {kind}')
+    reason = str(payload.get('reason', ''))[:200]
+
+    user = request.user
+    if not user.is_staff and not permissions.warehouse_id(user):
+        raise ApiError('Нет прав на изменение остатков', status=403)
+
+    try:
+        results = stock.apply_batch(
+            lines, user, kind, reason,
+            can_manage=lambda warehouse_id: permissions.can_manage_warehouse(user, warehouse_id),
+        )
+    except IntegrityError:
+        # Остаток ушёл бы в минус из-за движения, проведённого параллельно
+        raise ApiError('Остатки изменились во время обработки, повторите запрос', status=409)
+
+    applied = sum(1 for result in results if result['status'] == 'ok')
+    return JsonResponse({
+        'applied': applied,
+        'errors': len(results) - applied,
+        'results': results,
+    }, json_dumps_params={'ensure_ascii': False})
+
+
+def _upload_payload(upload):
+    return {
+        'status': 'pending',
+        'upload_id': str(upload.pk),
+        'url': reverse('api_upload_detail', args=[upload.pk]),
+        'filename': upload.filename,
+        'size': upload.size,
+        'offset': upload.received,
+        'chunk_size': settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
+    }
+
+
+def _document_payload(document):
+    return {
+        'status': 'complete',
+        'document': {
+            'id': document.pk,
+            'name': document.name,
+            'url': reverse('document_download', args=[document.pk]),
+            'sha256': document.blob.sha256,
+            'size': document.blob.size,
+        },
+    }
+
+
+def _offset_conflict(error):
+    return JsonResponse({'error': str(error), 'offset': error.expected}, status=409)
+
+
+def _get_upload(request, upload_id):
+    upload = DocumentUpload.objects.select_related('product').filter(pk=upload_id, user=request.user).first()
+    if upload is None:
+        raise ApiError('Загрузка не найдена', status=404)
+    return upload
+
+
+def _parse_content_range(request, upload):
+    """Смещение и длина части из заголовка ``Content-Range: bytes 0-1048575/5000000``"""
+    value = request.headers.get('Content-Range', '')
+    try:
+        unit, _, spec = value.partition(' ')
+        byte_range, _, total = spec.partition('/')
+        first, _, last = byte_range.partition('-')
+        first, last, total = int(first), int(last), int(total)
+    except ValueError:
+        raise ApiError('Нужен заголовок Content-Range: bytes <начало>-<конец>/<размер>')
+    length = int(request.META.get('CONTENT_LENGTH') or 0)
+    if unit != 'bytes' or total != upload.size or last < first or last - first + 1 != length:
+        raise ApiError('Content-Range не соответствует загрузке или длине тела запроса')
+    return first, length
+
+
+@require_POST
+@api_view
+def upload_start(request, pk):
+    """Начало загрузки документа товара частями
+
+    Тело: ``{"filename": ..., "size": ..., "name": ..., "sha256": ...}``.
+    Возвращается ``upload_id``, по которому части отправляются запросами
+    PUT с заголовком Content-Range; необязательный ``sha256`` сверяется с
+    принятыми данными при завершении.
+    """
+    payload = _json_body(request)
+    product = Product.objects.only('id', 'warehouse_id', 'is_active').filter(pk=pk).first()
+    if product is None:
+        raise ApiError('Товар не найден', status=404)
+    if not permissions.can_upload(request.user, product):
+        raise ApiError('Нет прав на загрузку документов', status=403)
+
+    filename, size = payload.get('filename'), payload.get('size')
+    if not isinstance(filename, str) or not filename.strip():
+        raise ApiError('Не указано имя файла')
+    if isinstance(size, bool) or not isinstance(size, int):
+        raise ApiError('Размер файла должен быть целым числом')
+    sha256 = payload.get('sha256') or ''
+    if not isinstance(sha256, str) or (sha256 and len(sha256) != 64):
+        raise ApiError('sha256 должен быть шестнадцатеричной строкой из 64 символов')
+
+    try:
+        upload = uploads.start(
+            product, request.user, filename.strip(), size, str(payload.get('name') or '')[:200], sha256,
+        )
+    except uploads.UploadError as e:
+        raise ApiError(str(e))
+    return JsonResponse(_upload_payload(upload), status=201)
+
+
+@require_http_methods(['GET', 'HEAD', 'PUT', 'DELETE'])
+@api_view
+def upload_detail(request, upload_id):
+    """Состояние загрузки (GET), приём части (PUT) и отмена загрузки (DELETE)"""
+    upload = _get_upload(request, upload_id)
+    if request.method == 'DELETE':
+        uploads.abort(upload)
+        return JsonResponse({'status': 'aborted'})
+    if request.method == 'PUT':
+        offset, length = _parse_content_range(request, upload)
+        try:
+            # Тело читается из потока по частям: request.body загрузил бы всю часть в память
+            uploads.write_chunk(upload, offset, request, length)
+        except uploads.OffsetMismatch as e:
+            return _offset_conflict(e)
+        except uploads.UploadError as e:
+            raise ApiError(str(e))
+    return JsonResponse(_upload_payload(upload))
+
+
+@require_POST
+@api_view
+def upload_complete(request, upload_id):
+    """Завершение загрузки: проверка SHA-256 и создание документа товара"""
+    upload = _get_upload(request, upload_id)
+    try:
+        document = uploads.complete(upload)
+    except uploads.OffsetMismatch as e:
+        return _offset_conflict(e)
+    except uploads.UploadError as e:
+        raise ApiError(str(e))
+    return JsonResponse(_document_payload(document), status=201)
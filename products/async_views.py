@@ -0,0 +1,119 @@
+"""Асинхронные варианты страниц каталога для развёртывания через ASGI.
+
+Подключаются в ``urls.py`` вместо синхронных, когда ``ASYNC_VIEWS = True``
+(``products/asgi.py`` включает режим через переменную окружения
+``DJANGO_ASYNC_VIEWS``). Данные читаются асинхронным ORM, поэтому
+медленный поиск не занимает поток воркера; фильтры, права доступа и
+контекст шаблонов общие с ``views.py``. Шаблон рендерится в потоке:
+контекстные процессоры обращаются к сессии синхронно. POST-запросы
+(действия с товарами, загрузка документов) передаются синхронным
+представлениям.
+"""
+from functools import wraps
+
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth.decorators import login_required, user_passes_test
+from django.core.exceptions import PermissionDenied
+from django.http import Http404
+from django.shortcuts import render
+
+from . import catalog, permissions, views
+from .conditional import conditional_page
+from .forms import DocumentUploadForm
+from .models import Product, Warehouse
+from .pagination import DEFAULT_ORDERING, InvalidCursor, KeysetPaginator
+from .querybudget import query_budget
+
+arender = sync_to_async(render)
+
+
+def with_user(view_func):
+    """Загрузка пользователя вместе с профилем и складом до обращений к нему из кода и шаблонов"""
+    @wraps(view_func)
+    async def wrapper(request, *args, **kwargs):
+        request.user = await request.auser()
+        return await view_func(request, *args, **kwargs)
+    return wrapper
+
+
+def post_to_sync(sync_view):
+    """Передача POST-запросов синхронному представлению с теми же правами и обработкой форм"""
+    def decorator(view_func):
+        @wraps(view_func)
+        async def wrapper(request, *args, **kwargs):
+            if request.method not in ('GET', 'HEAD'):
+                # Пользователь уже загружен login_required, синхронный код не должен загружать его повторно
+                request.user = await request.auser()
+                return await sync_to_async(sync_view)(request, *args, **kwargs)
+            return await view_func(request, *args, **kwargs)
+        return wrapper
+    return decorator
+
+
+async def _catalog_state(request):
+    products = catalog.base_catalog(request)
+    return views._aggregate_state(await products.aaggregate(**views._state_aggregates()))
+
+
+async def _product_state(request, pk):
+    return views._product_state_from([row async for row in views._product_state_rows(pk)])
+
+
+async def _keyset_page(request, queryset, per_page, ordering=DEFAULT_ORDERING):
+    paginator = KeysetPaginator(queryset, per_page, ordering)
+    try:
+        return await paginator.apage(request.GET.get('cursor'))
+    except InvalidCursor:
+        return await paginator.apage()
+
+
+@query_budget(8)
+@login_required
+@post_to_sync(views.product_list)
+@with_user
+@conditional_page(_catalog_state)
+async def product_list(request):
+    """Страница каталога с фильтрами и поиском"""
+    products, ordering = catalog.filter_catalog(request)
+    page = await _keyset_page(request, products, views.CATALOG_PAGE_SIZE, ordering)
+    context = await sync_to_async(views._product_list_context)(request, page)
+    return await arender(request, 'products/list.html', context)
+
+
+@query_budget(6, POST=9)
+@login_required
+@post_to_sync(views.product_detail)
+@with_user
+@conditional_page(_product_state)
+async def product_detail(request, pk):
+    """Детальная страница товара"""
+    try:
+        product = await views._product_detail_queryset().aget(pk=pk)
+    except Product.DoesNotExist:
+        raise Http404('Товар не найден')
+    if not permissions.can_view(request.user, product):
+        raise PermissionDenied
+
+    return await arender(request, 'products/detail.html', {
+        'product': product,
+        'documents': product.documents.all(),
+        'form': DocumentUploadForm(user=request.user),
+        'upload_chunk_size': settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
+    })
+
+
+@query_budget(5)
+@user_passes_test(lambda u: u.is_staff)
+@with_user
+async def warehouse_detail(request, pk):
+    """Детальная информация о складе"""
+    try:
+        warehouse = await Warehouse.objects.with_counts().aget(pk=pk)
+    except Warehouse.DoesNotExist:
+        raise Http404('Склад не найден')
+    products = Product.objects.filter(warehouse=warehouse).select_related('category')
+    page = await _keyset_page(request, products, views.WAREHOUSE_PAGE_SIZE)
+    employees = [employee async for employee in warehouse.employees.select_related('user')]
+    context = await sync_to_async(views._warehouse_detail_context)(warehouse, page, employees)
+    return await arender(request, 'warehouses/detail.html', context)
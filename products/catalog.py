@@ -0,0 +1,56 @@
+"""Выборка товаров каталога для страниц, API и выгрузки.
+
+Фильтры из GET-параметров (``q``, ``category``, ``warehouse``) и правила
+видимости товаров задаются здесь один раз, поэтому список на странице,
+ответ API и выгруженный файл содержат одни и те же товары.
+"""
+from django.db.models import Q
+
+from . import permissions, search
+from .models import Product
+from .pagination import DEFAULT_ORDERING
+
+SEARCH_ORDERING = ('search_rank', '-created_at', '-id')
+
+
+def visible_products(user, queryset):
+    """Неактивные товары видны только администраторам и сотрудникам их склада"""
+    if user.is_staff:
+        return queryset
+    visible = Q(is_active=True)
+    if permissions.warehouse_id(user):
+        visible |= Q(warehouse_id=permissions.warehouse_id(user))
+    return queryset.filter(visible)
+
+
+def base_catalog(request):
+    """Видимые пользователю товары с фильтрами склада и категории, без поиска"""
+    category_id = request.GET.get('category')
+    warehouse_id = request.GET.get('warehouse')
+
+    products = visible_products(request.user, Product.objects.all())
+
+    # Фильтрация по складу
+    if warehouse_id:
+        products = products.filter(warehouse_id=warehouse_id)
+    elif not request.user.is_staff and permissions.warehouse_id(request.user):
+        products = products.filter(warehouse_id=permissions.warehouse_id(request.user))
+
+    if category_id:
+        products = products.filter(category_id=category_id)
+
+    return products
+
+
+def filter_catalog(request):
+    """Видимые пользователю товары с фильтрами из GET-параметров и порядок их вывода"""
+    query = request.GET.get('q', '').strip()  # Убираем лишние пробелы
+    products = base_catalog(request).select_related('category', 'warehouse')
+
+    ordering = DEFAULT_ORDERING
+    if query:
+        # Полнотекстовый поиск с ранжированием по релевантности
+        products = search.search_products(products, query)
+        ordering = SEARCH_ORDERING
+
+    return products, ordering
@@ -0,0 +1,96 @@
+"""Условные ответы (ETag / Last-Modified) для HTML-страниц.
+
+Декоратор ``conditional_page(state_func)`` до вызова представления
+получает состояние страницы одним дешёвым агрегирующим запросом:
+``state_func(request, *args, **kwargs)`` возвращает пару (время последнего
+изменения показанных объектов, строка-отпечаток) или ``None``, если
+условный ответ невозможен. В ETag дополнительно входят пользователь, его
+роль и склад, версия кеша фрагментов (её увеличивают сигналы при
+удалении объектов), CSRF-секрет и адрес страницы. При совпадении
+``If-None-Match`` / ``If-Modified-Since`` возвращается 304 без рендеринга
+шаблона. Пока в сессии есть непоказанные сообщения или у клиента ещё
+нет CSRF-cookie, страница отдаётся целиком.
+"""
+import hashlib
+from functools import wraps
+
+from asgiref.sync import iscoroutinefunction
+from django.contrib.messages import get_messages
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import http_date
+
+from .fragments import get_version
+from .permissions import warehouse_id
+
+
+def make_etag(*parts):
+    digest = hashlib.md5('|'.join(str(part) for part in parts).encode(), usedforsecurity=False)
+    return f'"{digest.hexdigest()}"'
+
+
+def user_scope(user):
+    """Часть отпечатка, от которой зависит содержимое страниц для пользователя"""
+    return f'{user.pk}:{user.username}:{user.role}:{user.is_staff}:{warehouse_id(user)}'
+
+
+def _csrf_secret(request):
+    """CSRF-секрет, если условный ответ возможен, иначе None"""
+    # Без CSRF-cookie страница выдаст новый секрет, и формы закешированной копии станут недействительны
+    csrf_secret = request.META.get('CSRF_COOKIE')
+    if request.method not in ('GET', 'HEAD') or not csrf_secret or len(get_messages(request)):
+        return None
+    return csrf_secret
+
+
+def _validators(request, csrf_secret, state):
+    """ETag и время изменения страницы или None, если условный ответ невозможен"""
+    if state is None:
+        return None
+    last_modified, fingerprint = state
+    etag = make_etag(
+        fingerprint, user_scope(request.user), get_version(),
+        csrf_secret, request.get_full_path(),
+    )
+    return etag, int(last_modified.timestamp()) if last_modified else None
+
+
+def _finish(response, etag, timestamp):
+    if response.status_code == 200:
+        response['ETag'] = etag
+        if timestamp is not None:
+            response['Last-Modified'] = http_date(timestamp)
+    if response.status_code in (200, 304):
+        # Страницы персональные: браузер хранит копию, но перепроверяет её при каждом заходе
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
+
+
+def conditional_page(state_func):
+    """Условные ответы для представления; у асинхронного представления ``state_func`` тоже асинхронная"""
+    def decorator(view_func):
+        if iscoroutinefunction(view_func):
+            async def wrapper(request, *args, **kwargs):
+                csrf_secret = _csrf_secret(request)
+                state = await state_func(request, *args, **kwargs) if csrf_secret else None
+                validators = _validators(request, csrf_secret, state)
+                if validators is None:
+                    return await view_func(request, *args, **kwargs)
+                etag, timestamp = validators
+                response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+                if response is None:
+                    response = await view_func(request, *args, **kwargs)
+                return _finish(response, etag, timestamp)
+        else:
+            def wrapper(request, *args, **kwargs):
+                csrf_secret = _csrf_secret(request)
+                state = state_func(request, *args, **kwargs) if csrf_secret else None
+                validators = _validators(request, csrf_secret, state)
+                if validators is None:
+                    return view_func(request, *args, **kwargs)
+                etag, timestamp = validators
+                response = get_conditional_response(request, etag=etag, last_modified=timestamp)
+                if response is None:
+                    response = view_func(request, *args, **kwargs)
+                return _finish(response, etag, timestamp)
+        return wraps(view_func)(wrapper)
+    return decorator
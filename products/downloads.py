@@ -0,0 +1,182 @@
+"""Выдача файлов из MEDIA_ROOT с проверкой прав.
+
+Все адреса ``MEDIA_URL`` обслуживает ``media_file``: по пути файла
+находится его владелец (товар, склад или документ) и проверяются права
+как для страниц. Документ товара отдаётся по ``document_download`` с его
+названием в имени файла.
+
+Сами байты передаёт веб-сервер, если указан ``PROTECTED_MEDIA_BACKEND``:
+``nginx`` — заголовок ``X-Accel-Redirect`` на internal-location
+``PROTECTED_MEDIA_INTERNAL_URL``, ``sendfile`` — ``X-Sendfile`` с путём
+файла (Apache mod_xsendfile, lighttpd). Пример для nginx::
+
+    location /protected-media/ {
+        internal;
+        alias /srv/warehouse/media/;
+    }
+
+Без прокси файл отдаёт Django: поддерживаются ``If-Modified-Since`` и
+запросы диапазона (``Range``), поэтому просмотр PDF и докачка работают
+и здесь.
+"""
+import mimetypes
+import os
+import posixpath
+import re
+from urllib.parse import quote
+
+from django.conf import settings
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.http import FileResponse, Http404, HttpResponse, HttpResponseNotModified, StreamingHttpResponse
+from django.shortcuts import get_object_or_404
+from django.utils._os import safe_join
+from django.utils.cache import patch_cache_control
+from django.utils.http import content_disposition_header, http_date
+from django.views.decorators.http import require_safe
+from django.views.static import was_modified_since
+
+from . import images, permissions
+from .models import Product, ProductDocument, Warehouse
+from .querybudget import query_budget
+
+READ_SIZE = 64 * 1024
+RANGE_RE = re.compile(r'^bytes=(\d*)-(\d*)$')
+
+
+def _read_range(path, start, length):
+    with open(path, 'rb') as f:
+        f.seek(start)
+        while length > 0:
+            data = f.read(min(READ_SIZE, length))
+            if not data:
+                break
+            length -= len(data)
+            yield data
+
+
+def _parse_range(request, size, last_modified):
+    """(начало, конец) запрошенного диапазона; None — отдать файл целиком
+
+    Поддерживается один диапазон; несколько диапазонов и неизвестный
+    синтаксис игнорируются, как разрешает RFC 9110. Если начало больше
+    конца, диапазон невыполним (416).
+    """
+    match = RANGE_RE.match(request.headers.get('Range', '').strip())
+    if not match or match.groups() == ('', '') or not size:
+        return None
+    # If-Range: диапазон имеет смысл, только если файл не менялся с прошлой загрузки части
+    if_range = request.headers.get('If-Range')
+    if if_range and if_range != last_modified:
+        return None
+    first, last = match.groups()
+    if not first:
+        # bytes=-500 — последние 500 байт
+        return max(size - int(last), 0), size - 1 if int(last) else -1
+    return int(first), min(int(last), size - 1) if last else size - 1
+
+
+def _local_response(request, path, stat, content_type):
+    """Отдача файла самим Django: 304, 206 или весь файл"""
+    if not was_modified_since(request.headers.get('If-Modified-Since'), int(stat.st_mtime)):
+        return HttpResponseNotModified()
+
+    byte_range = _parse_range(request, stat.st_size, http_date(stat.st_mtime))
+    if byte_range and byte_range[0] > byte_range[1]:
+        response = HttpResponse(status=416)
+        response['Content-Range'] = f'bytes */{stat.st_size}'
+        return response
+
+    if byte_range:
+        start, end = byte_range
+        response = StreamingHttpResponse(_read_range(path, start, end - start + 1),
+                                         status=206, content_type=content_type)
+        response['Content-Range'] = f'bytes {start}-{end}/{stat.st_size}'
+        response['Content-Length'] = end - start + 1
+    else:
+        # FileResponse использует wsgi.file_wrapper: сервер может отдать файл через sendfile()
+        response = FileResponse(open(path, 'rb'), content_type=content_type)
+    return response
+
+
+def serve(request, name, filename=None, as_attachment=False):
+    """Ответ с файлом хранилища ``name`` (права уже проверены)"""
+    try:
+        path = safe_join(settings.MEDIA_ROOT, name)
+        stat = os.stat(path)
+    except (ValueError, OSError):
+        raise Http404('Файл не найден')
+
+    content_type = mimetypes.guess_type(filename or name)[0] or 'application/octet-stream'
+    backend = settings.PROTECTED_MEDIA_BACKEND
+    if backend == 'nginx':
+        response = HttpResponse(content_type=content_type)
+        response['X-Accel-Redirect'] = settings.PROTECTED_MEDIA_INTERNAL_URL + quote(name)
+    elif backend == 'sendfile':
+        response = HttpResponse(content_type=content_type)
+        response['X-Sendfile'] = path
+    elif backend:
+        raise ValueError(f'Неизвестный PROTECTED_MEDIA_BACKEND: {backend}')
+    else:
+        response = _local_response(request, path, stat, content_type)
+
+    if response.status_code in (200, 206):
+        response['Last-Modified'] = http_date(stat.st_mtime)
+        response['Accept-Ranges'] = 'bytes'
+        if filename:
+            response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+    # Файлы доступны не всем: общие кеши их не сохраняют
+    patch_cache_control(response, private=True, max_age=settings.PROTECTED_MEDIA_MAX_AGE)
+    return response
+
+
+def _can_view_products(user, products):
+    products = products.order_by().only('id', 'warehouse_id', 'is_active')
+    return any(permissions.can_view(user, product) for product in products)
+
+
+def _can_view_file(user, name):
+    top = name.split('/', 2)
+    if top[0] == images.DERIVATIVE_ROOT and len(top) > 1:
+        top = top[1:]
+    # Копия доступна тем же, кому её исходник
+    image = images.source_name(name) or name
+    if top[0] == 'products':
+        return _can_view_products(user, Product.objects.filter(image=image))
+    if top[0] == 'warehouses':
+        warehouses = Warehouse.objects.filter(image=image)
+        return any(permissions.can_manage_warehouse(user, pk) for pk in warehouses.values_list('pk', flat=True))
+    if top[0] == 'product_documents':
+        # Одно содержимое может быть прикреплено к нескольким товарам: достаточно прав на любой
+        return _can_view_products(user, Product.objects.filter(documents__file=name))
+    return False
+
+
+@query_budget(4)
+@require_safe
+@login_required
+def media_file(request, name):
+    """Файл из MEDIA_URL, если пользователю виден объект, к которому он относится"""
+    name = posixpath.normpath(name).lstrip('/')
+    if name.startswith('..') or not _can_view_file(request.user, name):
+        # 404, а не 403: существование чужих файлов не раскрывается
+        raise Http404('Файл не найден')
+    return serve(request, name)
+
+
+@query_budget(4)
+@require_safe
+@login_required
+def document_download(request, pk):
+    """Документ товара с его названием в имени файла (``?download`` — сохранить, а не открыть)"""
+    document = get_object_or_404(
+        ProductDocument.objects.select_related('product').only(
+            'file', 'name', 'product__id', 'product__warehouse_id', 'product__is_active',
+        ),
+        pk=pk,
+    )
+    if not permissions.can_view(request.user, document.product):
+        raise PermissionDenied
+    extension = posixpath.splitext(document.file.name)[1]
+    filename = f'{document.name}{extension}' if document.name else posixpath.basename(document.file.name)
+    return serve(request, document.file.name, filename, as_attachment='download' in request.GET)
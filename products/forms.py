@@ -1,5 +1,7 @@
 from django import forms
 from django.contrib.auth.forms import UserCreationForm
+from django.core.validators import FileExtensionValidator
+from . import permissions, reference, uploads
 from .models import Product, ProductDocument, User, Category, Warehouse
 
 
@@ -14,9 +16,13 @@ class RegistrationForm(UserCreationForm):
 
 
 class ProductForm(forms.ModelForm):
+    # Остаток на момент открытия формы: новое количество проводится как разница с ним
+    quantity_seen = forms.IntegerField(widget=forms.HiddenInput, required=False)
+
     class Meta:
         model = Product
-        fields = ['name', 'sku', 'description', 'category', 'warehouse', 'price', 'quantity', 'image', 'is_active']
+        fields = ['name', 'sku', 'description', 'category', 'warehouse', 'price', 'quantity', 'reorder_level', 'image',
+                  'is_active']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
         }
@@ -25,12 +31,16 @@ class ProductForm(forms.ModelForm):
         self.user = kwargs.pop('user', None)
         self.initial_warehouse = kwargs.pop('initial_warehouse', None)
         super().__init__(*args, **kwargs)
+        self.fields['quantity_seen'].initial = self.instance.quantity
+        # Списки категорий и складов берутся из кеша справочников, а не запросом к таблицам
+        for name, items in (('category', reference.categories()), ('warehouse', reference.warehouses())):
+            self.fields[name].choices = reference.choices(self.fields[name], items)
         
         # Если пользователь менеджер
         if self.user and self.user.role == 'manager':
-            if hasattr(self.user, 'profile') and self.user.profile.warehouse:
+            if permissions.warehouse_id(self.user):
                 self.fields['warehouse'].widget = forms.HiddenInput()
-                self.fields['warehouse'].initial = self.user.profile.warehouse
+                self.fields['warehouse'].initial = permissions.warehouse_id(self.user)
             else:
                 self.fields['warehouse'].widget = forms.HiddenInput()
         else:
@@ -43,8 +53,8 @@ class ProductForm(forms.ModelForm):
         cleaned_data = super().clean()
         warehouse = cleaned_data.get('warehouse')
         if self.user and self.user.role == 'manager':
-            if hasattr(self.user, 'profile') and self.user.profile.warehouse:
-                cleaned_data['warehouse'] = self.user.profile.warehouse
+            if permissions.warehouse(self.user):
+                cleaned_data['warehouse'] = permissions.warehouse(self.user)
             else:
                 raise forms.ValidationError('У вас нет привязанного склада. Обратитесь к администратору.')
         elif not warehouse:
@@ -52,6 +62,14 @@ class ProductForm(forms.ModelForm):
         return cleaned_data
 
 
+class ProductImportForm(forms.Form):
+    file = forms.FileField(
+        label='Файл',
+        validators=[FileExtensionValidator(['csv', 'xlsx'])],
+        help_text='CSV или XLSX со столбцами: name, sku, description, category, warehouse, price, quantity, is_active',
+    )
+
+
 class DocumentUploadForm(forms.ModelForm):
     class Meta:
         model = ProductDocument
@@ -68,6 +86,10 @@ class DocumentUploadForm(forms.ModelForm):
         document = super().save(commit=False)
         if self.user:
             document.uploaded_by = self.user
+        # Содержимое хранится по хешу: повторно загруженный файл не копируется
+        document.blob = uploads.store_uploaded_file(self.cleaned_data['file'])
+        document.file = document.blob.file.name
+        document.name = document.name or self.cleaned_data['file'].name
         if commit:
             document.save()
         return document
@@ -76,7 +98,7 @@ class DocumentUploadForm(forms.ModelForm):
 class CategoryForm(forms.ModelForm):
     class Meta:
         model = Category
-        fields = ['name', 'description']
+        fields = ['name', 'description', 'reorder_level']
         widgets = {
             'description': forms.Textarea(attrs={'rows': 3}),
         }
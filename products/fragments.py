@@ -0,0 +1,24 @@
+"""Версия кеша фрагментов каталога.
+
+Карточки товаров и строки таблицы склада кешируются тегом ``{% cache %}``
+в кеше ``fragments`` с ключом из id товара, ``updated_at``, роли
+пользователя и общей версии. Версия хранится в общем кеше ``default`` и
+увеличивается сигналами при сохранении и удалении товаров, категорий и
+складов, после чего все процессы перестают использовать старые фрагменты.
+"""
+from . import versions
+
+VERSION_KEY = 'catalog:fragments:version'
+
+
+def get_version():
+    return versions.get(VERSION_KEY)
+
+
+def bump_version():
+    versions.bump(VERSION_KEY)
+
+
+def card_role(user):
+    """Роль, от которой зависит содержимое карточки товара"""
+    return 'staff' if user.is_staff else 'user'
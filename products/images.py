@@ -0,0 +1,124 @@
+"""Производные изображения: уменьшенные копии в WebP/AVIF/JPEG.
+
+Для каждого загруженного изображения товара или склада создаются копии
+шириной ``DERIVATIVE_WIDTHS`` в каталоге ``derivatives/`` хранилища.
+Генерация идёт в ограниченном пуле потоков после коммита транзакции,
+не задерживая ответ пользователю; существующие файлы досоздаются командой
+``generate_image_derivatives``. Шаблонный тег ``responsive_image`` выводит
+``<picture>`` с ``srcset``, пока копий нет — исходное изображение.
+"""
+import logging
+import re
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from io import BytesIO
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.core.files.storage import default_storage
+from PIL import Image, ImageOps, features
+
+from .fragments import bump_version
+
+logger = logging.getLogger(__name__)
+
+DERIVATIVE_ROOT = 'derivatives'
+DERIVATIVE_WIDTHS = (320, 640, 1280)
+# Формат, MIME-тип, параметры сохранения Pillow
+FORMATS = [
+    ('webp', 'image/webp', {'format': 'WEBP', 'quality': 80, 'method': 4}),
+    ('jpg', 'image/jpeg', {'format': 'JPEG', 'quality': 82, 'optimize': True, 'progressive': True}),
+]
+if features.check('avif'):
+    FORMATS.insert(0, ('avif', 'image/avif', {'format': 'AVIF', 'quality': 60}))
+
+MAX_PENDING = getattr(settings, 'IMAGE_DERIVATIVE_MAX_PENDING', 100)
+
+_executor = None
+_executor_lock = threading.Lock()
+_pending = threading.BoundedSemaphore(MAX_PENDING)
+
+
+# Имя исходника сохраняется с расширением: у foo.jpg и foo.png разные копии
+DERIVATIVE_RE = re.compile(rf'^{DERIVATIVE_ROOT}/(?P<source>.+)_\d+\.\w+$')
+
+
+def derivative_name(name, width, extension):
+    return f'{DERIVATIVE_ROOT}/{name}_{width}.{extension}'
+
+
+def source_name(name):
+    """Имя исходного изображения для копии ``name`` или None, если это не копия"""
+    match = DERIVATIVE_RE.match(name)
+    return match['source'] if match else None
+
+
+def has_derivatives(name):
+    # Файлы пишутся по порядку, поэтому наличие последнего означает наличие всех
+    extension = FORMATS[-1][0]
+    return default_storage.exists(derivative_name(name, DERIVATIVE_WIDTHS[-1], extension))
+
+
+def generate_derivatives(name):
+    """Создание всех производных копий изображения ``name``"""
+    with default_storage.open(name, 'rb') as source:
+        image = Image.open(source)
+        image = ImageOps.exif_transpose(image)
+        image.load()
+    if image.mode not in ('RGB', 'RGBA'):
+        image = image.convert('RGBA' if 'transparency' in image.info else 'RGB')
+
+    for width in DERIVATIVE_WIDTHS:
+        resized = image.copy()
+        # Изображение не увеличивается: узкий исходник сохраняется в своём размере
+        resized.thumbnail((width, width * 10), Image.LANCZOS)
+        for extension, _, options in FORMATS:
+            frame = resized.convert('RGB') if extension == 'jpg' else resized
+            buffer = BytesIO()
+            frame.save(buffer, **options)
+            path = derivative_name(name, width, extension)
+            if default_storage.exists(path):
+                default_storage.delete(path)
+            default_storage.save(path, ContentFile(buffer.getvalue()))
+
+
+def storage_url(name, width, extension):
+    return default_storage.url(derivative_name(name, width, extension))
+
+
+def srcset(name, extension):
+    return ', '.join(
+        f'{storage_url(name, width, extension)} {width}w'
+        for width in DERIVATIVE_WIDTHS
+    )
+
+
+def _get_executor():
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(
+                max_workers=getattr(settings, 'IMAGE_DERIVATIVE_WORKERS', 2),
+                thread_name_prefix='image-derivatives',
+            )
+        return _executor
+
+
+def _run(name):
+    try:
+        generate_derivatives(name)
+        # Закешированные карточки ещё ссылаются на исходное изображение
+        bump_version()
+    except Exception:
+        logger.exception('Не удалось создать копии изображения %s', name)
+    finally:
+        _pending.release()
+
+
+def schedule(name):
+    """Постановка генерации копий в фоновый пул"""
+    if not _pending.acquire(blocking=False):
+        # Очередь переполнена — копии досоздаст команда generate_image_derivatives
+        logger.warning('Очередь обработки изображений заполнена, пропущено: %s', name)
+        return
+    _get_executor().submit(_run, name)
@@ -0,0 +1,251 @@
+"""Пакетный импорт товаров из CSV/XLSX.
+
+Файл читается построчно, строки проверяются пачками: категории и склады
+загружаются один раз, занятость артикулов проверяется одним запросом
+``sku IN (...)`` на пачку, недостающие артикулы резервируются блоком.
+Корректные строки вставляются ``bulk_create`` внутри одной транзакции,
+по ошибочным строкам возвращается отчёт. Если артикул успели занять
+между проверкой и вставкой, пачка повторяется построчно, и в отчёт
+попадают только строки с занятыми артикулами.
+"""
+import csv
+import io
+from dataclasses import dataclass, field
+from decimal import Decimal, InvalidOperation
+
+from django.db import IntegrityError, transaction
+
+from . import fragments, permissions, search, stock, valuation
+from .models import Category, Product, Warehouse
+from .sku import allocate_skus
+
+BATCH_SIZE = 1000
+MAX_REPORTED_ERRORS = 500
+
+# Допустимые заголовки столбцов (английские и русские)
+COLUMNS = {
+    'name': 'name', 'название': 'name',
+    'sku': 'sku', 'артикул': 'sku',
+    'description': 'description', 'описание': 'description',
+    'category': 'category', 'категория': 'category',
+    'warehouse': 'warehouse', 'склад': 'warehouse',
+    'price': 'price', 'цена': 'price',
+    'quantity': 'quantity', 'количество': 'quantity',
+    'is_active': 'is_active', 'активен': 'is_active',
+}
+FALSE_VALUES = {'0', 'false', 'no', 'нет', 'n'}
+
+
+class ImportFormatError(Exception):
+    pass
+
+
+@dataclass
+class ImportResult:
+    created: int = 0
+    error_count: int = 0
+    errors: list = field(default_factory=list)
+
+    def add_error(self, line, message):
+        self.error_count += 1
+        if len(self.errors) < MAX_REPORTED_ERRORS:
+            self.errors.append((line, message))
+
+
+def _normalize_header(header):
+    return [COLUMNS.get((name or '').strip().lower()) for name in header]
+
+
+def _read_csv(uploaded_file):
+    stream = io.TextIOWrapper(uploaded_file, encoding='utf-8-sig', newline='')
+    first_line = stream.readline()
+    # Excel в русской локали сохраняет CSV с разделителем «;»
+    delimiter = ';' if first_line.count(';') > first_line.count(',') else ','
+    header = next(csv.reader([first_line], delimiter=delimiter), [])
+    yield header
+    yield from csv.reader(stream, delimiter=delimiter)
+
+
+def _read_xlsx(uploaded_file):
+    try:
+        from openpyxl import load_workbook
+    except ImportError:
+        raise ImportFormatError('Для импорта XLSX установите пакет openpyxl')
+    workbook = load_workbook(uploaded_file, read_only=True, data_only=True)
+    try:
+        for row in workbook.active.iter_rows(values_only=True):
+            yield ['' if value is None else str(value) for value in row]
+    finally:
+        workbook.close()
+
+
+def read_rows(uploaded_file):
+    """Построчное чтение загруженного файла: (номер строки, словарь значений)"""
+    name = uploaded_file.name.lower()
+    if name.endswith('.xlsx'):
+        rows = _read_xlsx(uploaded_file)
+    elif name.endswith('.csv'):
+        rows = _read_csv(uploaded_file.file)
+    else:
+        raise ImportFormatError('Поддерживаются только файлы CSV и XLSX')
+
+    try:
+        header = _normalize_header(next(rows))
+    except StopIteration:
+        raise ImportFormatError('Файл пуст')
+    if 'name' not in header or 'price' not in header or 'category' not in header:
+        raise ImportFormatError('В файле должны быть столбцы name (название), category (категория) и price (цена)')
+
+    for line, values in enumerate(rows, start=2):
+        if not any(value.strip() for value in values):
+            continue
+        yield line, {
+            column: value.strip()
+            for column, value in zip(header, values)
+            if column
+        }
+
+
+class ProductImporter:
+    """Импорт товаров с учётом прав пользователя на склады"""
+
+    def __init__(self, user, batch_size=BATCH_SIZE):
+        self.user = user
+        self.batch_size = batch_size
+        self.categories = self._lookup(Category.objects.values_list('id', 'name'))
+        self.warehouses = self._lookup(Warehouse.objects.values_list('id', 'name'))
+        # Менеджер может импортировать товары только на свой склад (как в ProductForm)
+        self.own_warehouse_id = permissions.warehouse_id(user) if user.role == 'manager' else None
+
+    @staticmethod
+    def _lookup(rows):
+        lookup = {}
+        for pk, name in rows:
+            lookup[str(pk)] = pk
+            lookup[name.strip().lower()] = pk
+        return lookup
+
+    def run(self, rows):
+        result = ImportResult()
+        # Артикулы из уже прочитанных строк файла: повтор в другой пачке тоже ошибка файла
+        self.seen_skus = set()
+        if self.user.role == 'manager' and not self.own_warehouse_id:
+            result.add_error(0, 'У вас нет привязанного склада. Обратитесь к администратору.')
+            return result
+
+        with transaction.atomic():
+            batch = []
+            for line, data in rows:
+                batch.append((line, data))
+                if len(batch) >= self.batch_size:
+                    self._import_batch(batch, result)
+                    batch = []
+            if batch:
+                self._import_batch(batch, result)
+            if result.created:
+                # bulk_create не отправляет сигналы: сбрасываем кеш страниц вручную
+                transaction.on_commit(fragments.bump_version)
+        return result
+
+    def _build_product(self, data):
+        errors = []
+        name = data.get('name', '')
+        if not name:
+            errors.append('не указано название')
+
+        category_id = self.categories.get(data.get('category', '').lower())
+        if not category_id:
+            errors.append(f'категория "{data.get("category", "")}" не найдена')
+
+        warehouse_value = data.get('warehouse', '')
+        warehouse_id = self.warehouses.get(warehouse_value.lower()) if warehouse_value else None
+        if self.own_warehouse_id:
+            if warehouse_value and warehouse_id != self.own_warehouse_id:
+                errors.append('можно импортировать товары только на свой склад')
+            warehouse_id = self.own_warehouse_id
+        elif not warehouse_id:
+            errors.append(f'склад "{warehouse_value}" не найден' if warehouse_value else 'не указан склад')
+
+        try:
+            price = Decimal(data.get('price', '').replace(',', '.').replace(' ', ''))
+            if not price.is_finite() or price < 0 or price >= 10 ** 8 or price.as_tuple().exponent < -2:
+                raise InvalidOperation
+        except InvalidOperation:
+            errors.append(f'некорректная цена "{data.get("price", "")}"')
+            price = None
+
+        try:
+            quantity = int(data.get('quantity') or 0)
+            if quantity < 0:
+                raise ValueError
+        except ValueError:
+            errors.append(f'некорректное количество "{data.get("quantity")}"')
+            quantity = None
+
+        if errors:
+            return None, errors
+        return Product(
+            name=name[:200],
+            sku=data.get('sku', ''),
+            description=data.get('description', ''),
+            category_id=category_id,
+            warehouse_id=warehouse_id,
+            price=price,
+            quantity=quantity,
+            is_active=data.get('is_active', '').lower() not in FALSE_VALUES,
+            created_by=self.user,
+        ), []
+
+    def _existing_skus(self, skus):
+        return set(Product.objects.filter(sku__in=skus).values_list('sku', flat=True))
+
+    def _insert(self, products):
+        created = Product.objects.bulk_create(products)
+        stock.record_opening_balances(created, self.user)
+        valuation.products_added(created)
+        search.index_products([product.pk for product in created])
+        return created
+
+    def _import_batch(self, batch, result):
+        candidates = []
+        for line, data in batch:
+            product, errors = self._build_product(data)
+            if product and product.sku:
+                if len(product.sku) > 50:
+                    errors.append('артикул длиннее 50 символов')
+                elif product.sku in self.seen_skus:
+                    errors.append(f'артикул {product.sku} повторяется в файле')
+                self.seen_skus.add(product.sku)
+            if errors:
+                result.add_error(line, '; '.join(errors))
+            else:
+                candidates.append((line, product))
+
+        existing = self._existing_skus([p.sku for _, p in candidates if p.sku])
+        rows = []
+        for line, product in candidates:
+            if product.sku in existing:
+                result.add_error(line, f'товар с артикулом {product.sku} уже существует')
+                continue
+            rows.append((line, product))
+
+        # Артикулы для строк без артикула резервируются одним обращением к счётчику
+        without_sku = [product for _, product in rows if not product.sku]
+        for product, sku in zip(without_sku, allocate_skus(len(without_sku))):
+            product.sku = sku
+
+        try:
+            with transaction.atomic():
+                created = self._insert([product for _, product in rows])
+        except IntegrityError:
+            # Артикул заняли после проверки (параллельный импорт или сохранение): пачка повторяется построчно
+            created = []
+            for line, product in rows:
+                # Часть пачки могла получить id до отката
+                product.pk, product._state.adding = None, True
+                try:
+                    with transaction.atomic():
+                        created += self._insert([product])
+                except IntegrityError:
+                    result.add_error(line, f'товар с артикулом {product.sku} уже существует')
+        result.created += len(created)
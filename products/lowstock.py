@@ -0,0 +1,121 @@
+"""Уведомления менеджеров складов о товарах с низким остатком.
+
+Минимальный остаток задаётся у товара, а если он пуст — у категории.
+Товары ниже минимума ищутся одним запросом на склад (UNION ALL) по частичным
+индексам ``product_below_reorder_idx`` и ``product_category_reorder_idx``,
+поэтому стоимость проверки растёт с числом товаров с низким остатком, а
+не с размером каталога, и её можно запускать каждую минуту.
+
+Каждый менеджер склада (``UserProfile.warehouse``) получает одно письмо
+со всеми новыми товарами своего склада. Отправленное уведомление
+запоминается в ``LowStockAlert`` и не повторяется, пока остаток не
+поднимется выше минимума: тогда запись удаляется, и следующее снижение
+снова попадёт в письмо. Записи создаются только после отправки писем, так
+что сбой почтового сервера приводит к повторной попытке, а не к потере
+уведомления.
+"""
+from collections import defaultdict, namedtuple
+
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.mail import EmailMessage, get_connection
+from django.db.models import F, Q
+from django.template.loader import render_to_string
+
+from . import reference
+from .models import Category, LowStockAlert, Product
+
+LowItem = namedtuple('LowItem', ['id', 'name', 'sku', 'quantity', 'reorder_level'])
+ScanResult = namedtuple('ScanResult', ['found', 'notified', 'recovered', 'digests'])
+# Частей в одном UNION ALL: SQLite ограничивает составной SELECT 500 частями
+MAX_UNION = 200
+
+
+def category_levels():
+    """Минимальные остатки категорий: {id категории: минимум}"""
+    return dict(Category.objects.filter(reorder_level__isnull=False).values_list('id', 'reorder_level'))
+
+
+def below_threshold(warehouse_id, levels):
+    """Активные товары склада с остатком не выше минимума"""
+    # UNION ALL, а не OR: без статистики ANALYZE SQLite выбирает для OR индекс по складу
+    # и перебирает все его товары, а каждая часть объединения идёт по своему частичному индексу
+    products = Product.objects.filter(warehouse_id=warehouse_id, is_active=True).order_by().values_list(
+        'id', 'name', 'sku', 'quantity', 'reorder_level', 'category_id')
+    parts = [products.filter(quantity__lte=F('reorder_level'))] + [
+        products.filter(reorder_level__isnull=True, category_id=category_id, quantity__lte=level)
+        for category_id, level in levels.items()
+    ]
+    items = []
+    for start in range(0, len(parts), MAX_UNION):
+        rows = parts[start].union(*parts[start + 1:start + MAX_UNION], all=True)
+        items += [
+            LowItem(pk, name, sku, quantity, reorder_level if reorder_level is not None else levels[category_id])
+            for pk, name, sku, quantity, reorder_level, category_id in rows
+        ]
+    return items
+
+
+def managers():
+    """Адреса менеджеров по складам: {id склада: [email, ...]}"""
+    users = (
+        get_user_model().objects.filter(Q(role='manager') | Q(is_staff=True), is_active=True,
+                                        profile__warehouse__isnull=False)
+        .exclude(email='')
+        .values_list('profile__warehouse_id', 'email')
+    )
+    recipients = defaultdict(list)
+    for warehouse_id, email in users:
+        recipients[warehouse_id].append(email)
+    return recipients
+
+
+def _digest(warehouse_name, items, recipients):
+    limit = settings.LOW_STOCK_DIGEST_LIMIT
+    items = sorted(items, key=lambda item: (item.quantity, item.name))
+    body = render_to_string('emails/low_stock.txt', {
+        'warehouse': warehouse_name,
+        'items': items[:limit],
+        'more': max(len(items) - limit, 0),
+    })
+    subject = f'Низкий остаток на складе «{warehouse_name}»: {len(items)} товаров'
+    return [EmailMessage(subject, body, to=[email]) for email in recipients]
+
+
+def scan(send=True):
+    """Проверка всех складов; ``send=False`` — только подсчёт, без писем и записей"""
+    levels = category_levels()
+    recipients = managers()
+    names = {item.id: item.name for item in reference.warehouses()}
+    # Склады с уведомлениями проверяются и без менеджеров: восстановившиеся товары снимаются с учёта
+    warehouse_ids = recipients.keys() | set(
+        LowStockAlert.objects.order_by().values_list('warehouse_id', flat=True).distinct())
+
+    found = recovered = 0
+    messages, alerts = [], []
+    for warehouse_id in sorted(warehouse_ids):
+        items = {item.id: item for item in below_threshold(warehouse_id, levels)}
+        alerted = set(LowStockAlert.objects.filter(warehouse_id=warehouse_id).values_list('product_id', flat=True))
+        found += len(items)
+
+        gone = alerted - items.keys()
+        if gone and send:
+            LowStockAlert.objects.filter(product_id__in=gone).delete()
+        recovered += len(gone)
+
+        new = [items[pk] for pk in items.keys() - alerted]
+        # Без получателей уведомление не считается отправленным
+        if not new or not recipients.get(warehouse_id):
+            continue
+        messages += _digest(names.get(warehouse_id, str(warehouse_id)), new, recipients[warehouse_id])
+        alerts += [
+            LowStockAlert(product_id=item.id, warehouse_id=warehouse_id, quantity=item.quantity,
+                          reorder_level=item.reorder_level)
+            for item in new
+        ]
+
+    if send and messages:
+        # Все письма одного запуска отправляются через одно соединение
+        get_connection().send_messages(messages)
+        LowStockAlert.objects.bulk_create(alerts, batch_size=1000, ignore_conflicts=True)
+    return ScanResult(found=found, notified=len(alerts), recovered=recovered, digests=len(messages))
@@ -0,0 +1,153 @@
+import json
+import platform
+import statistics
+import time
+import tracemalloc
+from pathlib import Path
+
+import django
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product, ProductDocument, User, Warehouse
+
+
+def percentile(values, percent):
+    ordered = sorted(values)
+    index = min(len(ordered) - 1, max(0, round(percent / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+class Command(BaseCommand):
+    help = 'Замер времени ответа, числа SQL-запросов и пиковой памяти основных страниц'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--warmup', type=int, default=2)
+        parser.add_argument('--user', help='Имя пользователя (по умолчанию — первый суперпользователь)')
+        parser.add_argument('--host', default='localhost', help='Значение заголовка Host для тестового клиента')
+        parser.add_argument('--search', default='чай', help='Поисковый запрос для сценария поиска')
+        parser.add_argument('--only', nargs='*', help='Запустить только перечисленные сценарии')
+        parser.add_argument('--output', help='Файл для сохранения результатов в JSON')
+        parser.add_argument('--compare', help='JSON с результатами предыдущего запуска для сравнения')
+
+    def handle(self, *args, **options):
+        user = self.get_user(options['user'])
+        client = Client(raise_request_exception=False, HTTP_HOST=options['host'])
+        client.force_login(user)
+
+        scenarios = self.scenarios(options['search'])
+        if options['only']:
+            scenarios = {name: url for name, url in scenarios.items() if name in options['only']}
+
+        results = {}
+        for name, url in scenarios.items():
+            results[name] = self.measure(client, url, options['iterations'], options['warmup'])
+            self.report(name, results[name])
+
+        report = {
+            'created_at': timezone.now().isoformat(),
+            'python': platform.python_version(),
+            'django': django.get_version(),
+            'database': connection.vendor,
+            'rows': {
+                'warehouses': Warehouse.objects.count(),
+                'categories': Category.objects.count(),
+                'users': User.objects.count(),
+                'products': Product.objects.count(),
+                'documents': ProductDocument.objects.count(),
+            },
+            'iterations': options['iterations'],
+            'results': results,
+        }
+        if options['output']:
+            Path(options['output']).write_text(json.dumps(report, ensure_ascii=False, indent=2), encoding='utf-8')
+            self.stdout.write(self.style.SUCCESS(f'Результаты сохранены в {options["output"]}'))
+        if options['compare']:
+            self.compare(json.loads(Path(options['compare']).read_text(encoding='utf-8')), report)
+
+    def get_user(self, username):
+        if username:
+            try:
+                return User.objects.get(username=username)
+            except User.DoesNotExist:
+                raise CommandError(f'Пользователь "{username}" не найден')
+        user = User.objects.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError('Нет суперпользователя, укажите --user')
+        return user
+
+    def scenarios(self, query):
+        product = Product.objects.order_by('-created_at').first()
+        warehouse = Warehouse.objects.order_by('pk').first()
+        scenarios = {
+            'product_list': reverse('product_list'),
+            'product_search': f'{reverse("product_list")}?q={query}',
+            'category_list': reverse('category_list'),
+            'warehouse_list': reverse('warehouse_list'),
+            'admin_product_changelist': reverse('admin:products_product_changelist'),
+            'admin_category_changelist': reverse('admin:products_category_changelist'),
+            'admin_warehouse_changelist': reverse('admin:products_warehouse_changelist'),
+            'admin_user_changelist': reverse('admin:products_user_changelist'),
+        }
+        if product:
+            scenarios['product_detail'] = reverse('product_detail', args=[product.pk])
+        if warehouse:
+            scenarios['warehouse_detail'] = reverse('warehouse_detail', args=[warehouse.pk])
+        return scenarios
+
+    def measure(self, client, url, iterations, warmup):
+        for _ in range(warmup):
+            client.get(url)
+
+        timings = []
+        queries = 0
+        status = None
+        for _ in range(iterations):
+            with CaptureQueriesContext(connection) as context:
+                start = time.perf_counter()
+                response = client.get(url)
+                timings.append((time.perf_counter() - start) * 1000)
+            queries = len(context.captured_queries)
+            status = response.status_code
+
+        # Память меряется отдельным проходом: tracemalloc заметно искажает время
+        tracemalloc.start()
+        response = client.get(url)
+        _, peak = tracemalloc.get_traced_memory()
+        tracemalloc.stop()
+
+        return {
+            'url': url,
+            'status': status,
+            'p50_ms': round(percentile(timings, 50), 2),
+            'p95_ms': round(percentile(timings, 95), 2),
+            'p99_ms': round(percentile(timings, 99), 2),
+            'mean_ms': round(statistics.mean(timings), 2),
+            'queries': queries,
+            'peak_memory_kb': round(peak / 1024, 1),
+            'response_kb': round(len(response.content) / 1024, 1),
+        }
+
+    def report(self, name, result):
+        self.stdout.write(
+            f'{name:28} {result["status"]}  p50 {result["p50_ms"]:8.1f} мс  p95 {result["p95_ms"]:8.1f} мс  '
+            f'p99 {result["p99_ms"]:8.1f} мс  SQL {result["queries"]:4}  память {result["peak_memory_kb"]:9.1f} КБ'
+        )
+
+    def compare(self, previous, current):
+        self.stdout.write('\nСравнение с предыдущим запуском (p95, SQL):')
+        for name, result in current['results'].items():
+            before = previous.get('results', {}).get(name)
+            if not before:
+                continue
+            change = (result['p95_ms'] - before['p95_ms']) / before['p95_ms'] * 100 if before['p95_ms'] else 0
+            style = self.style.ERROR if change > 10 else self.style.SUCCESS
+            self.stdout.write(style(
+                f'{name:28} {before["p95_ms"]:8.1f} → {result["p95_ms"]:8.1f} мс ({change:+.0f}%)  '
+                f'SQL {before["queries"]} → {result["queries"]}'
+            ))
@@ -0,0 +1,175 @@
+import re
+from contextlib import ExitStack
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.test import Client
+from django.test.utils import CaptureQueriesContext, setup_test_environment, teardown_test_environment
+from django.urls import reverse
+
+from products.models import Product
+from products.pagination import KeysetPaginator
+
+# Признаки полного прохода по таблице в плане SQLite и PostgreSQL
+SQLITE_FULL_SCAN = re.compile(r'\bSCAN (\w+)\b(?! USING (?:COVERING )?INDEX)(?!.*VIRTUAL TABLE)')
+# Виртуальная таблица FTS5 без ограничения MATCH (в idxStr нет «M») — полный проход по индексу
+SQLITE_VIRTUAL_SCAN = re.compile(r'\bSCAN (\w+) VIRTUAL TABLE INDEX \d+:(?!\S*M)')
+SQLITE_TEMP_SORT = re.compile(r'USE TEMP B-TREE FOR (?:ORDER BY|RIGHT PART OF ORDER BY)')
+POSTGRES_FULL_SCAN = re.compile(r'Seq Scan on (\w+)')
+
+TABLE_RE = re.compile(r'\bFROM "?(\w+)')
+SUBQUERY_RE = re.compile(r'\([^()]*\)')
+
+# Небольшие справочники, полный проход по которым допустим
+ALLOWED_SCANS = {'products_category', 'products_warehouse', 'CONSTANT'}
+
+
+class Command(BaseCommand):
+    help = ('Проверка планов запросов представлений (EXPLAIN) на полные проходы по таблицам: '
+            'страницы открываются тестовым клиентом, проверяются выполненные ими SELECT')
+
+    def add_arguments(self, parser):
+        parser.add_argument('--user', help='Пользователь, от имени которого открываются страницы '
+                                           '(по умолчанию первый суперпользователь)')
+        parser.add_argument('--verbose-plans', action='store_true', help='Печатать планы целиком')
+        parser.add_argument('--fail', action='store_true', help='Завершиться с ошибкой при найденных проблемах')
+
+    def handle(self, *args, **options):
+        problems = 0
+        for name, alias, sql, allow_sort in self.queries(self.get_user(options['user'])):
+            plan = self.explain(alias, sql)
+            issues = self.analyze(plan, allow_sort, connections[alias].vendor)
+            style = self.style.ERROR if issues else self.style.SUCCESS
+            self.stdout.write(style(f'{"ПРОБЛЕМА" if issues else "OK":9} {name}'))
+            for issue in issues:
+                self.stdout.write(f'          {issue}')
+            if options['verbose_plans'] or issues:
+                for line in plan.splitlines():
+                    self.stdout.write(f'          | {line}')
+            problems += len(issues)
+
+        if problems and options['fail']:
+            raise CommandError(f'Найдено проблем: {problems}')
+
+    def get_user(self, username):
+        users = get_user_model().objects.filter(is_active=True)
+        user = users.filter(username=username).first() if username else users.filter(is_superuser=True).first()
+        if user is None:
+            raise CommandError(f'Пользователь {username} не найден' if username else
+                               'Нет суперпользователя, укажите --user')
+        return user
+
+    @staticmethod
+    def explain(alias, sql):
+        """План запроса в том же виде, что QuerySet.explain()"""
+        connection = connections[alias]
+        with connection.cursor() as cursor:
+            cursor.execute(f'{connection.ops.explain_query_prefix()} {sql}')
+            return '\n'.join(' '.join(str(column) for column in row) for row in cursor.fetchall())
+
+    def analyze(self, plan, allow_sort=False, vendor='sqlite'):
+        issues = []
+        if vendor == 'sqlite':
+            for match in SQLITE_FULL_SCAN.finditer(plan):
+                if match.group(1) not in ALLOWED_SCANS:
+                    issues.append(f'полный проход по таблице {match.group(1)}')
+            for match in SQLITE_VIRTUAL_SCAN.finditer(plan):
+                issues.append(f'полный проход по виртуальной таблице {match.group(1)}')
+            for table in self.correlated_virtual_scans(plan):
+                issues.append(f'поиск по {table} повторяется для каждой строки (коррелированный подзапрос)')
+            if not allow_sort and SQLITE_TEMP_SORT.search(plan):
+                issues.append('сортировка во временном B-дереве (нет подходящего индекса для ORDER BY)')
+        elif vendor == 'postgresql':
+            for table in POSTGRES_FULL_SCAN.findall(plan):
+                if table not in ALLOWED_SCANS:
+                    issues.append(f'полный проход по таблице {table}')
+        return issues
+
+    @staticmethod
+    def correlated_virtual_scans(plan):
+        """Виртуальные таблицы внутри коррелированных подзапросов плана SQLite"""
+        parents, correlated, scans = {}, set(), []
+        for line in plan.splitlines():
+            parts = line.split(None, 3)
+            if len(parts) < 4 or not parts[0].isdigit():
+                continue
+            node, parent, detail = int(parts[0]), int(parts[1]), parts[3]
+            parents[node] = parent
+            if detail.startswith('CORRELATED'):
+                correlated.add(node)
+            if 'VIRTUAL TABLE' in detail:
+                scans.append((node, detail.split()[1]))
+        tables = []
+        for node, table in scans:
+            while node in parents and node not in correlated:
+                node = parents[node]
+            if node in correlated:
+                tables.append(table)
+        return tables
+
+    def pages(self):
+        """Страницы и API, запросы которых проверяются: (название, адрес, GET-параметры, сортировка допустима)"""
+        product = Product.objects.order_by('-created_at').first()
+        if product is None:
+            raise CommandError('В базе нет товаров, планы запросов не показательны')
+        cursor = KeysetPaginator(Product.objects.all(), 24).encode_cursor(product, 'n')
+
+        # Результаты поиска сортируются по релевантности — сортировка найденного неизбежна
+        yield 'product_list: первая страница', reverse('product_list'), {}, False
+        yield 'product_list: следующая страница', reverse('product_list'), {'cursor': cursor}, False
+        yield 'product_list: фильтр по складу', reverse('product_list'), {'warehouse': product.warehouse_id}, False
+        yield 'product_list: фильтр по категории', reverse('product_list'), {'category': product.category_id}, False
+        yield 'product_list: поиск', reverse('product_list'), {'q': 'товар'}, True
+        yield 'product_list: поиск по артикулу', reverse('product_list'), {'q': product.sku}, True
+        yield 'product_detail', reverse('product_detail', args=[product.pk]), {}, False
+        yield 'warehouse_list', reverse('warehouse_list'), {}, False
+        yield 'warehouse_detail', reverse('warehouse_detail', args=[product.warehouse_id]), {}, False
+        yield ('warehouse_detail: следующая страница', reverse('warehouse_detail', args=[product.warehouse_id]),
+               {'cursor': cursor}, False)
+        yield 'api_product_list', reverse('api_product_list'), {}, False
+        yield 'api_product_list: поиск', reverse('api_product_list'), {'q': 'товар'}, True
+        yield 'api_product_detail', reverse('api_product_detail', args=[product.pk]), {}, False
+        yield 'category admin', reverse('admin:products_category_changelist'), {}, False
+
+    @staticmethod
+    def main_table(sql):
+        """Таблица внешнего FROM (подзапросы в скобках отбрасываются)"""
+        while True:
+            stripped = SUBQUERY_RE.sub('', sql)
+            if stripped == sql:
+                break
+            sql = stripped
+        match = TABLE_RE.search(sql)
+        return match[1] if match else '?'
+
+    def queries(self, user):
+        """SELECT-запросы, выполненные представлениями: (название, база, SQL, сортировка допустима)"""
+        # Тестовое окружение: testserver в ALLOWED_HOSTS, письма не отправляются
+        setup_test_environment()
+        client = Client()
+        client.force_login(user)
+        seen = set()
+        try:
+            for name, url, params, allow_sort in self.pages():
+                with ExitStack() as stack:
+                    contexts = {alias: stack.enter_context(CaptureQueriesContext(connections[alias]))
+                                for alias in connections}
+                    response = client.get(url, params)
+                    if response.streaming:
+                        b''.join(response.streaming_content)
+                if response.status_code != 200:
+                    self.stdout.write(self.style.WARNING(f'{name}: ответ {response.status_code}, пропущено'))
+                    continue
+                for alias, context in contexts.items():
+                    for query in context.captured_queries:
+                        sql = query['sql']
+                        if not sql.lstrip().upper().startswith('SELECT') or (alias, sql) in seen:
+                            continue
+                        seen.add((alias, sql))
+                        table = self.main_table(sql)
+                        # Сортировка небольшого справочника допустима, как и полный проход по нему
+                        yield f'{name} [{table}]', alias, sql, allow_sort or table in ALLOWED_SCANS
+        finally:
+            client.logout()
+            teardown_test_environment()
@@ -0,0 +1,18 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+
+from products import uploads
+
+
+class Command(BaseCommand):
+    help = 'Удаление незавершённых загрузок документов и их временных файлов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--hours', type=float, default=None,
+                            help='Возраст загрузки без новых данных (по умолчанию DOCUMENT_UPLOAD_EXPIRY)')
+
+    def handle(self, *args, **options):
+        older_than = timedelta(hours=options['hours']) if options['hours'] is not None else None
+        removed = uploads.cleanup(older_than)
+        self.stdout.write(self.style.SUCCESS(f'Удалено незавершённых загрузок: {removed}'))
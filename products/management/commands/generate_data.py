@@ -0,0 +1,150 @@
+import random
+from decimal import Decimal
+
+from django.contrib.auth.hashers import make_password
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.utils.crypto import get_random_string
+
+from products import reference, search, stock, valuation
+from products.models import Category, Product, ProductDocument, User, UserProfile, Warehouse
+
+CITIES = ['Москва', 'Санкт-Петербург', 'Казань', 'Екатеринбург', 'Новосибирск', 'Самара', 'Пермь', 'Воронеж']
+STREETS = ['ул. Ленина', 'ул. Гагарина', 'пр. Мира', 'ул. Советская', 'ш. Энтузиастов', 'ул. Складская']
+CATEGORY_NAMES = ['Продукты питания', 'Напитки', 'Овощи', 'Фрукты', 'Одежда', 'Обувь', 'Бытовая химия',
+                  'Электроника', 'Инструменты', 'Канцтовары', 'Игрушки', 'Мебель', 'Посуда', 'Спорт']
+ADJECTIVES = ['Свежий', 'Классический', 'Домашний', 'Премиум', 'Эконом', 'Зелёный', 'Большой', 'Ёмкий']
+NOUNS = ['чай', 'сок', 'хлеб', 'сыр', 'ноутбук', 'молоток', 'свитер', 'кроссовки', 'стул', 'чайник',
+         'мяч', 'карандаш', 'шампунь', 'помидор', 'яблоко', 'кабель', 'фонарь', 'рюкзак']
+WORDS = ['качественный', 'надёжный', 'удобный', 'прочный', 'натуральный', 'компактный', 'лёгкий',
+         'производство', 'Россия', 'упаковка', 'гарантия', 'склад', 'поставка', 'сертификат']
+
+
+class Command(BaseCommand):
+    help = 'Генерация синтетических данных для нагрузочного тестирования'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--warehouses', type=int, default=10)
+        parser.add_argument('--categories', type=int, default=20)
+        parser.add_argument('--users', type=int, default=50)
+        parser.add_argument('--products', type=int, default=10000)
+        parser.add_argument('--documents', type=int, default=1000)
+        parser.add_argument('--batch-size', type=int, default=2000)
+        parser.add_argument('--seed', type=int, default=None)
+
+    def handle(self, *args, **options):
+        if options['products'] and not (options['warehouses'] and options['categories']):
+            raise CommandError('Для генерации товаров нужны хотя бы один склад и одна категория')
+        self.random = random.Random(options['seed'])
+        self.batch_size = options['batch_size']
+        # Префикс запуска делает имена и артикулы уникальными при повторной генерации
+        self.run = get_random_string(4, allowed_chars='ABCDEFGHJKLMNPQRSTUVWXYZ23456789')
+
+        with transaction.atomic():
+            warehouses = self.create_warehouses(options['warehouses'])
+            categories = self.create_categories(options['categories'])
+            users = self.create_users(options['users'], warehouses)
+            self.create_products(options['products'], categories, warehouses, users)
+            self.create_documents(options['documents'], users)
+            # bulk_create не отправляет сигналы, снимок справочников сбрасывается вручную
+            transaction.on_commit(reference.bump_version)
+
+        self.stdout.write('Перестройка поискового индекса...')
+        search.rebuild_index()
+        self.stdout.write(self.style.SUCCESS('Генерация данных завершена'))
+
+    def create_warehouses(self, count):
+        warehouses = [
+            Warehouse(
+                name=f'Склад {self.run}-{i + 1}',
+                address=f'г. {self.random.choice(CITIES)}, {self.random.choice(STREETS)}, {self.random.randint(1, 200)}',
+                description=self.sentence(12),
+            )
+            for i in range(count)
+        ]
+        created = Warehouse.objects.bulk_create(warehouses, batch_size=self.batch_size)
+        self.stdout.write(f'Складов: {len(created)}')
+        return created
+
+    def create_categories(self, count):
+        categories = [
+            Category(
+                name=f'{CATEGORY_NAMES[i % len(CATEGORY_NAMES)]} {self.run}-{i + 1}',
+                description=self.sentence(8),
+            )
+            for i in range(count)
+        ]
+        created = Category.objects.bulk_create(categories, batch_size=self.batch_size)
+        self.stdout.write(f'Категорий: {len(created)}')
+        return created
+
+    def create_users(self, count, warehouses):
+        # Хеширование пароля дорогое — один хеш на всех сгенерированных пользователей
+        password = make_password('password')
+        users = [
+            User(
+                username=f'user_{self.run.lower()}_{i + 1}',
+                email=f'user_{self.run.lower()}_{i + 1}@example.com',
+                password=password,
+                role=self.random.choice(['manager', 'manager', 'client']),
+            )
+            for i in range(count)
+        ]
+        users = User.objects.bulk_create(users, batch_size=self.batch_size)
+        profiles = [
+            UserProfile(user=user, warehouse=self.random.choice(warehouses) if warehouses else None)
+            for user in users
+        ]
+        UserProfile.objects.bulk_create(profiles, batch_size=self.batch_size)
+        self.stdout.write(f'Пользователей: {len(users)}')
+        return users
+
+    def create_products(self, count, categories, warehouses, users):
+        created = 0
+        batch = []
+        for i in range(count):
+            batch.append(Product(
+                name=f'{self.random.choice(ADJECTIVES)} {self.random.choice(NOUNS)} {self.random.randint(1, 999)}',
+                sku=f'GEN-{self.run}-{i + 1:08d}',
+                description=self.sentence(self.random.randint(5, 30)),
+                category=self.random.choice(categories),
+                warehouse=self.random.choice(warehouses),
+                price=Decimal(self.random.randint(100, 1000000)) / 100,
+                quantity=self.random.choice([0, self.random.randint(1, 500)]),
+                created_by=self.random.choice(users) if users else None,
+                is_active=self.random.random() > 0.1,
+            ))
+            if len(batch) >= self.batch_size:
+                stock.record_opening_balances(Product.objects.bulk_create(batch))
+                valuation.products_added(batch)
+                created += len(batch)
+                batch = []
+                self.stdout.write(f'Товаров: {created}/{count}')
+        if batch:
+            stock.record_opening_balances(Product.objects.bulk_create(batch))
+            valuation.products_added(batch)
+            created += len(batch)
+        self.stdout.write(f'Товаров: {created}')
+
+    def create_documents(self, count, users):
+        if not count:
+            return
+        product_ids = list(
+            Product.objects.filter(sku__startswith=f'GEN-{self.run}-').values_list('id', flat=True)
+        )
+        if not product_ids:
+            return
+        documents = [
+            ProductDocument(
+                product_id=self.random.choice(product_ids),
+                file=f'product_documents/generated_{i + 1}.pdf',
+                name=f'Сертификат {i + 1}',
+                uploaded_by=self.random.choice(users) if users else None,
+            )
+            for i in range(count)
+        ]
+        ProductDocument.objects.bulk_create(documents, batch_size=self.batch_size)
+        self.stdout.write(f'Документов: {count}')
+
+    def sentence(self, words):
+        return ' '.join(self.random.choice(WORDS) for _ in range(words)).capitalize()
@@ -0,0 +1,47 @@
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.files.storage import default_storage
+from django.core.management.base import BaseCommand
+
+from products import images
+from products.models import Product, Warehouse
+
+
+class Command(BaseCommand):
+    help = 'Создание уменьшенных копий (WebP/AVIF/JPEG) для уже загруженных изображений'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--force', action='store_true', help='Пересоздать уже существующие копии')
+        parser.add_argument('--workers', type=int, default=4)
+
+    def handle(self, *args, **options):
+        names = set()
+        for model in (Product, Warehouse):
+            names.update(
+                model.objects.exclude(image='').exclude(image__isnull=True)
+                .values_list('image', flat=True).distinct().iterator()
+            )
+
+        pending = [
+            name for name in sorted(names)
+            if options['force'] or not images.has_derivatives(name)
+        ]
+        self.stdout.write(f'Изображений: {len(names)}, к обработке: {len(pending)}')
+
+        errors = 0
+        with ThreadPoolExecutor(max_workers=options['workers']) as executor:
+            for name, error in zip(pending, executor.map(self.process, pending)):
+                if error:
+                    errors += 1
+                    self.stderr.write(f'{name}: {error}')
+
+        self.stdout.write(self.style.SUCCESS(f'Готово, ошибок: {errors}'))
+
+    def process(self, name):
+        if not default_storage.exists(name):
+            return 'файл не найден'
+        try:
+            images.generate_derivatives(name)
+        except Exception as e:
+            return str(e)
+        return None
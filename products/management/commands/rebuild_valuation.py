@@ -0,0 +1,25 @@
+from django.core.management.base import BaseCommand
+
+from products import valuation
+
+
+class Command(BaseCommand):
+    help = 'Пересчёт сводки стоимости остатков по складам и категориям (запускается ночью)'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--check', action='store_true', help='Только показать расхождения сводки с товарами')
+        parser.add_argument('--show', type=int, default=20, help='Сколько расхождений вывести')
+
+    def handle(self, *args, **options):
+        differences = valuation.drift()
+        for (warehouse_id, category_id), (stored, actual) in list(differences.items())[:options['show']]:
+            self.stdout.write(f'склад {warehouse_id} категория {category_id}: в сводке {stored}, фактически {actual}')
+
+        if not differences:
+            self.stdout.write(self.style.SUCCESS('Сводка совпадает с товарами'))
+        if options['check']:
+            if differences:
+                self.stdout.write(self.style.WARNING(f'Групп с расхождениями: {len(differences)}'))
+            return
+        groups = valuation.rebuild()
+        self.stdout.write(self.style.SUCCESS(f'Сводка пересчитана, групп: {groups}'))
@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand
+
+from products import fragments, stock, valuation
+
+
+class Command(BaseCommand):
+    help = 'Сверка остатков товаров с журналом движений и их пересчёт'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только показать расхождения')
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--show', type=int, default=20, help='Сколько расхождений вывести')
+
+    def handle(self, *args, **options):
+        rows = list(stock.discrepancies().values_list('pk', 'sku', 'quantity', 'ledger_quantity'))
+        for pk, sku, quantity, ledger_quantity in rows[:options['show']]:
+            self.stdout.write(f'{pk:>8} {sku:20} остаток {quantity:>8}  по журналу {ledger_quantity:>8}')
+
+        # Отрицательный остаток по журналу означает ошибку в самом журнале — такие товары не трогаем
+        negative = [pk for pk, _, _, ledger_quantity in rows if ledger_quantity < 0]
+        if negative:
+            self.stdout.write(self.style.ERROR(
+                f'Отрицательный остаток по журналу у {len(negative)} товаров: {negative[:options["show"]]}'
+            ))
+        product_ids = [pk for pk, _, _, ledger_quantity in rows if ledger_quantity >= 0]
+
+        if not rows:
+            self.stdout.write(self.style.SUCCESS('Остатки совпадают с журналом'))
+        elif options['dry_run']:
+            self.stdout.write(self.style.WARNING(f'Расхождений: {len(rows)}'))
+        else:
+            updated = stock.reconcile(product_ids, options['batch_size'])
+            # Остатки изменены одним UPDATE по журналу, сводку стоимости проще пересчитать целиком
+            valuation.rebuild()
+            fragments.bump_version()
+            self.stdout.write(self.style.SUCCESS(f'Пересчитано остатков: {updated}'))
@@ -0,0 +1,27 @@
+import time
+
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+from products import lowstock
+
+
+class Command(BaseCommand):
+    help = 'Поиск товаров с низким остатком и отправка писем менеджерам складов'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--dry-run', action='store_true', help='Только подсчитать, без писем и записей')
+        parser.add_argument('--interval', type=float, default=None,
+                            help='Повторять проверку каждые N секунд (режим фонового процесса)')
+
+    def handle(self, *args, **options):
+        while True:
+            result = lowstock.scan(send=not options['dry_run'])
+            self.stdout.write(self.style.SUCCESS(
+                f'Товаров ниже минимума: {result.found}, новых уведомлений: {result.notified} '
+                f'(писем: {result.digests}), восстановлено: {result.recovered}'
+            ))
+            if options['interval'] is None:
+                break
+            close_old_connections()
+            time.sleep(options['interval'])
@@ -0,0 +1,77 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS, connections
+
+ACTIONS = ('checkpoint', 'optimize', 'analyze', 'integrity')
+DEFAULT_ACTIONS = ('checkpoint', 'optimize', 'integrity')
+
+
+class Command(BaseCommand):
+    help = 'Обслуживание базы SQLite: контрольная точка WAL, ANALYZE/optimize, проверка целостности'
+
+    def add_arguments(self, parser):
+        # choices с nargs='*' argparse проверяет и на пустом списке по умолчанию, поэтому проверка в handle()
+        parser.add_argument('actions', nargs='*', metavar='action',
+                            help=f'{", ".join(ACTIONS)}; по умолчанию: {" ".join(DEFAULT_ACTIONS)}')
+        parser.add_argument('--database', default=DEFAULT_DB_ALIAS)
+        parser.add_argument('--checkpoint-mode', default='TRUNCATE', choices=['PASSIVE', 'FULL', 'RESTART', 'TRUNCATE'])
+        parser.add_argument('--full-integrity', action='store_true',
+                            help='integrity_check вместо более быстрого quick_check')
+
+    def handle(self, *args, **options):
+        unknown = [action for action in options['actions'] if action not in ACTIONS]
+        if unknown:
+            raise CommandError(f'Неизвестные действия: {", ".join(unknown)} (допустимы: {", ".join(ACTIONS)})')
+        self.alias = options['database']
+        connection = connections[self.alias]
+        if connection.vendor != 'sqlite':
+            raise CommandError('Команда предназначена только для SQLite')
+
+        self.show_pragmas()
+        for action in options['actions'] or DEFAULT_ACTIONS:
+            getattr(self, f'run_{action}')(options)
+
+    def query(self, sql):
+        with connections[self.alias].cursor() as cursor:
+            cursor.execute(sql)
+            return cursor.fetchall()
+
+    def show_pragmas(self):
+        names = ('journal_mode', 'synchronous', 'busy_timeout', 'mmap_size', 'cache_size', 'temp_store')
+        # База в памяти (тестовая) не возвращает значение mmap_size
+        rows = {name: self.query(f'PRAGMA {name}') for name in names}
+        values = ', '.join(f'{name}={row[0][0]}' for name, row in rows.items() if row)
+        self.stdout.write(f'Настройки соединения: {values}')
+
+    def run_checkpoint(self, options):
+        busy, log_frames, checkpointed = self.query(f'PRAGMA wal_checkpoint({options["checkpoint_mode"]})')[0]
+        if log_frames == -1:
+            self.stdout.write(self.style.WARNING('База не в режиме WAL, контрольная точка не нужна'))
+        elif busy:
+            self.stdout.write(self.style.WARNING(
+                f'Контрольная точка выполнена частично: {checkpointed} из {log_frames} страниц (база занята)'
+            ))
+        else:
+            self.stdout.write(self.style.SUCCESS(f'Контрольная точка WAL: перенесено страниц {checkpointed}'))
+
+    def run_optimize(self, options):
+        # optimize пересчитывает статистику только там, где она устарела
+        start = time.perf_counter()
+        self.query('PRAGMA optimize=0x10002')
+        self.stdout.write(self.style.SUCCESS(f'PRAGMA optimize: {time.perf_counter() - start:.2f} с'))
+
+    def run_analyze(self, options):
+        start = time.perf_counter()
+        self.query('ANALYZE')
+        self.stdout.write(self.style.SUCCESS(f'ANALYZE: {time.perf_counter() - start:.2f} с'))
+
+    def run_integrity(self, options):
+        pragma = 'integrity_check' if options['full_integrity'] else 'quick_check'
+        rows = [row[0] for row in self.query(f'PRAGMA {pragma}')]
+        if rows == ['ok']:
+            self.stdout.write(self.style.SUCCESS(f'{pragma}: ok'))
+            return
+        for row in rows:
+            self.stdout.write(self.style.ERROR(row))
+        raise CommandError(f'{pragma}: найдены ошибки ({len(rows)})')
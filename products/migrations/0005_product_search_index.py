@@ -0,0 +1,39 @@
+from django.db import migrations
+
+
+def create_search_index(apps, schema_editor):
+    from products import search
+
+    search.create_index(schema_editor)
+    if not search.is_supported(schema_editor.connection):
+        return
+    Product = apps.get_model('products', 'Product')
+    rows = [
+        (row[0],) + tuple(search.normalize(value) for value in row[1:])
+        for row in Product.objects.using(schema_editor.connection.alias).values_list(
+            'id', 'name', 'description', 'sku', 'category__name', 'warehouse__name',
+        ).iterator()
+    ]
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {search.SEARCH_TABLE}(rowid, name, description, sku, category, warehouse) '
+            'VALUES (%s, %s, %s, %s, %s, %s)',
+            rows,
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    from products import search
+
+    search.drop_index(schema_editor)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0004_warehouse_image'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,25 @@
+# Generated by Django 5.2.18 on 2026-10-18 17:55
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0005_product_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='SkuSequence',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('name', models.CharField(max_length=50, unique=True, verbose_name='Название')),
+                ('last_value', models.BigIntegerField(default=0, verbose_name='Последнее выданное значение')),
+            ],
+            options={
+                'verbose_name': 'Последовательность артикулов',
+                'verbose_name_plural': 'Последовательности артикулов',
+            },
+        ),
+    ]
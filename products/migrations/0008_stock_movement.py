@@ -0,0 +1,50 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:03
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+def record_opening_balances(apps, schema_editor):
+    """Текущие остатки становятся первыми записями журнала"""
+    Product = apps.get_model('products', 'Product')
+    StockMovement = apps.get_model('products', 'StockMovement')
+    db_alias = schema_editor.connection.alias
+    products = Product.objects.using(db_alias).filter(quantity__gt=0).values_list('id', 'quantity')
+    batch = []
+    for product_id, quantity in products.iterator(chunk_size=2000):
+        batch.append(StockMovement(product_id=product_id, kind='receipt', quantity=quantity,
+                                   reason='Начальный остаток'))
+        if len(batch) >= 2000:
+            StockMovement.objects.using(db_alias).bulk_create(batch)
+            batch = []
+    StockMovement.objects.using(db_alias).bulk_create(batch)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0007_catalogue_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StockMovement',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('receipt', 'Поступление'), ('issue', 'Списание'), ('adjustment', 'Корректировка')], max_length=10, verbose_name='Тип')),
+                ('quantity', models.IntegerField(verbose_name='Изменение количества')),
+                ('reason', models.CharField(blank=True, max_length=200, verbose_name='Основание')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата')),
+                ('product', models.ForeignKey(db_index=False, on_delete=django.db.models.deletion.CASCADE, related_name='movements', to='products.product', verbose_name='Товар')),
+                ('user', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, to=settings.AUTH_USER_MODEL, verbose_name='Пользователь')),
+            ],
+            options={
+                'verbose_name': 'Движение товара',
+                'verbose_name_plural': 'Движения товаров',
+                'ordering': ['-created_at'],
+                'indexes': [models.Index(fields=['product', '-created_at'], name='movement_product_created_idx')],
+            },
+        ),
+        migrations.RunPython(record_opening_balances, migrations.RunPython.noop),
+    ]
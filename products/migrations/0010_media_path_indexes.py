@@ -0,0 +1,23 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:18
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0009_document_uploads'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='product',
+            name='image',
+            field=models.ImageField(blank=True, db_index=True, null=True, upload_to='products/', verbose_name='Изображение'),
+        ),
+        migrations.AlterField(
+            model_name='productdocument',
+            name='file',
+            field=models.FileField(db_index=True, max_length=200, upload_to='product_documents/', verbose_name='Файл'),
+        ),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:19
+
+import django.db.models.deletion
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, Sum
+
+
+def build_valuation(apps, schema_editor):
+    """Начальное заполнение сводки одним GROUP BY по товарам"""
+    Product = apps.get_model('products', 'Product')
+    InventoryValuation = apps.get_model('products', 'InventoryValuation')
+    db_alias = schema_editor.connection.alias
+    rows = (
+        Product.objects.using(db_alias).order_by()
+        .values('warehouse_id', 'category_id')
+        .annotate(items=Count('id'), units=Sum('quantity'),
+                  value=Sum(F('price') * F('quantity'), output_field=DecimalField(max_digits=18, decimal_places=2)))
+    )
+    InventoryValuation.objects.using(db_alias).bulk_create([
+        InventoryValuation(warehouse_id=row['warehouse_id'], category_id=row['category_id'],
+                           item_count=row['items'], units=row['units'] or 0, value=row['value'] or 0)
+        for row in rows
+    ], batch_size=1000)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0010_media_path_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='InventoryValuation',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('item_count', models.IntegerField(default=0, verbose_name='Товаров')),
+                ('units', models.BigIntegerField(default=0, verbose_name='Единиц')),
+                ('value', models.DecimalField(decimal_places=2, default=0, max_digits=18, verbose_name='Стоимость')),
+                ('updated_at', models.DateTimeField(auto_now=True, verbose_name='Дата обновления')),
+                ('category', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.category', verbose_name='Категория')),
+                ('warehouse', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.CASCADE, to='products.warehouse', verbose_name='Склад')),
+            ],
+            options={
+                'verbose_name': 'Стоимость остатков',
+                'verbose_name_plural': 'Стоимость остатков',
+                'constraints': [models.UniqueConstraint(fields=('warehouse', 'category'), name='valuation_group_uniq'), models.UniqueConstraint(condition=models.Q(('warehouse__isnull', True)), fields=('category',), name='valuation_no_warehouse_uniq')],
+            },
+        ),
+        migrations.RunPython(build_valuation, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,55 @@
+# Generated by Django 5.2.18 on 2026-10-18 18:25
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('products', '0011_inventory_valuation'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LowStockAlert',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('quantity', models.PositiveIntegerField(verbose_name='Остаток при уведомлении')),
+                ('reorder_level', models.PositiveIntegerField(verbose_name='Минимальный остаток')),
+                ('notified_at', models.DateTimeField(auto_now_add=True, verbose_name='Дата уведомления')),
+            ],
+            options={
+                'verbose_name': 'Уведомление о низком остатке',
+                'verbose_name_plural': 'Уведомления о низком остатке',
+            },
+        ),
+        migrations.AddField(
+            model_name='category',
+            name='reorder_level',
+            field=models.PositiveIntegerField(blank=True, help_text='Для товаров категории без собственного минимального остатка', null=True, verbose_name='Минимальный остаток'),
+        ),
+        migrations.AddField(
+            model_name='product',
+            name='reorder_level',
+            field=models.PositiveIntegerField(blank=True, help_text='Менеджеры склада получат уведомление, когда остаток станет не больше этого значения', null=True, verbose_name='Минимальный остаток'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('quantity__lte', models.F('reorder_level'))), fields=['warehouse'], name='product_below_reorder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='product',
+            index=models.Index(condition=models.Q(('reorder_level__isnull', True)), fields=['warehouse', 'category', 'quantity'], name='product_category_reorder_idx'),
+        ),
+        migrations.AddField(
+            model_name='lowstockalert',
+            name='product',
+            field=models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='low_stock_alert', to='products.product', verbose_name='Товар'),
+        ),
+        migrations.AddField(
+            model_name='lowstockalert',
+            name='warehouse',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, to='products.warehouse', verbose_name='Склад'),
+        ),
+    ]
@@ -1,8 +1,11 @@
+import os
+import uuid
+
 from django.db import models
 from django.contrib.auth.models import AbstractUser
 from django.core.validators import FileExtensionValidator, MinValueValidator
 from django.core.exceptions import ValidationError
-from django.utils.crypto import get_random_string
+from django.db.models.functions import Coalesce
 
 
 class User(AbstractUser):
@@ -16,15 +19,38 @@ class User(AbstractUser):
     address = models.TextField(blank=True)
 
 
+def count_subquery(model, field):
+    """Подзапрос с количеством связанных объектов (без JOIN и GROUP BY по основной таблице)"""
+    counts = (
+        model.objects.filter(**{field: models.OuterRef('pk')})
+        .order_by()
+        .values(field)
+        .annotate(count=models.Count('pk'))
+        .values('count')
+    )
+    return Coalesce(models.Subquery(counts, output_field=models.IntegerField()), 0)
+
+
+class WarehouseQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Количество товаров и сотрудников склада одним запросом"""
+        return self.annotate(
+            product_count=count_subquery(Product, 'warehouse'),
+            employee_count=count_subquery(UserProfile, 'warehouse'),
+        )
+
+
 class Warehouse(models.Model):
     """Модель склада"""
-    name = models.CharField('Название', max_length=100)
+    name = models.CharField('Название', max_length=100, db_index=True)
     address = models.CharField('Адрес', max_length=200)
     description = models.TextField('Описание', blank=True)
     image = models.ImageField('Изображение', upload_to='warehouses/', blank=True, null=True)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
+    objects = WarehouseQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Склад'
         verbose_name_plural = 'Склады'
@@ -53,13 +79,25 @@ class UserProfile(models.Model):
         return f"{self.user.get_full_name() or self.user.username} - {self.warehouse.name if self.warehouse else 'Нет склада'}"
 
 
+class CategoryQuerySet(models.QuerySet):
+    def with_counts(self):
+        """Количество товаров категории одним запросом"""
+        return self.annotate(product_count=count_subquery(Product, 'category'))
+
+
 class Category(models.Model):
     """Модель категории товаров"""
-    name = models.CharField('Название', max_length=100)
+    name = models.CharField('Название', max_length=100, db_index=True)
     description = models.TextField('Описание', blank=True)
+    reorder_level = models.PositiveIntegerField(
+        'Минимальный остаток', null=True, blank=True,
+        help_text='Для товаров категории без собственного минимального остатка',
+    )
     created_at = models.DateTimeField('Дата создания', auto_now_add=True, null=True, blank=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
 
+    objects = CategoryQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Категория'
         verbose_name_plural = 'Категории'
@@ -73,12 +111,23 @@ class Category(models.Model):
             raise ValidationError({'name': 'Категория с таким названием уже существует'})
 
 
+class SkuSequence(models.Model):
+    """Счётчик для выдачи артикулов блоками (см. products/sku.py)"""
+    name = models.CharField('Название', max_length=50, unique=True)
+    last_value = models.BigIntegerField('Последнее выданное значение', default=0)
+
+    class Meta:
+        verbose_name = 'Последовательность артикулов'
+        verbose_name_plural = 'Последовательности артикулов'
+
+    def __str__(self):
+        return f"{self.name}: {self.last_value}"
+
+
 def generate_sku():
     """Генерация уникального артикула"""
-    while True:
-        sku = f"SKU-{get_random_string(8).upper()}"
-        if not Product.objects.filter(sku=sku).exists():
-            return sku
+    from .sku import next_sku
+    return next_sku()
 
 
 class Product(models.Model):
@@ -86,11 +135,19 @@ class Product(models.Model):
     name = models.CharField('Название', max_length=200)
     sku = models.CharField('Артикул', max_length=50, unique=True, blank=True)
     description = models.TextField('Описание', blank=True)
-    category = models.ForeignKey(Category, on_delete=models.PROTECT, verbose_name='Категория')
-    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, verbose_name='Склад', null=True, blank=True)
+    # Отдельные индексы внешних ключей не нужны: их покрывают составные индексы из Meta
+    category = models.ForeignKey(Category, on_delete=models.PROTECT, verbose_name='Категория', db_index=False)
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.PROTECT, verbose_name='Склад', null=True, blank=True,
+                                  db_index=False)
     price = models.DecimalField('Цена', max_digits=10, decimal_places=2)
     quantity = models.PositiveIntegerField('Количество', default=0)
-    image = models.ImageField('Изображение', upload_to='products/', blank=True, null=True)
+    # Пусто — минимальный остаток категории (см. products/lowstock.py)
+    reorder_level = models.PositiveIntegerField(
+        'Минимальный остаток', null=True, blank=True,
+        help_text='Менеджеры склада получат уведомление, когда остаток станет не больше этого значения',
+    )
+    # Индекс по пути файла: права на изображение проверяются поиском товара по нему (products/downloads.py)
+    image = models.ImageField('Изображение', upload_to='products/', blank=True, null=True, db_index=True)
     created_at = models.DateTimeField('Дата создания', auto_now_add=True)
     updated_at = models.DateTimeField('Дата обновления', auto_now=True)
     created_by = models.ForeignKey(User, on_delete=models.PROTECT, verbose_name='Создал', null=True, blank=True)
@@ -100,6 +157,26 @@ class Product(models.Model):
         verbose_name = 'Товар'
         verbose_name_plural = 'Товары'
         ordering = ['-created_at']
+        indexes = [
+            # Каталог и курсорная пагинация: ORDER BY created_at DESC, id DESC
+            models.Index(fields=['-created_at', '-id'], name='product_created_idx'),
+            models.Index(fields=['warehouse', '-created_at', '-id'], name='product_warehouse_created_idx'),
+            # Витрина склада для клиентов. is_active — условие частичного индекса, а не столбец:
+            # Django пишет is_active=True как «WHERE is_active» без сравнения, и столбец индекса
+            # между складом и датой не сужал бы поиск, а ломал порядок; id нужен курсорной пагинации
+            models.Index(fields=['warehouse', '-created_at', '-id'], condition=models.Q(is_active=True),
+                         name='product_warehouse_active_idx'),
+            models.Index(fields=['category', '-created_at', '-id'], name='product_category_created_idx'),
+            # Состояние каталога для ETag (MAX(updated_at), COUNT) без чтения строк таблицы
+            models.Index(fields=['is_active', 'updated_at'], name='product_active_updated_idx'),
+            # Поиск товаров с низким остатком (products/lowstock.py). Частичный индекс содержит
+            # только товары, остаток которых сейчас не выше их собственного минимума
+            models.Index(fields=['warehouse'], condition=models.Q(quantity__lte=models.F('reorder_level')),
+                         name='product_below_reorder_idx'),
+            # Товары с минимумом категории: диапазон по остатку внутри склада и категории
+            models.Index(fields=['warehouse', 'category', 'quantity'], condition=models.Q(reorder_level__isnull=True),
+                         name='product_category_reorder_idx'),
+        ]
         permissions = [
             ("can_manage_warehouse_products", "Может управлять товарами склада"),
         ]
@@ -118,10 +195,105 @@ class Product(models.Model):
         super().save(*args, **kwargs)
 
 
+class StockMovement(models.Model):
+    """Движение товара: журнал, по которому ведётся остаток (см. products/stock.py)"""
+    RECEIPT = 'receipt'
+    ISSUE = 'issue'
+    ADJUSTMENT = 'adjustment'
+    KINDS = (
+        (RECEIPT, 'Поступление'),
+        (ISSUE, 'Списание'),
+        (ADJUSTMENT, 'Корректировка'),
+    )
+
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='movements',
+                                verbose_name='Товар', db_index=False)
+    kind = models.CharField('Тип', max_length=10, choices=KINDS)
+    quantity = models.IntegerField('Изменение количества')
+    reason = models.CharField('Основание', max_length=200, blank=True)
+    user = models.ForeignKey(User, on_delete=models.SET_NULL, null=True, blank=True, verbose_name='Пользователь')
+    created_at = models.DateTimeField('Дата', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Движение товара'
+        verbose_name_plural = 'Движения товаров'
+        ordering = ['-created_at']
+        indexes = [
+            models.Index(fields=['product', '-created_at'], name='movement_product_created_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.get_kind_display()} {self.quantity:+d} - {self.product_id}"
+
+
+def document_blob_path(instance, filename):
+    """Путь файла по хешу содержимого: одинаковые файлы хранятся один раз"""
+    extension = os.path.splitext(filename)[1].lower()[:10]
+    return f'product_documents/blobs/{instance.sha256[:2]}/{instance.sha256}{extension}'
+
+
+class DocumentBlob(models.Model):
+    """Содержимое файла документа, общее для всех документов с одинаковым SHA-256"""
+    sha256 = models.CharField('SHA-256', max_length=64, unique=True)
+    file = models.FileField('Файл', upload_to=document_blob_path, max_length=200)
+    size = models.BigIntegerField('Размер, байт')
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Содержимое документа'
+        verbose_name_plural = 'Содержимое документов'
+
+    def __str__(self):
+        return self.sha256
+
+
+class InventoryValuation(models.Model):
+    """Стоимость остатков по складу и категории (см. products/valuation.py)"""
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, null=True, blank=True, verbose_name='Склад')
+    category = models.ForeignKey(Category, on_delete=models.CASCADE, verbose_name='Категория')
+    item_count = models.IntegerField('Товаров', default=0)
+    units = models.BigIntegerField('Единиц', default=0)
+    value = models.DecimalField('Стоимость', max_digits=18, decimal_places=2, default=0)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Стоимость остатков'
+        verbose_name_plural = 'Стоимость остатков'
+        constraints = [
+            models.UniqueConstraint(fields=['warehouse', 'category'], name='valuation_group_uniq'),
+            # NULL в уникальном ограничении не совпадают друг с другом: товары без склада — отдельно
+            models.UniqueConstraint(fields=['category'], condition=models.Q(warehouse__isnull=True),
+                                    name='valuation_no_warehouse_uniq'),
+        ]
+
+    def __str__(self):
+        return f"{self.warehouse_id} / {self.category_id}: {self.value}"
+
+
+class LowStockAlert(models.Model):
+    """Отправленное уведомление о низком остатке: пока запись есть, товар повторно не сообщается"""
+    product = models.OneToOneField(Product, on_delete=models.CASCADE, related_name='low_stock_alert',
+                                   verbose_name='Товар')
+    warehouse = models.ForeignKey(Warehouse, on_delete=models.CASCADE, verbose_name='Склад')
+    quantity = models.PositiveIntegerField('Остаток при уведомлении')
+    reorder_level = models.PositiveIntegerField('Минимальный остаток')
+    notified_at = models.DateTimeField('Дата уведомления', auto_now_add=True)
+
+    class Meta:
+        verbose_name = 'Уведомление о низком остатке'
+        verbose_name_plural = 'Уведомления о низком остатке'
+
+    def __str__(self):
+        return f"{self.product_id}: {self.quantity} / {self.reorder_level}"
+
+
 class ProductDocument(models.Model):
     """Модель документа товара"""
-    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='documents')
-    file = models.FileField('Файл', upload_to='product_documents/')
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='documents', db_index=False)
+    # file указывает на файл blob; у документов, загруженных до появления blob, он собственный
+    file = models.FileField('Файл', upload_to='product_documents/', max_length=200, db_index=True)
+    blob = models.ForeignKey(DocumentBlob, on_delete=models.PROTECT, null=True, blank=True,
+                             related_name='documents', verbose_name='Содержимое')
     name = models.CharField('Название', max_length=200, null=True, blank=True)
     uploaded_by = models.ForeignKey(User, on_delete=models.PROTECT, null=True, blank=True)
     uploaded_at = models.DateTimeField('Дата загрузки', auto_now_add=True)
@@ -130,6 +302,31 @@ class ProductDocument(models.Model):
         verbose_name = 'Документ товара'
         verbose_name_plural = 'Документы товаров'
         ordering = ['-uploaded_at']
+        indexes = [
+            models.Index(fields=['product', '-uploaded_at'], name='document_product_uploaded_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} - {self.product.name}"
+
+
+class DocumentUpload(models.Model):
+    """Незавершённая загрузка документа частями (см. products/uploads.py)"""
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    product = models.ForeignKey(Product, on_delete=models.CASCADE, related_name='uploads', verbose_name='Товар')
+    user = models.ForeignKey(User, on_delete=models.CASCADE, verbose_name='Пользователь')
+    name = models.CharField('Название', max_length=200, blank=True)
+    filename = models.CharField('Имя файла', max_length=255)
+    size = models.BigIntegerField('Размер, байт')
+    received = models.BigIntegerField('Получено, байт', default=0)
+    # Хеш, заявленный клиентом: проверяется при завершении загрузки
+    sha256 = models.CharField('SHA-256', max_length=64, blank=True)
+    created_at = models.DateTimeField('Дата создания', auto_now_add=True)
+    updated_at = models.DateTimeField('Дата обновления', auto_now=True)
+
+    class Meta:
+        verbose_name = 'Загрузка документа'
+        verbose_name_plural = 'Загрузки документов'
 
     def __str__(self):
-        return f"{self.name} - {self.product.name}"
\ No newline at end of file
+        return f"{self.filename} ({self.received}/{self.size})"
@@ -0,0 +1,210 @@
+"""Курсорная (keyset) пагинация.
+
+Вместо OFFSET и COUNT(*) страница выбирается условием по значениям полей
+сортировки последнего (или первого) показанного объекта, поэтому любая
+страница стоит столько же, сколько первая. Курсор — это закодированные в
+base64 значения полей сортировки и направление перехода.
+
+Для списков админки, где нужны номера страниц, есть
+``EstimatedCountPaginator``: он не считает большие таблицы целиком.
+"""
+import base64
+import json
+from decimal import Decimal
+
+from django.core.exceptions import ValidationError
+from django.core.paginator import Paginator
+from django.db import DatabaseError, connections
+from django.db.models import Q
+from django.utils.functional import cached_property
+
+DEFAULT_ORDERING = ('-created_at', '-id')
+
+
+class InvalidCursor(Exception):
+    pass
+
+
+def _serialize(value):
+    # isoformat() сохраняет микросекунды, нужные для точного сравнения
+    if hasattr(value, 'isoformat'):
+        return value.isoformat()
+    if isinstance(value, Decimal):
+        return str(value)
+    return value
+
+
+def _split(field):
+    return (field[1:], True) if field.startswith('-') else (field, False)
+
+
+class KeysetPage:
+    def __init__(self, object_list, next_cursor, previous_cursor):
+        self.object_list = object_list
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+    def has_other_pages(self):
+        return self.has_next() or self.has_previous()
+
+
+class KeysetPaginator:
+    """Пагинатор по полям ``ordering`` (последнее поле должно быть уникальным)"""
+
+    def __init__(self, queryset, per_page, ordering=DEFAULT_ORDERING):
+        self.queryset = queryset
+        self.per_page = per_page
+        self.ordering = tuple(ordering)
+
+    def _output_field(self, name):
+        annotations = self.queryset.query.annotations
+        if name in annotations:
+            return annotations[name].output_field
+        if name in ('pk', 'id'):
+            return self.queryset.model._meta.pk
+        return self.queryset.model._meta.get_field(name)
+
+    def encode_cursor(self, obj, direction):
+        values = [_serialize(getattr(obj, _split(field)[0])) for field in self.ordering]
+        payload = json.dumps({'d': direction, 'v': values})
+        return base64.urlsafe_b64encode(payload.encode()).decode().rstrip('=')
+
+    def decode_cursor(self, cursor):
+        try:
+            padded = cursor + '=' * (-len(cursor) % 4)
+            payload = json.loads(base64.urlsafe_b64decode(padded.encode()))
+            direction, raw_values = payload['d'], payload['v']
+            if direction not in ('n', 'p') or len(raw_values) != len(self.ordering):
+                raise ValueError
+            values = [
+                self._output_field(_split(field)[0]).to_python(value)
+                for field, value in zip(self.ordering, raw_values)
+            ]
+            # Поля сортировки не пустые, а сравнение с NULL в фильтре — ошибка запроса
+            if None in values:
+                raise ValueError
+        except (ValueError, TypeError, KeyError, ValidationError) as exc:
+            raise InvalidCursor(cursor) from exc
+        return direction, values
+
+    def _after(self, values, reverse=False):
+        """Условие «строго после» позиции ``values`` в порядке сортировки"""
+        condition = Q()
+        equal = Q()
+        for field, value in zip(self.ordering, values):
+            name, descending = _split(field)
+            lookup = 'lt' if descending != reverse else 'gt'
+            condition |= equal & Q(**{f'{name}__{lookup}': value})
+            equal &= Q(**{name: value})
+        # Избыточное условие по первому полю позволяет СУБД сделать диапазонный проход по индексу
+        first_name, first_descending = _split(self.ordering[0])
+        first_lookup = 'lte' if first_descending != reverse else 'gte'
+        return Q(**{f'{first_name}__{first_lookup}': values[0]}) & condition
+
+    def window(self, cursor=None):
+        """Запрос строк страницы (с одной лишней для проверки продолжения) и позиция курсора"""
+        direction, values = ('n', None)
+        if cursor:
+            direction, values = self.decode_cursor(cursor)
+
+        backwards = direction == 'p'
+        ordering = self.ordering
+        if backwards:
+            ordering = tuple(name if descending else f'-{name}'
+                             for name, descending in map(_split, self.ordering))
+
+        queryset = self.queryset.order_by(*ordering)
+        if values is not None:
+            queryset = queryset.filter(self._after(values, reverse=backwards))
+        return queryset[:self.per_page + 1], values, backwards
+
+    def page(self, cursor=None):
+        queryset, values, backwards = self.window(cursor)
+        return self._build_page(list(queryset), values, backwards)
+
+    async def apage(self, cursor=None):
+        """Асинхронный вариант ``page`` для ASGI-представлений"""
+        queryset, values, backwards = self.window(cursor)
+        return self._build_page([obj async for obj in queryset.aiterator(chunk_size=self.per_page + 1)],
+                                values, backwards)
+
+    def _build_page(self, items, values, backwards):
+        has_more = len(items) > self.per_page
+        items = items[:self.per_page]
+        if backwards:
+            items.reverse()
+            has_next, has_previous = True, has_more
+        else:
+            has_next, has_previous = has_more, values is not None
+
+        next_cursor = previous_cursor = None
+        if items:
+            if has_next:
+                next_cursor = self.encode_cursor(items[-1], 'n')
+            if has_previous:
+                previous_cursor = self.encode_cursor(items[0], 'p')
+        return KeysetPage(items, next_cursor, previous_cursor)
+
+
+def estimate_rows(model, using='default'):
+    """Число строк таблицы по статистике СУБД без COUNT(*); None, если статистики нет"""
+    connection = connections[using]
+    table = model._meta.db_table
+    try:
+        with connection.cursor() as cursor:
+            if connection.vendor == 'postgresql':
+                cursor.execute('SELECT reltuples::bigint FROM pg_class WHERE oid = %s::regclass', [table])
+                rows = [row[0] for row in cursor.fetchall()]
+            elif connection.vendor == 'sqlite':
+                # Первое число stat — строк в индексе; частичные индексы меньше таблицы, поэтому max
+                cursor.execute('SELECT stat FROM sqlite_stat1 WHERE tbl = %s', [table])
+                rows = [int(row[0].split()[0]) for row in cursor.fetchall()]
+            else:
+                return None
+    except DatabaseError:
+        # sqlite_stat1 появляется только после ANALYZE
+        return None
+    estimate = max(rows, default=None)
+    return estimate if estimate and estimate > 0 else None
+
+
+class EstimatedCountPaginator(Paginator):
+    """Paginator списков админки без точного COUNT(*) по большим таблицам.
+
+    Без фильтров число строк берётся из статистики СУБД (``estimate_rows``),
+    если таблица больше ``COUNT_LIMIT``; без статистики (до ANALYZE) строки
+    считаются точно. С фильтрами строки считаются, но не дальше
+    ``COUNT_LIMIT``: последние страницы большой выборки недоступны, до них
+    добираются поиском и фильтрами. Неточное число помечается в
+    ``count_note`` («около», «не менее») и выводится в шаблоне пагинации.
+    """
+    COUNT_LIMIT = 10000
+    count_note = ''
+
+    @cached_property
+    def count(self):
+        # values('pk'): аннотации списка (например, вычисляемые колонки) не попадают в подзапрос
+        queryset = self.object_list.order_by().values('pk')
+        if not queryset.query.where:
+            estimate = estimate_rows(queryset.model, queryset.db)
+            if estimate is None:
+                return queryset.count()
+            if estimate > self.COUNT_LIMIT:
+                self.count_note = 'около'
+                return estimate
+        count = queryset[:self.COUNT_LIMIT].count()
+        if count == self.COUNT_LIMIT:
+            self.count_note = 'не менее'
+        return count
@@ -0,0 +1,99 @@
+"""Права пользователей на товары и склады.
+
+Пользователь загружается один раз за запрос вместе с профилем и складом
+(``ProfileBackend`` — один запрос с ``select_related``), поэтому проверки
+ниже не обращаются к базе. Представления, формы, API и импорт проверяют
+права только через эти функции.
+"""
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.contrib.auth import BACKEND_SESSION_KEY, get_user_model
+from django.contrib.auth.backends import ModelBackend
+
+BACKEND = 'products.permissions.ProfileBackend'
+# Сессии, созданные до перехода на ProfileBackend, переводятся на него без повторного входа
+LEGACY_BACKENDS = {'django.contrib.auth.backends.ModelBackend'}
+
+
+class ProfileBackend(ModelBackend):
+    """Загрузка пользователя сессии вместе с профилем и складом"""
+
+    def _users(self):
+        return get_user_model()._default_manager.select_related('profile__warehouse')
+
+    def get_user(self, user_id):
+        try:
+            user = self._users().get(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+    async def aget_user(self, user_id):
+        try:
+            user = await self._users().aget(pk=user_id)
+        except get_user_model().DoesNotExist:
+            return None
+        return user if self.user_can_authenticate(user) else None
+
+
+class UserContextMiddleware:
+    """Перевод старых сессий на ProfileBackend (ставится перед AuthenticationMiddleware)"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        if request.session.get(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            request.session[BACKEND_SESSION_KEY] = BACKEND
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        if await request.session.aget(BACKEND_SESSION_KEY) in LEGACY_BACKENDS:
+            await request.session.aset(BACKEND_SESSION_KEY, BACKEND)
+        return await self.get_response(request)
+
+
+def profile(user):
+    """Профиль пользователя или None (без запроса, если профиль загружен вместе с пользователем)"""
+    return getattr(user, 'profile', None) if user.is_authenticated else None
+
+
+def warehouse(user):
+    """Склад, к которому привязан пользователь"""
+    user_profile = profile(user)
+    return user_profile.warehouse if user_profile else None
+
+
+def warehouse_id(user):
+    user_profile = profile(user)
+    return user_profile.warehouse_id if user_profile else None
+
+
+def can_add(user):
+    """Добавлять и импортировать товары могут администраторы и менеджеры"""
+    return user.is_staff or user.role == 'manager'
+
+
+def can_manage_warehouse(user, pk):
+    """Администратор управляет товарами всех складов, сотрудник — только своего"""
+    own_warehouse_id = warehouse_id(user)
+    return user.is_staff or (own_warehouse_id is not None and own_warehouse_id == pk)
+
+
+def can_manage(user, product):
+    return can_manage_warehouse(user, product.warehouse_id)
+
+
+def can_upload(user, product):
+    """Документы к товару загружает любой пользователь, которому виден товар"""
+    return can_view(user, product)
+
+
+def can_view(user, product):
+    """Активные товары видны всем, неактивные — администраторам и сотрудникам склада товара"""
+    return product.is_active or can_manage(user, product)
@@ -0,0 +1,134 @@
+"""Учёт SQL-запросов по представлениям и контроль бюджета запросов.
+
+``QueryBudgetMiddleware`` считает количество и время SQL-запросов каждого
+запроса и пишет их в лог ``products.querybudget``. Представление можно
+пометить декоратором ``query_budget(n)``, отдельный бюджет для метода
+задаётся именованным аргументом (``query_budget(6, POST=9)``): при
+превышении бюджета в лог пишется предупреждение, ответ пользователю не
+меняется. Бюджеты
+закреплены тестами (``products/tests/test_querybudget.py``) через ``assert_max_queries``.
+"""
+import logging
+import time
+from contextlib import ExitStack, contextmanager
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+
+from django.conf import settings
+from django.db import connections
+from django.test.utils import CaptureQueriesContext
+
+logger = logging.getLogger('products.querybudget')
+
+
+class QueryStats:
+    """Счётчик запросов, подключаемый через ``connection.execute_wrapper``"""
+
+    def __init__(self):
+        self.count = 0
+        self.duration = 0.0
+
+    def __call__(self, execute, sql, params, many, context):
+        start = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.duration += time.perf_counter() - start
+            self.count += 1
+
+
+def query_budget(max_queries, **by_method):
+    """Декоратор, задающий максимальное число SQL-запросов представления (и отдельно для методов)"""
+    def decorator(view_func):
+        view_func.query_budget = max_queries
+        view_func.query_budgets = by_method
+        return view_func
+    return decorator
+
+
+def budget_for(view_func, method):
+    """Бюджет представления для HTTP-метода или None, если бюджет не задан"""
+    budget = getattr(view_func, 'query_budget', None)
+    return getattr(view_func, 'query_budgets', {}).get(method, budget)
+
+
+@contextmanager
+def assert_max_queries(max_queries, using='default'):
+    """Проверка, что блок кода выполняет не больше ``max_queries`` запросов"""
+    with CaptureQueriesContext(connections[using]) as context:
+        yield context
+    executed = len(context.captured_queries)
+    if executed > max_queries:
+        queries = '\n'.join(query['sql'] for query in context.captured_queries)
+        raise AssertionError(f'Выполнено {executed} SQL-запросов, допустимо {max_queries}:\n{queries}')
+
+
+@contextmanager
+def _counting(stats):
+    # Считаются запросы ко всем базам, включая реплику для чтения
+    with ExitStack() as stack:
+        for connection in connections.all():
+            stack.enter_context(connection.execute_wrapper(stats))
+        yield
+
+
+class QueryBudgetMiddleware:
+    """Подсчёт запросов; работает и в синхронной, и в асинхронной цепочке middleware"""
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        stats = QueryStats()
+        with _counting(stats):
+            response = self.get_response(request)
+        return self.report(request, response, stats)
+
+    async def __acall__(self, request):
+        stats = QueryStats()
+        with _counting(stats):
+            response = await self.get_response(request)
+        return self.report(request, response, stats)
+
+    def report(self, request, response, stats):
+        if response.streaming and not response.is_async:
+            # Строки потокового ответа (выгрузка) читаются из базы после выхода из middleware:
+            # запросы считаются по мере отдачи ответа, итог пишется в лог в конце
+            response.streaming_content = self._count_stream(request, response.streaming_content, stats)
+            return response
+        if settings.DEBUG:
+            response['X-Query-Count'] = str(stats.count)
+            response['X-Query-Time'] = f'{stats.duration * 1000:.1f}ms'
+        self.log(request, stats)
+        return response
+
+    def _count_stream(self, request, content, stats):
+        iterator = iter(content)
+        try:
+            while True:
+                # Соединения свои у каждого потока, поэтому счётчик подключается на каждую часть
+                with _counting(stats):
+                    chunk = next(iterator, None)
+                if chunk is None:
+                    break
+                yield chunk
+        finally:
+            self.log(request, stats)
+
+    def log(self, request, stats):
+        # Представление берётся из разбора URL, а не из process_view: тот в асинхронной
+        # цепочке выполнялся бы в потоке синхронного кода
+        match = request.resolver_match
+        view_func = match.func if match else None
+        view_name = f'{view_func.__module__}.{view_func.__name__}' if view_func else request.path
+        logger.debug('%s: %d SQL-запросов за %.1f мс', view_name, stats.count, stats.duration * 1000)
+
+        budget = budget_for(view_func, request.method) if view_func else None
+        if budget is not None and stats.count > budget:
+            logger.warning('%s: %d SQL-запросов при бюджете %d', view_name, stats.count, budget)
@@ -0,0 +1,74 @@
+"""Кеш справочников: категории и склады для фильтров и форм.
+
+Справочники меняются несколько раз в день, а нужны почти на каждой
+странице. Снимок (id и название) хранится в памяти процесса и в общем
+кеше ``default`` под ключом с номером версии. Версию увеличивают сигналы
+при сохранении и удалении категорий и складов, поэтому все процессы
+перечитывают снимок уже на следующем запросе. В обычном случае снимок
+стоит одно чтение версии из кеша и ни одного запроса к базе.
+"""
+from collections import namedtuple
+
+from django.core.cache import caches
+
+from . import routers, versions
+from .models import Category, Warehouse
+
+VERSION_KEY = 'catalog:reference:version'
+SNAPSHOT_KEY = 'catalog:reference:{version}'
+SNAPSHOT_TIMEOUT = 24 * 3600
+
+Item = namedtuple('Item', ['id', 'name'])
+Snapshot = namedtuple('Snapshot', ['categories', 'warehouses'])
+
+# (версия, снимок) текущего процесса; заменяется целиком, поэтому потокобезопасно
+_local = (None, None)
+
+
+def get_version():
+    return versions.get(VERSION_KEY)
+
+
+def bump_version():
+    versions.bump(VERSION_KEY)
+
+
+def _load():
+    # Снимок кешируется под новой версией на сутки: с отстающей реплики в него попали бы старые строки
+    with routers.primary():
+        return Snapshot(
+            categories=tuple(Item(*row) for row in Category.objects.order_by('name').values_list('id', 'name')),
+            warehouses=tuple(Item(*row) for row in Warehouse.objects.order_by('name').values_list('id', 'name')),
+        )
+
+
+def snapshot():
+    """Актуальный снимок справочников"""
+    global _local
+    version = get_version()
+    local_version, data = _local
+    if local_version == version:
+        return data
+
+    cache = caches['default']
+    key = SNAPSHOT_KEY.format(version=version)
+    data = cache.get(key)
+    if data is None:
+        data = _load()
+        cache.set(key, data, SNAPSHOT_TIMEOUT)
+    _local = (version, data)
+    return data
+
+
+def categories():
+    return snapshot().categories
+
+
+def warehouses():
+    return snapshot().warehouses
+
+
+def choices(field, items):
+    """Варианты ModelChoiceField из снимка вместо запроса ко всей таблице"""
+    empty = [('', field.empty_label)] if field.empty_label is not None else []
+    return empty + [(item.id, item.name) for item in items]
@@ -0,0 +1,128 @@
+"""Маршрутизация чтения на реплику базы данных.
+
+Если в ``DATABASES`` есть псевдоним ``REPLICA_DATABASE`` (по умолчанию
+``replica``), ``ReplicaRoutingMiddleware`` направляет чтение GET/HEAD
+запросов на реплику, а запись и все запросы с другими методами — на
+основную базу; после записи в GET-запросе чтение до его конца тоже идёт
+из основной базы. После POST клиенту ставится cookie, и в течение
+``REPLICA_STICKY_SECONDS`` его запросы читают основную базу: пользователь
+сразу видит свои изменения, даже если реплика отстаёт. Представления,
+которым нужны свежие данные (формы редактирования), помечаются
+декоратором ``use_primary``; в коде вне запросов есть контекстные
+менеджеры ``primary()`` и ``replica()``.
+
+Для локальной проверки достаточно двух файлов SQLite: укажите копию
+основной базы в ``DATABASE_REPLICA_NAME`` и обновляйте её копированием.
+"""
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+
+PRIMARY = 'default'
+# Сессии читаются только из основной базы: только что созданной сессии на реплике ещё нет
+PRIMARY_ONLY_APPS = {'sessions'}
+
+_read_from_replica = ContextVar('read_from_replica', default=False)
+
+
+def replica_alias():
+    alias = getattr(settings, 'REPLICA_DATABASE', 'replica')
+    return alias if alias in settings.DATABASES else None
+
+
+@contextmanager
+def _reading(value):
+    token = _read_from_replica.set(value)
+    try:
+        yield
+    finally:
+        _read_from_replica.reset(token)
+
+
+def primary():
+    """Чтение из основной базы внутри блока"""
+    return _reading(False)
+
+
+def replica():
+    """Чтение из реплики внутри блока (например, в отчётных командах)"""
+    return _reading(True)
+
+
+def use_primary(view_func):
+    """Декоратор представления, которое всегда читает основную базу"""
+    view_func.use_primary = True
+    return view_func
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        if _read_from_replica.get() and model._meta.app_label not in PRIMARY_ONLY_APPS:
+            return replica_alias() or PRIMARY
+        return PRIMARY
+
+    def db_for_write(self, model, **hints):
+        # После записи чтение до конца запроса (блока replica()) идёт из основной базы:
+        # на реплике записанного ещё нет
+        if _read_from_replica.get():
+            _read_from_replica.set(False)
+        return PRIMARY
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Реплика — копия основной базы, объекты из обеих баз можно связывать
+        return True
+
+    def allow_migrate(self, db, app_label, model_name=None, **hints):
+        # Реплика получает схему вместе с данными из основной базы
+        return db == PRIMARY
+
+
+class ReplicaRoutingMiddleware:
+    STICKY_COOKIE = 'read_primary'
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, 'REPLICA_STICKY_SECONDS', 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        token = self._start(request)
+        try:
+            response = self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        return self._finish(request, response)
+
+    async def __acall__(self, request):
+        token = self._start(request)
+        try:
+            response = await self.get_response(request)
+        finally:
+            _read_from_replica.reset(token)
+        return self._finish(request, response)
+
+    def _start(self, request):
+        use_replica = (
+            replica_alias() is not None
+            and request.method in ('GET', 'HEAD')
+            and self.STICKY_COOKIE not in request.COOKIES
+        )
+        request.reads_from_replica = use_replica
+        return _read_from_replica.set(use_replica)
+
+    def _finish(self, request, response):
+        if request.method not in ('GET', 'HEAD', 'OPTIONS') and replica_alias() is not None:
+            response.set_cookie(self.STICKY_COOKIE, '1', max_age=self.sticky_seconds, httponly=True, samesite='Lax')
+        return response
+
+    def process_view(self, request, view_func, view_args, view_kwargs):
+        if getattr(view_func, 'use_primary', False):
+            request.reads_from_replica = False
+            _read_from_replica.set(False)
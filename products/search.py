@@ -0,0 +1,197 @@
+"""Полнотекстовый поиск по каталогу товаров.
+
+На SQLite используется виртуальная таблица FTS5 ``products_search``
+(rowid = id товара), в которую пишется уже нормализованный текст:
+название, описание, артикул, название категории и склада.
+Индекс обновляется инкрементально сигналами (см. ``products.signals``),
+полная перестройка — командой ``rebuild_search_index``.
+На остальных СУБД поиск откатывается к цепочке ``icontains``.
+"""
+import re
+
+from django.db import connection, transaction
+from django.db.models import Case, F, FloatField, Q, Value, When
+from django.db.models.expressions import RawSQL
+
+SEARCH_TABLE = 'products_search'
+
+# Веса столбцов для bm25: название, описание, артикул, категория, склад
+RANK_WEIGHTS = (10.0, 1.0, 5.0, 2.0, 2.0)
+
+INDEX_BATCH_SIZE = 1000
+
+_TOKEN_RE = re.compile(r'\w+')
+
+
+def normalize(text):
+    """Нормализация текста: casefold и замена ё на е"""
+    if not text:
+        return ''
+    return text.casefold().replace('ё', 'е')
+
+
+def is_supported(using=None):
+    return (using or connection).vendor == 'sqlite'
+
+
+def create_index(schema_editor=None):
+    """Создание таблицы FTS5 (используется в миграции)"""
+    conn = schema_editor.connection if schema_editor else connection
+    if not is_supported(conn):
+        return
+    weights = ', '.join(str(w) for w in RANK_WEIGHTS)
+    with conn.cursor() as cursor:
+        cursor.execute(
+            f"CREATE VIRTUAL TABLE IF NOT EXISTS {SEARCH_TABLE} USING fts5("
+            "name, description, sku, category, warehouse, "
+            "tokenize='unicode61 remove_diacritics 2', prefix='2 3')"
+        )
+        cursor.execute(
+            f"INSERT INTO {SEARCH_TABLE}({SEARCH_TABLE}, rank) VALUES ('rank', %s)",
+            [f'bm25({weights})'],
+        )
+
+
+def drop_index(schema_editor=None):
+    conn = schema_editor.connection if schema_editor else connection
+    if not is_supported(conn):
+        return
+    with conn.cursor() as cursor:
+        cursor.execute(f'DROP TABLE IF EXISTS {SEARCH_TABLE}')
+
+
+def _document_rows(queryset):
+    rows = queryset.values_list(
+        'id', 'name', 'description', 'sku', 'category__name', 'warehouse__name',
+    )
+    for row in rows.iterator(chunk_size=INDEX_BATCH_SIZE):
+        yield (row[0],) + tuple(normalize(value) for value in row[1:])
+
+
+def _write_rows(cursor, rows):
+    cursor.executemany(f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s', [(row[0],) for row in rows])
+    cursor.executemany(
+        f'INSERT INTO {SEARCH_TABLE}(rowid, name, description, sku, category, warehouse) '
+        'VALUES (%s, %s, %s, %s, %s, %s)',
+        rows,
+    )
+
+
+def index_queryset(queryset):
+    """Переиндексация товаров из queryset пачками"""
+    if not is_supported():
+        return 0
+    total = 0
+    batch = []
+    with transaction.atomic(), connection.cursor() as cursor:
+        for row in _document_rows(queryset.order_by()):
+            batch.append(row)
+            if len(batch) >= INDEX_BATCH_SIZE:
+                _write_rows(cursor, batch)
+                total += len(batch)
+                batch = []
+        if batch:
+            _write_rows(cursor, batch)
+            total += len(batch)
+    return total
+
+
+def index_products(product_ids):
+    """Переиндексация товаров по списку id"""
+    from .models import Product
+    return index_queryset(Product.objects.filter(pk__in=list(product_ids)))
+
+
+def remove_products(product_ids):
+    if not is_supported():
+        return
+    with connection.cursor() as cursor:
+        cursor.executemany(
+            f'DELETE FROM {SEARCH_TABLE} WHERE rowid = %s',
+            [(pk,) for pk in product_ids],
+        )
+
+
+def rebuild_index():
+    """Полная перестройка индекса"""
+    from .models import Product
+    if not is_supported():
+        return 0
+    with connection.cursor() as cursor:
+        cursor.execute(f'DELETE FROM {SEARCH_TABLE}')
+    return index_queryset(Product.objects.all())
+
+
+def build_match(query):
+    """Преобразование пользовательского запроса в выражение MATCH.
+
+    Каждое слово ищется по префиксу, слова объединяются через AND
+    (пробел в FTS5): товар должен содержать все слова запроса.
+    """
+    terms = _TOKEN_RE.findall(normalize(query))
+    return ' '.join(f'"{term}"*' for term in terms)
+
+
+def _fallback_filter(queryset, query):
+    for term in query.split():
+        queryset = queryset.filter(
+            Q(name__icontains=term) |
+            Q(description__icontains=term) |
+            Q(sku__icontains=term) |
+            Q(category__name__icontains=term) |
+            Q(warehouse__name__icontains=term)
+        )
+    return queryset
+
+
+def _matched_ids(match):
+    return RawSQL(f'SELECT rowid FROM {SEARCH_TABLE} WHERE {SEARCH_TABLE} MATCH %s', (match,))
+
+
+def filter_products(queryset, query):
+    """Фильтрация товаров по поисковому запросу без ранжирования (сортировка не меняется)"""
+    if not is_supported():
+        return _fallback_filter(queryset, query)
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    return queryset.filter(pk__in=_matched_ids(match))
+
+
+# Ранг товара, артикул которого совпал с запросом: bm25 в FTS5 отрицательный и конечный
+EXACT_SKU_RANK = -1e12
+
+
+def _sku_variants(query):
+    """Запрос как артикул (без пробелов) в исходном и верхнем регистре"""
+    query = query.strip()
+    if not query or any(char.isspace() for char in query):
+        return []
+    return sorted({query, query.upper()})
+
+
+def search_products(queryset, query):
+    """Фильтрация товаров по поисковому запросу с ранжированием.
+
+    Возвращает queryset с аннотацией ``search_rank`` (меньше — релевантнее),
+    отсортированный по релевантности. Товар, артикул которого совпадает с
+    запросом, идёт первым.
+    """
+    if not is_supported():
+        return _fallback_filter(queryset, query)
+    match = build_match(query)
+    if not match:
+        return queryset.none()
+    table = queryset.model._meta.db_table
+    # Таблица FTS5 в FROM, а не коррелированный подзапрос: MATCH выполняется один раз,
+    # rank найденных строк берётся из того же прохода, товары читаются по первичному ключу
+    queryset = queryset.extra(
+        tables=[SEARCH_TABLE],
+        where=[f'{SEARCH_TABLE} MATCH %s', f'{SEARCH_TABLE}.rowid = "{table}"."id"'],
+        params=[match],
+    )
+    rank = RawSQL(f'{SEARCH_TABLE}.rank', (), output_field=FloatField())
+    skus = _sku_variants(query)
+    if skus:
+        rank = Case(When(sku__in=skus, then=Value(EXACT_SKU_RANK)), default=rank, output_field=FloatField())
+    return queryset.annotate(search_rank=rank).order_by(F('search_rank').asc(), '-created_at', '-id')
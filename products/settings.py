@@ -56,28 +56,58 @@ MESSAGE_TAGS = {
 }
 
 AUTH_USER_MODEL = 'products.User'
+# Пользователь сессии загружается одним запросом вместе с профилем и складом (см. products/permissions.py)
+AUTHENTICATION_BACKENDS = ['products.permissions.ProfileBackend']
 
 MEDIA_URL = '/media/'
 MEDIA_ROOT = os.path.join(BASE_DIR, 'media')
 
+# Фоновая генерация уменьшенных копий изображений (см. products/images.py)
+IMAGE_DERIVATIVE_WORKERS = 2
+IMAGE_DERIVATIVE_MAX_PENDING = 100
+
 # Настройки для загружаемых файлов
 FILE_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 DATA_UPLOAD_MAX_MEMORY_SIZE = 10485760  # 10MB
 
+# Загрузка документов частями (см. products/uploads.py): части пишутся во временный каталог
+DOCUMENT_UPLOAD_TEMP_DIR = os.path.join(BASE_DIR, 'upload_tmp')
+DOCUMENT_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # наибольшая часть в одном запросе
+DOCUMENT_UPLOAD_MAX_SIZE = 2 * 1024 * 1024 * 1024  # 2GB
+DOCUMENT_UPLOAD_EXPIRY = 24 * 3600  # незавершённые загрузки удаляются через сутки
+
+# Файлы MEDIA_ROOT отдаются после проверки прав (см. products/downloads.py).
+# Байты передаёт веб-сервер: 'nginx' (X-Accel-Redirect) или 'sendfile' (X-Sendfile);
+# пустое значение — отдача самим Django
+PROTECTED_MEDIA_BACKEND = os.environ.get('PROTECTED_MEDIA_BACKEND', '')
+PROTECTED_MEDIA_INTERNAL_URL = '/protected-media/'
+PROTECTED_MEDIA_MAX_AGE = 3600
+
+# Уведомления о низком остатке (см. products/lowstock.py). При разработке письма выводятся в консоль
+EMAIL_BACKEND = os.environ.get('DJANGO_EMAIL_BACKEND', 'django.core.mail.backends.console.EmailBackend')
+DEFAULT_FROM_EMAIL = os.environ.get('DJANGO_DEFAULT_FROM_EMAIL', 'warehouse@localhost')
+LOW_STOCK_DIGEST_LIMIT = 200  # наибольшее число товаров в одном письме
+
 # Настройки аутентификации
 LOGIN_REDIRECT_URL = 'profile'
 LOGOUT_REDIRECT_URL = 'login'
 
 MIDDLEWARE = [
     'django.middleware.security.SecurityMiddleware',
+    'products.querybudget.QueryBudgetMiddleware',
+    'products.routers.ReplicaRoutingMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
+    'products.permissions.UserContextMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
 
+# Сколько артикулов процесс резервирует за одно обращение к счётчику (см. products/sku.py)
+SKU_BLOCK_SIZE = 100
+
 ROOT_URLCONF = 'products_store.urls'
 
 TEMPLATES = [
@@ -97,8 +127,27 @@ TEMPLATES = [
 ]
 
 WSGI_APPLICATION = 'products.wsgi.application'
+ASGI_APPLICATION = 'products.asgi.application'
+
+# Асинхронные представления каталога (products/async_views.py); включаются в products/asgi.py
+ASYNC_VIEWS = os.environ.get('DJANGO_ASYNC_VIEWS') == '1'
 
 
+# Cache
+# default — общий для всех процессов (версии кеша), fragments — кеш фрагментов шаблонов процесса
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.filebased.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache',
+    },
+    'fragments': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        'LOCATION': 'fragments',
+        'TIMEOUT': 3600,
+        'OPTIONS': {'MAX_ENTRIES': 20000},
+    },
+}
+
 # Database
 # https://docs.djangoproject.com/en/5.2/ref/settings/#databases
 
@@ -109,6 +158,44 @@ DATABASES = {
     }
 }
 
+# Профиль SQLite для продакшена: DJANGO_DB_PROFILE=production.
+# WAL позволяет читать параллельно с записью, busy_timeout — ждать блокировку вместо
+# ошибки "database is locked", IMMEDIATE — брать блокировку записи в начале транзакции.
+# Обслуживание базы — команда sqlite_maintenance, параллельная запись проверяется в products/tests/test_sqlite.py.
+SQLITE_PRAGMAS = {
+    'journal_mode': 'WAL',
+    'synchronous': 'NORMAL',
+    'busy_timeout': 5000,
+    'mmap_size': 256 * 1024 * 1024,
+    'cache_size': -64000,  # в КБ
+    'temp_store': 'MEMORY',
+}
+SQLITE_PRODUCTION_OPTIONS = {
+    'init_command': ';'.join(f'PRAGMA {name}={value}' for name, value in SQLITE_PRAGMAS.items()),
+    'transaction_mode': 'IMMEDIATE',
+    'timeout': SQLITE_PRAGMAS['busy_timeout'] / 1000,
+}
+if os.environ.get('DJANGO_DB_PROFILE') == 'production':
+    DATABASES['default'].update({
+        'CONN_MAX_AGE': 600,
+        'CONN_HEALTH_CHECKS': True,
+        'OPTIONS': SQLITE_PRODUCTION_OPTIONS,
+    })
+
+# Реплика для чтения (см. products/routers.py). Локально — копия db.sqlite3:
+# DATABASE_REPLICA_NAME=db.replica.sqlite3 python manage.py runserver
+if os.environ.get('DATABASE_REPLICA_NAME'):
+    DATABASES['replica'] = {
+        **DATABASES['default'],
+        'NAME': os.environ['DATABASE_REPLICA_NAME'],
+        'TEST': {'MIRROR': 'default'},
+    }
+
+DATABASE_ROUTERS = ['products.routers.ReplicaRouter']
+REPLICA_DATABASE = 'replica'
+# Сколько секунд после POST клиент читает основную базу (защита от отставания реплики)
+REPLICA_STICKY_SECONDS = 10
+
 
 # Password validation
 # https://docs.djangoproject.com/en/5.2/ref/settings/#auth-password-validators
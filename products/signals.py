@@ -0,0 +1,97 @@
+from django.db import transaction
+from django.db.models.signals import post_delete, post_init, post_save
+from django.dispatch import receiver
+
+from . import fragments, images, reference, search, valuation
+from .models import Category, Product, Warehouse
+
+
+@receiver(post_save, sender=Product)
+def product_saved(sender, instance, raw=False, **kwargs):
+    """Обновление поискового индекса при сохранении товара"""
+    if raw:
+        return
+    transaction.on_commit(lambda: search.index_products([instance.pk]))
+
+
+@receiver(post_delete, sender=Product)
+def product_deleted(sender, instance, **kwargs):
+    pk = instance.pk
+    transaction.on_commit(lambda: search.remove_products([pk]))
+
+
+@receiver(post_init, sender=Category)
+@receiver(post_init, sender=Warehouse)
+def remember_name(sender, instance, **kwargs):
+    # Запоминаем исходное название, чтобы не переиндексировать товары без необходимости
+    instance._indexed_name = instance.__dict__.get('name')
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_save, sender=Warehouse)
+def reindex_related_products(sender, instance, created=False, raw=False, **kwargs):
+    """Переиндексация товаров категории или склада при смене названия"""
+    if raw or created or instance._indexed_name == instance.name:
+        return
+    instance._indexed_name = instance.name
+    transaction.on_commit(lambda: search.index_queryset(instance.product_set.all()))
+
+
+@receiver(post_init, sender=Product)
+@receiver(post_init, sender=Warehouse)
+def remember_image(sender, instance, **kwargs):
+    image = instance.__dict__.get('image')
+    instance._original_image = getattr(image, 'name', image)
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_save, sender=Warehouse)
+def generate_image_derivatives(sender, instance, raw=False, **kwargs):
+    """Фоновая генерация уменьшенных копий нового изображения"""
+    name = instance.image.name if instance.image else None
+    if raw or not name or name == instance._original_image:
+        return
+    instance._original_image = name
+    transaction.on_commit(lambda: images.schedule(name))
+
+
+@receiver(post_save, sender=Product)
+@receiver(post_delete, sender=Product)
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_fragments(sender, raw=False, **kwargs):
+    """Сброс кешированных карточек и строк товаров"""
+    if raw:
+        return
+    transaction.on_commit(fragments.bump_version)
+
+
+@receiver(post_save, sender=Category)
+@receiver(post_delete, sender=Category)
+@receiver(post_save, sender=Warehouse)
+@receiver(post_delete, sender=Warehouse)
+def invalidate_reference(sender, raw=False, **kwargs):
+    """Сброс снимка справочников во всех процессах"""
+    if raw:
+        return
+    transaction.on_commit(reference.bump_version)
+
+
+@receiver(post_init, sender=Product)
+def remember_valuation(sender, instance, **kwargs):
+    valuation.remember(instance)
+
+
+@receiver(post_save, sender=Product)
+def update_valuation(sender, instance, created=False, raw=False, update_fields=None, **kwargs):
+    """Изменение сводки стоимости остатков в той же транзакции, что и товар"""
+    if raw:
+        return
+    valuation.product_saved(instance, created, update_fields)
+
+
+@receiver(post_delete, sender=Product)
+def remove_from_valuation(sender, instance, **kwargs):
+    valuation.product_deleted(instance)
@@ -0,0 +1,92 @@
+"""Выдача артикулов без проверки занятости перед записью.
+
+Номера берутся из счётчика ``SkuSequence`` блоками: один UPDATE
+резервирует сразу ``size`` значений, поэтому параллельные процессы
+(воркеры gunicorn) никогда не получат одинаковые номера. Процесс держит
+текущий блок в памяти (блок, зарезервированный в транзакции, — после
+её фиксации) и обращается к базе только при его исчерпании.
+Номер переводится в артикул ``SKU-XXXXXXXXX`` через взаимно однозначное
+перемешивание, чтобы соседние артикулы не шли подряд. Прежние случайные
+артикулы ``SKU-XXXXXXXX`` на символ короче, поэтому с выданными из
+счётчика они не совпадают.
+"""
+import itertools
+import os
+import threading
+from functools import partial
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import F
+
+from .models import SkuSequence
+
+SEQUENCE_NAME = 'product'
+ALPHABET = '0123456789ABCDEFGHIJKLMNOPQRSTUVWXYZ'
+# Прежние случайные артикулы — 8 символов после SKU-
+SKU_LENGTH = 9
+SKU_SPACE = len(ALPHABET) ** SKU_LENGTH
+# Множитель взаимно прост с 36, поэтому n -> n * MULTIPLIER mod 36^9 — биекция
+MULTIPLIER = 1500450271
+OFFSET = 723121907
+
+_lock = threading.Lock()
+_block = iter(())
+_block_pid = None
+
+
+def format_sku(number):
+    value = (number * MULTIPLIER + OFFSET) % SKU_SPACE
+    chars = []
+    for _ in range(SKU_LENGTH):
+        value, index = divmod(value, len(ALPHABET))
+        chars.append(ALPHABET[index])
+    return 'SKU-' + ''.join(reversed(chars))
+
+
+def reserve_block(size, name=SEQUENCE_NAME):
+    """Резервирование ``size`` номеров одним обновлением счётчика"""
+    with transaction.atomic():
+        updated = SkuSequence.objects.filter(name=name).update(last_value=F('last_value') + size)
+        if not updated:
+            try:
+                with transaction.atomic():
+                    SkuSequence.objects.create(name=name, last_value=size)
+            except IntegrityError:
+                # Счётчик только что создал другой процесс
+                SkuSequence.objects.filter(name=name).update(last_value=F('last_value') + size)
+        last_value = SkuSequence.objects.filter(name=name).values_list('last_value', flat=True).get()
+    return range(last_value - size + 1, last_value + 1)
+
+
+def allocate_skus(count):
+    """Список из ``count`` новых артикулов за одно обращение к базе"""
+    if count <= 0:
+        return []
+    return [format_sku(number) for number in reserve_block(count)]
+
+
+def _take():
+    """Номер из блока текущего процесса или None"""
+    # После fork блок родителя не используется, иначе номера совпадут
+    return next(_block, None) if _block_pid == os.getpid() else None
+
+
+def _keep(numbers):
+    global _block, _block_pid
+    with _lock:
+        _block = itertools.chain(_block if _block_pid == os.getpid() else (), numbers)
+        _block_pid = os.getpid()
+
+
+def next_sku():
+    """Следующий артикул из блока текущего процесса"""
+    with _lock:
+        number = _take()
+    if number is None:
+        block = reserve_block(getattr(settings, 'SKU_BLOCK_SIZE', 100))
+        number = block[0]
+        # Резерв внутри транзакции (add_product, админка) откатится вместе с ней, поэтому остаток
+        # блока попадает в кеш только после фиксации; вне транзакции колбэк выполняется сразу
+        transaction.on_commit(partial(_keep, block[1:]))
+    return format_sku(number)
@@ -0,0 +1,190 @@
+"""Учёт остатков через журнал движений ``StockMovement``.
+
+``Product.quantity`` хранит текущий остаток как кешированную сумму
+журнала. Остаток меняется только здесь: одним ``UPDATE ... SET quantity =
+quantity + delta`` вместе с записью движения в одной транзакции, поэтому
+одновременные поступления не затирают друг друга, а списание сверх
+остатка отклоняется условием в том же UPDATE. Расхождения остатков с
+журналом исправляет команда ``reconcile_stock``.
+"""
+from django.db import transaction
+from django.db.models import Case, F, IntegerField, OuterRef, Subquery, Sum, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import valuation
+from .models import Product, StockMovement
+
+OPENING_BALANCE_REASON = 'Начальный остаток'
+BATCH_CHUNK_SIZE = 500
+
+
+class InsufficientStock(Exception):
+    pass
+
+
+def move(product, kind, delta, user=None, reason=''):
+    """Проведение движения: атомарное изменение остатка и запись в журнал"""
+    if not delta:
+        raise ValueError('Движение с нулевым количеством')
+    if (kind == StockMovement.RECEIPT and delta < 0) or (kind == StockMovement.ISSUE and delta > 0):
+        raise ValueError(f'Недопустимый знак количества для движения {kind}')
+
+    with transaction.atomic():
+        products = Product.objects.filter(pk=product.pk)
+        if delta < 0:
+            products = products.filter(quantity__gte=-delta)
+        # updated_at меняется вручную: update() не вызывает auto_now, а от него зависят кеш и ETag
+        if not products.update(quantity=F('quantity') + delta, updated_at=timezone.now()):
+            raise InsufficientStock(f'Недостаточно товара "{product.name}" для списания {-delta} шт.')
+        valuation.stock_moved(product, delta)
+        return StockMovement.objects.create(product=product, kind=kind, quantity=delta, user=user, reason=reason)
+
+
+def receive(product, quantity, user=None, reason=''):
+    return move(product, StockMovement.RECEIPT, quantity, user, reason)
+
+
+def issue(product, quantity, user=None, reason=''):
+    return move(product, StockMovement.ISSUE, -quantity, user, reason)
+
+
+def adjust(product, delta, user=None, reason=''):
+    return move(product, StockMovement.ADJUSTMENT, delta, user, reason)
+
+
+def record_opening_balances(products, user=None):
+    """Запись в журнал остатков только что созданных товаров"""
+    StockMovement.objects.bulk_create([
+        StockMovement(product=product, kind=StockMovement.RECEIPT, quantity=product.quantity,
+                      user=user, reason=OPENING_BALANCE_REASON)
+        for product in products
+        if product.quantity
+    ], batch_size=1000)
+
+
+def save_product(product, previous_quantity, user=None, reason='Изменение количества в карточке товара'):
+    """Сохранение отредактированного товара: новое количество проводится корректировкой
+
+    ``previous_quantity`` — остаток, от которого отталкивался пользователь.
+    Разница применяется к текущему остатку в базе, поэтому движения,
+    проведённые другими пользователями во время редактирования, сохраняются.
+    """
+    delta = product.quantity - previous_quantity
+    fields = [field.name for field in Product._meta.concrete_fields
+              if not field.primary_key and field.name != 'quantity']
+    with transaction.atomic():
+        product.quantity = previous_quantity
+        product.save(update_fields=fields)
+        if delta:
+            adjust(product, delta, user, reason)
+    product.refresh_from_db(fields=['quantity', 'updated_at'])
+
+
+def _line_error(kind, sku, delta):
+    if not isinstance(sku, str) or not sku.strip():
+        return 'не указан артикул'
+    if isinstance(delta, bool) or not isinstance(delta, int) or not delta:
+        return 'изменение количества должно быть ненулевым целым числом'
+    if (kind == StockMovement.RECEIPT and delta < 0) or (kind == StockMovement.ISSUE and delta > 0):
+        return 'знак изменения не соответствует типу движения'
+    return None
+
+
+def apply_batch(lines, user=None, kind=StockMovement.ADJUSTMENT, reason='', can_manage=None):
+    """Пакетное проведение движений по парам (артикул, изменение количества)
+
+    Артикулы ищутся одним запросом ``IN`` на пачку, остатки товаров пачки
+    меняются одним UPDATE с CASE, движения вставляются ``bulk_create``.
+    Ошибочные строки пропускаются, остальные проводятся в одной транзакции.
+    ``can_manage(warehouse_id)`` проверяет право на товары склада.
+    Возвращает результат по каждой строке в исходном порядке.
+    """
+    results = [None] * len(lines)
+    by_sku = {}
+    for index, (sku, delta) in enumerate(lines):
+        error = _line_error(kind, sku, delta)
+        if error:
+            results[index] = {'line': index + 1, 'sku': sku, 'status': 'error', 'error': error}
+        else:
+            by_sku.setdefault(sku.strip(), []).append((index, delta))
+
+    skus = list(by_sku)
+    with transaction.atomic():
+        for start in range(0, len(skus), BATCH_CHUNK_SIZE):
+            _apply_chunk(skus[start:start + BATCH_CHUNK_SIZE], by_sku, results, user, kind, reason, can_manage)
+    return results
+
+
+def _apply_chunk(skus, by_sku, results, user, kind, reason, can_manage):
+    products = {
+        row[1]: row
+        for row in Product.objects.select_for_update().filter(sku__in=skus).order_by()
+        .values_list('pk', 'sku', 'warehouse_id', 'quantity', 'category_id', 'price')
+    }
+
+    changes = {}
+    movements = []
+    deltas = valuation.Deltas()
+    for sku in skus:
+        lines = by_sku[sku]
+        total = sum(delta for _, delta in lines)
+        error = None
+        if sku not in products:
+            error = 'товар с таким артикулом не найден'
+        else:
+            pk, _, warehouse_id, quantity, category_id, price = products[sku]
+            if can_manage is not None and not can_manage(warehouse_id):
+                error = 'нет прав на товары этого склада'
+            elif quantity + total < 0:
+                error = f'недостаточно товара: остаток {quantity}, изменение {total:+d}'
+
+        for index, delta in lines:
+            if error:
+                results[index] = {'line': index + 1, 'sku': sku, 'status': 'error', 'error': error}
+            else:
+                results[index] = {'line': index + 1, 'sku': sku, 'status': 'ok', 'quantity': quantity + total}
+                movements.append(StockMovement(product_id=pk, kind=kind, quantity=delta, user=user, reason=reason))
+        if not error:
+            changes[pk] = total
+            deltas.add_units(warehouse_id, category_id, price, total)
+
+    if changes:
+        Product.objects.filter(pk__in=changes).update(
+            quantity=F('quantity') + Case(
+                *(When(pk=pk, then=Value(delta)) for pk, delta in changes.items()),
+                default=Value(0), output_field=IntegerField(),
+            ),
+            updated_at=timezone.now(),
+        )
+        StockMovement.objects.bulk_create(movements, batch_size=1000)
+        deltas.apply()
+
+
+def ledger_balance():
+    """Остаток товара по журналу (подзапрос для annotate и update)"""
+    totals = (
+        StockMovement.objects.filter(product=OuterRef('pk'))
+        .order_by()
+        .values('product')
+        .annotate(total=Sum('quantity'))
+        .values('total')
+    )
+    return Coalesce(Subquery(totals, output_field=IntegerField()), 0)
+
+
+def discrepancies():
+    """Товары, остаток которых расходится с журналом"""
+    return Product.objects.annotate(ledger_quantity=ledger_balance()).exclude(quantity=F('ledger_quantity'))
+
+
+def reconcile(product_ids, batch_size=1000):
+    """Пересчёт остатков товаров по журналу пачками"""
+    updated = 0
+    for start in range(0, len(product_ids), batch_size):
+        with transaction.atomic():
+            # Остаток вычисляется в том же UPDATE, поэтому параллельно проведённые движения не теряются
+            updated += Product.objects.filter(pk__in=product_ids[start:start + batch_size]).update(
+                quantity=ledger_balance(), updated_at=timezone.now(),
+            )
+    return updated
@@ -0,0 +1,28 @@
+from django import template
+
+from products import images
+
+register = template.Library()
+
+
+@register.inclusion_tag('includes/responsive_image.html')
+def responsive_image(image, alt='', css_class='', style='', sizes='100vw'):
+    """Тег <picture> с производными копиями изображения в разных форматах"""
+    context = {
+        'image': image,
+        'alt': alt,
+        'css_class': css_class,
+        'style': style,
+        'sizes': sizes,
+        'sources': [],
+        'fallback': image.url,
+    }
+    if images.has_derivatives(image.name):
+        context['sources'] = [
+            {'type': mime_type, 'srcset': images.srcset(image.name, extension)}
+            for extension, mime_type, _ in images.FORMATS[:-1]
+        ]
+        extension = images.FORMATS[-1][0]
+        context['fallback_srcset'] = images.srcset(image.name, extension)
+        context['fallback'] = images.storage_url(image.name, images.DERIVATIVE_WIDTHS[1], extension)
+    return context
@@ -0,0 +1,80 @@
+import json
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products import stock
+from products.models import Category, Product, StockMovement, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES, interfere
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StockAdjustApiTests(TestCase):
+    """Пакетная корректировка остатков: результат по строкам, права склада, 409 при гонке"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+        cls.client_user = User.objects.create_user('client', password='x')
+
+    def setUp(self):
+        self.hammer = self.create('HAM-1', 10, self.warehouse)
+        self.pliers = self.create('PLI-1', 3, self.warehouse)
+        self.other = self.create('OTH-1', 5, self.other_warehouse)
+
+    def create(self, sku, quantity, warehouse):
+        product = Product.objects.create(name=sku, sku=sku, category=self.category, warehouse=warehouse,
+                                         price=Decimal('1.00'))
+        stock.receive(product, quantity)
+        return product
+
+    def post(self, payload, user=None):
+        self.client.force_login(user or self.admin)
+        return self.client.post(reverse('api_stock_adjust'), json.dumps(payload), content_type='application/json')
+
+    def quantities(self):
+        return dict(Product.objects.values_list('sku', 'quantity'))
+
+    def test_response_shape(self):
+        response = self.post({'kind': 'issue', 'reason': 'Смена 1', 'lines': [
+            {'sku': 'HAM-1', 'delta': -4}, ['PLI-1', -1], {'sku': 'NONE', 'delta': -1}, 'HAM-1',
+        ]})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.json(), {'applied': 2, 'errors': 2, 'results': [
+            {'line': 1, 'sku': 'HAM-1', 'status': 'ok', 'quantity': 6},
+            {'line': 2, 'sku': 'PLI-1', 'status': 'ok', 'quantity': 2},
+            {'line': 3, 'sku': 'NONE', 'status': 'error', 'error': 'товар с таким артикулом не найден'},
+            {'line': 4, 'sku': None, 'status': 'error', 'error': 'не указан артикул'},
+        ]})
+        self.assertEqual(self.quantities(), {'HAM-1': 6, 'PLI-1': 2, 'OTH-1': 5})
+        movement = self.hammer.movements.order_by('-pk').first()
+        self.assertEqual((movement.kind, movement.reason, movement.user), (StockMovement.ISSUE, 'Смена 1', self.admin))
+
+    def test_manager_limited_to_own_warehouse(self):
+        response = self.post({'lines': [['HAM-1', 1], ['OTH-1', 1]]}, user=self.manager)
+        self.assertEqual([result['status'] for result in response.json()['results']], ['ok', 'error'])
+        self.assertEqual(self.quantities(), {'HAM-1': 11, 'PLI-1': 3, 'OTH-1': 5})
+        self.assertEqual(self.post({'lines': [['HAM-1', 1]]}, user=self.client_user).status_code, 403)
+
+    def test_concurrent_change_rolls_back_batch(self):
+        # Параллельное списание после проверки: ни одна строка пачки не проводится
+        with interfere('PLI-1', 0):
+            response = self.post({'lines': [['HAM-1', 5], ['PLI-1', -3]]})
+        self.assertEqual(response.status_code, 409)
+        self.assertEqual(self.quantities()['HAM-1'], 10)
+        self.assertEqual(self.hammer.movements.count(), 1)
+
+    def test_invalid_request(self):
+        for payload in ({}, {'lines': []}, {'kind': 'theft', 'lines': [['HAM-1', 1]]}):
+            with self.subTest(payload=payload):
+                self.assertEqual(self.post(payload).status_code, 400)
+        self.client.force_login(self.admin)
+        response = self.client.post(reverse('api_stock_adjust'), 'not json', content_type='application/json')
+        self.assertEqual(response.status_code, 400)
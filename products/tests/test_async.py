@@ -0,0 +1,78 @@
+from decimal import Decimal
+
+from django.conf import settings
+from django.contrib import admin
+from django.test import TestCase, override_settings
+from django.urls import include, path, reverse
+from django.utils.module_loading import import_string
+
+from products import async_views, search, urls
+from products.models import Category, Product, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES, create_products
+
+# Маршруты проекта с асинхронными страницами каталога, как при ASYNC_VIEWS = True
+ASYNC_VIEWS = {name: getattr(async_views, name) for name in ('product_list', 'product_detail', 'warehouse_detail')}
+urlpatterns = [
+    path('admin/', admin.site.urls),
+    path('', include([
+        path(str(pattern.pattern), ASYNC_VIEWS[pattern.name], name=pattern.name)
+        if pattern.name in ASYNC_VIEWS else pattern
+        for pattern in urls.urlpatterns
+    ])),
+]
+
+
+@override_settings(CACHES=TEST_CACHES, ROOT_URLCONF=__name__)
+class AsyncViewTests(TestCase):
+    """Страницы каталога под ASGI: запрос проходит через AsyncClient и асинхронную цепочку middleware"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+        create_products(cls.category, cls.warehouse, 5)
+        cls.hammer = Product.objects.create(name='Молоток слесарный', sku='HAM-1', category=cls.category,
+                                            warehouse=cls.warehouse, price=Decimal('10.00'))
+        # Сигналы индексируют товары в on_commit, который в TestCase не выполняется
+        search.rebuild_index()
+
+    def test_middleware_is_async_capable(self):
+        # Синхронное middleware переводит весь запрос в единственный поток синхронного кода
+        for name in settings.MIDDLEWARE:
+            self.assertTrue(getattr(import_string(name), 'async_capable', False), name)
+
+    async def test_product_list(self):
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get(reverse('product_list'))
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'Молоток слесарный')
+
+    async def test_search(self):
+        await self.async_client.aforce_login(self.manager)
+        for query in ('молоток', 'HAM-1'):
+            response = await self.async_client.get(reverse('product_list'), {'q': query})
+            self.assertEqual(response.status_code, 200)
+            self.assertEqual(list(response.context['products']), [self.hammer])
+
+    async def test_product_detail(self):
+        await self.async_client.aforce_login(self.manager)
+        response = await self.async_client.get(reverse('product_detail', args=[self.hammer.pk]))
+        self.assertContains(response, 'Молоток слесарный')
+
+    async def test_not_modified(self):
+        await self.async_client.aforce_login(self.manager)
+        url = reverse('product_detail', args=[self.hammer.pk])
+        # ETag выдаётся, когда у клиента уже есть CSRF-cookie
+        await self.async_client.get(url)
+        response = await self.async_client.get(url)
+        response = await self.async_client.get(url, headers={'If-None-Match': response['ETag']})
+        self.assertEqual(response.status_code, 304)
+
+    async def test_warehouse_detail(self):
+        await self.async_client.aforce_login(self.admin)
+        response = await self.async_client.get(reverse('warehouse_detail', args=[self.warehouse.pk]))
+        self.assertContains(response, 'Молоток слесарный')
@@ -0,0 +1,39 @@
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products.models import Category, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES, create_products
+
+
+@override_settings(CACHES=TEST_CACHES)
+class CatalogVisibilityTests(TestCase):
+    """Неактивные товары в каталоге, API и выгрузке видны только тем, кто может открыть их карточку"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.other_warehouse)
+        cls.user = User.objects.create_user('user', password='x')
+        cls.active = create_products(cls.category, cls.warehouse, 2)
+        cls.hidden = create_products(cls.category, cls.other_warehouse, 2, start=10, is_active=False)
+
+    def html_ids(self, user):
+        self.client.force_login(user)
+        return {product.pk for product in self.client.get(reverse('product_list')).context['products']}
+
+    def test_product_list_page(self):
+        active = {product.pk for product in self.active}
+        hidden = {product.pk for product in self.hidden}
+        self.assertEqual(self.html_ids(self.user), active)
+        self.assertEqual(self.html_ids(self.admin), active | hidden)
+        # Сотрудник склада видит только свой склад, включая неактивные товары
+        self.assertEqual(self.html_ids(self.manager), hidden)
+
+    def test_hidden_product_detail(self):
+        self.client.force_login(self.user)
+        self.assertEqual(self.client.get(reverse('product_detail', args=[self.hidden[0].pk])).status_code, 403)
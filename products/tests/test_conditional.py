@@ -0,0 +1,95 @@
+from datetime import timedelta
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES, create_products
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ConditionalResponseTests(TestCase):
+    """ETag и Last-Modified страниц и API: 304 без изменений и полный ответ после изменения товара"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+        create_products(cls.category, cls.warehouse, 30)
+        cls.product = Product.objects.order_by('-created_at', '-id').first()
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+        self.client.force_login(self.manager)
+        # Страницы выдают ETag, когда у клиента уже есть CSRF-cookie
+        self.client.get(reverse('product_list'))
+
+    def urls(self):
+        yield reverse('product_list')
+        yield reverse('product_list') + '?q=товар'
+        yield reverse('product_detail', args=[self.product.pk])
+        yield reverse('api_product_list')
+        yield reverse('api_product_detail', args=[self.product.pk])
+
+    def touch(self, product, seconds):
+        # Время на несколько секунд вперёд: Last-Modified передаётся с точностью до секунды
+        Product.objects.filter(pk=product.pk).update(updated_at=timezone.now() + timedelta(seconds=seconds))
+
+    def test_if_none_match(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(url, headers={'If-None-Match': response['ETag']})
+                self.assertEqual(response.status_code, 304)
+
+    def test_if_modified_since(self):
+        for url in self.urls():
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                response = self.client.get(url, headers={'If-Modified-Since': response['Last-Modified']})
+                self.assertEqual(response.status_code, 304)
+
+    def test_changed_product(self):
+        for i, url in enumerate(self.urls()):
+            with self.subTest(url=url):
+                response = self.client.get(url)
+                etag, last_modified = response['ETag'], response['Last-Modified']
+                self.touch(self.product, seconds=5 * (i + 1))
+                response = self.client.get(url, headers={'If-None-Match': etag})
+                self.assertEqual(response.status_code, 200)
+                response = self.client.get(url, headers={'If-Modified-Since': last_modified})
+                self.assertEqual(response.status_code, 200)
+
+    def test_deleted_product(self):
+        # Удаление не обязательно меняет максимальный updated_at, но меняет число товаров
+        url = reverse('product_list')
+        etag = self.client.get(url)['ETag']
+        Product.objects.order_by('created_at', 'id').first().delete()
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
+
+    def test_state_is_one_query(self):
+        # Сессия, пользователь и одно агрегирование вместо выборки страницы
+        url = reverse('product_list') + '?q=товар'
+        etag = self.client.get(url)['ETag']
+        with self.assertNumQueries(3):
+            self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+
+    def test_warehouse_list(self):
+        self.client.force_login(self.admin)
+        self.client.get(reverse('product_list'))
+        url = reverse('warehouse_list')
+        etag = self.client.get(url)['ETag']
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 304)
+        # Перевод сотрудника меняет счётчики на странице, хотя склады не менялись
+        other = Warehouse.objects.create(name='Резервный', address='Тверь')
+        etag = self.client.get(url)['ETag']
+        UserProfile.objects.filter(user=self.manager).update(warehouse=other)
+        self.assertEqual(self.client.get(url, headers={'If-None-Match': etag}).status_code, 200)
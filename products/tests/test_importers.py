@@ -0,0 +1,92 @@
+from decimal import Decimal
+from unittest import mock
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products import valuation
+from products.importers import ProductImporter, read_rows
+from products.models import Category, Product, StockMovement, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES
+
+HEADER = 'Название;Артикул;Категория;Склад;Цена;Количество\n'
+
+
+def csv_file(*lines):
+    return SimpleUploadedFile('products.csv', (HEADER + ''.join(f'{line}\n' for line in lines)).encode())
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ProductImportTests(TestCase):
+    """Импорт CSV: корректные строки сохраняются, по ошибочным — отчёт, а не 500"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+
+    def run_import(self, uploaded, user=None, **kwargs):
+        return ProductImporter(user or self.admin, **kwargs).run(read_rows(uploaded))
+
+    def test_valid_file(self):
+        self.client.force_login(self.manager)
+        response = self.client.post(reverse('import_products'), {'file': csv_file(
+            'Молоток;HAM-1;Инструменты;;350,50;4',
+            'Отвёртка;;инструменты;Основной;120;0',
+        )})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response.context['result'].created, 2)
+        hammer = Product.objects.get(sku='HAM-1')
+        self.assertEqual((hammer.price, hammer.quantity, hammer.warehouse), (Decimal('350.50'), 4, self.warehouse))
+        self.assertTrue(Product.objects.get(name='Отвёртка').sku)
+        self.assertEqual(StockMovement.objects.filter(product=hammer).get().quantity, 4)
+        self.assertEqual(valuation.drift(), {})
+
+    def test_duplicate_rows(self):
+        Product.objects.create(name='Молоток', sku='HAM-1', category=self.category, warehouse=self.warehouse,
+                               price=Decimal('1.00'))
+        # Повтор в следующей пачке — тоже повтор в файле
+        result = self.run_import(csv_file(
+            'Молоток;HAM-1;Инструменты;Основной;10;1',
+            'Клещи;PLI-1;Инструменты;Основной;10;1',
+            'Клещи;PLI-1;Инструменты;Основной;10;1',
+            'Кусачки;CUT-1;Инструменты;Основной;10;1',
+            'Кусачки;CUT-1;Инструменты;Основной;10;1',
+        ), batch_size=4)
+        self.assertEqual(result.created, 2)
+        self.assertEqual(sorted(result.errors), [
+            (2, 'товар с артикулом HAM-1 уже существует'),
+            (4, 'артикул PLI-1 повторяется в файле'),
+            (6, 'артикул CUT-1 повторяется в файле'),
+        ])
+
+    def test_bad_row(self):
+        result = self.run_import(csv_file(
+            'Молоток;;Инструменты;Основной;10;1',
+            ';;Мебель;Резервный;дорого;-1',
+        ))
+        self.assertEqual(result.created, 1)
+        self.assertEqual(result.errors, [(3, 'не указано название; категория "Мебель" не найдена; '
+                                             'склад "Резервный" не найден; некорректная цена "дорого"; '
+                                             'некорректное количество "-1"')])
+
+    def test_sku_taken_after_check(self):
+        # Параллельное сохранение заняло артикул между проверкой и вставкой
+        Product.objects.create(name='Молоток', sku='HAM-1', category=self.category, warehouse=self.warehouse,
+                               price=Decimal('1.00'))
+        with mock.patch.object(ProductImporter, '_existing_skus', return_value=set()):
+            result = self.run_import(csv_file(
+                'Клещи;PLI-1;Инструменты;Основной;10;1',
+                'Молоток;HAM-1;Инструменты;Основной;10;1',
+                'Кусачки;;Инструменты;Основной;10;1',
+            ))
+        self.assertEqual(result.created, 2)
+        self.assertEqual(result.errors, [(3, 'товар с артикулом HAM-1 уже существует')])
+        self.assertEqual(Product.objects.count(), 3)
+        self.assertEqual(StockMovement.objects.count(), 2)
+        self.assertEqual(valuation.drift(), {})
@@ -0,0 +1,83 @@
+from decimal import Decimal
+
+from django.core import mail
+from django.test import TestCase, override_settings
+
+from products import lowstock, stock
+from products.models import Category, LowStockAlert, Product, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES)
+class LowStockDigestTests(TestCase):
+    """Письмо менеджеру склада: остаток не выше минимума, без повторов, снова после восстановления"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.category = Category.objects.create(name='Инструменты', reorder_level=5)
+        cls.manager = User.objects.create_user('manager', password='x', role='manager', email='manager@example.com')
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+
+    def setUp(self):
+        # Минимум товара — 3, у остальных минимум категории — 5
+        self.hammer = self.create('HAM-1', 3, reorder_level=3)
+        self.pliers = self.create('PLI-1', 5)
+        self.saw = self.create('SAW-1', 6)
+        self.drill = self.create('DRL-1', 4, reorder_level=2)
+        self.other = self.create('OTH-1', 0, warehouse=self.other_warehouse)
+
+    def create(self, sku, quantity, warehouse=None, **extra):
+        product = Product.objects.create(name=sku, sku=sku, category=self.category, price=Decimal('1.00'),
+                                         warehouse=warehouse or self.warehouse, **extra)
+        if quantity:
+            stock.receive(product, quantity)
+        return product
+
+    def alerted(self):
+        return set(LowStockAlert.objects.values_list('product__sku', flat=True))
+
+    def test_threshold(self):
+        # Остаток, равный минимуму, уже низкий; минимум товара важнее минимума категории
+        result = lowstock.scan()
+        self.assertEqual(result, lowstock.ScanResult(found=2, notified=2, recovered=0, digests=1))
+        self.assertEqual(self.alerted(), {'HAM-1', 'PLI-1'})
+        [message] = mail.outbox
+        self.assertEqual(message.to, ['manager@example.com'])
+        self.assertIn('«Основной»: 2 товаров', message.subject)
+        self.assertIn('HAM-1', message.body)
+        self.assertNotIn('SAW-1', message.body)
+        self.assertNotIn('OTH-1', message.body)
+
+    def test_no_repeat(self):
+        lowstock.scan()
+        stock.issue(self.hammer, 1)
+        result = lowstock.scan()
+        self.assertEqual(result, lowstock.ScanResult(found=2, notified=0, recovered=0, digests=0))
+        self.assertEqual(len(mail.outbox), 1)
+        # Новый товар с низким остатком приходит отдельным письмом только с ним
+        stock.issue(self.saw, 1)
+        self.assertEqual(lowstock.scan().notified, 1)
+        self.assertEqual(len(mail.outbox), 2)
+        self.assertIn('SAW-1', mail.outbox[1].body)
+        self.assertNotIn('HAM-1', mail.outbox[1].body)
+
+    def test_recovery_resets_alert(self):
+        lowstock.scan()
+        stock.receive(self.hammer, 1)
+        result = lowstock.scan()
+        self.assertEqual((result.recovered, result.digests), (1, 0))
+        self.assertEqual(self.alerted(), {'PLI-1'})
+        # Следующее снижение снова попадает в письмо
+        stock.issue(self.hammer, 1)
+        self.assertEqual(lowstock.scan().notified, 1)
+        self.assertIn('HAM-1', mail.outbox[-1].body)
+        self.assertEqual(self.alerted(), {'HAM-1', 'PLI-1'})
+
+    def test_dry_run(self):
+        result = lowstock.scan(send=False)
+        self.assertEqual((result.found, result.notified), (2, 2))
+        self.assertEqual(mail.outbox, [])
+        self.assertFalse(LowStockAlert.objects.exists())
@@ -0,0 +1,38 @@
+from decimal import Decimal
+
+from django.test import TestCase
+
+from products import downloads, images
+from products.models import Category, Product, User, UserProfile, Warehouse
+
+
+class MediaAccessTests(TestCase):
+    """Копия изображения доступна тем же, кому её исходник, и только ему"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Инструменты')
+        warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.manager, warehouse=warehouse)
+        for image, is_active in (('products/foo.jpg', True), ('products/foo.png', False), ('products/foo.x.jpg', False)):
+            Product.objects.create(name=image, category=cls.category, warehouse=other_warehouse,
+                                   price=Decimal('1.00'), image=image, is_active=is_active)
+
+    def test_derivative_names(self):
+        self.assertNotEqual(images.derivative_name('products/foo.jpg', 320, 'webp'),
+                            images.derivative_name('products/foo.png', 320, 'webp'))
+        for source in ('products/foo.jpg', 'products/foo_320.png'):
+            self.assertEqual(images.source_name(images.derivative_name(source, 320, 'webp')), source)
+        self.assertIsNone(images.source_name('products/foo.jpg'))
+
+    def test_derivative_follows_its_source(self):
+        def can_view(name):
+            return downloads._can_view_file(self.manager, name)
+
+        self.assertTrue(can_view('products/foo.jpg'))
+        self.assertTrue(can_view(images.derivative_name('products/foo.jpg', 320, 'webp')))
+        # Неактивные товары чужого склада с похожими именами файлов
+        self.assertFalse(can_view(images.derivative_name('products/foo.png', 320, 'webp')))
+        self.assertFalse(can_view(images.derivative_name('products/foo.x.jpg', 320, 'webp')))
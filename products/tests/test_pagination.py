@@ -0,0 +1,99 @@
+import base64
+import json
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+
+from products.models import Category, Product, User, Warehouse
+from products.pagination import InvalidCursor, KeysetPaginator
+
+from .utils import TEST_CACHES, create_products
+
+
+def cursor(payload):
+    return base64.urlsafe_b64encode(json.dumps(payload).encode()).decode()
+
+
+TAMPERED_CURSORS = [
+    '!!!',
+    'bm90IGpzb24',
+    cursor([1, 2]),
+    cursor({'d': 'x', 'v': ['2024-01-01T00:00:00+00:00', 1]}),
+    cursor({'d': 'n', 'v': ['2024-01-01T00:00:00+00:00']}),
+    cursor({'d': 'n', 'v': ['вчера', 1]}),
+    cursor({'d': 'n', 'v': ['2024-01-01T00:00:00+00:00', 'x']}),
+    cursor({'d': 'n', 'v': [None, None]}),
+    cursor({'d': 'p', 'v': [{'a': 1}, [1]]}),
+]
+
+
+@override_settings(CACHES=TEST_CACHES)
+class KeysetPaginationTests(TestCase):
+    """Курсорная пагинация: переходы вперёд и назад, одинаковые даты, испорченный курсор"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        create_products(cls.category, cls.warehouse, 7)
+        # Одинаковое время создания у всех товаров: порядок и границы страниц задаёт id
+        Product.objects.update(created_at=timezone.now())
+        cls.ids = list(Product.objects.order_by('-id').values_list('id', flat=True))
+
+    def paginator(self):
+        return KeysetPaginator(Product.objects.all(), per_page=3)
+
+    def ids_of(self, page):
+        return [product.pk for product in page]
+
+    def test_forward_and_back(self):
+        paginator = self.paginator()
+        first = paginator.page()
+        self.assertEqual(self.ids_of(first), self.ids[:3])
+        self.assertIsNone(first.previous_cursor)
+        second = paginator.page(first.next_cursor)
+        self.assertEqual(self.ids_of(second), self.ids[3:6])
+        last = paginator.page(second.next_cursor)
+        self.assertEqual(self.ids_of(last), self.ids[6:])
+        self.assertFalse(last.has_next())
+
+        back = paginator.page(last.previous_cursor)
+        self.assertEqual(self.ids_of(back), self.ids[3:6])
+        self.assertEqual(back.next_cursor, second.next_cursor)
+        start = paginator.page(back.previous_cursor)
+        self.assertEqual(self.ids_of(start), self.ids[:3])
+        self.assertFalse(start.has_previous())
+
+    def test_ties_broken_by_id(self):
+        # Часть товаров младше: курсор внутри группы с одинаковой датой не теряет и не повторяет строк
+        newer = self.ids[5:]
+        Product.objects.filter(pk__in=newer).update(created_at=timezone.now())
+        expected = newer + self.ids[:5]
+        paginator = KeysetPaginator(Product.objects.all(), per_page=2)
+        page, seen = paginator.page(), []
+        while True:
+            seen += self.ids_of(page)
+            if not page.has_next():
+                break
+            page = paginator.page(page.next_cursor)
+        self.assertEqual(seen, expected)
+
+    def test_tampered_cursor(self):
+        paginator = self.paginator()
+        for value in TAMPERED_CURSORS:
+            with self.subTest(cursor=value), self.assertRaises(InvalidCursor):
+                paginator.page(value)
+
+    def test_tampered_cursor_in_views(self):
+        # API отвечает 400, HTML-страница показывает первую страницу
+        self.client.force_login(self.admin)
+        first = self.ids_of(self.client.get(reverse('product_list')).context['page'])
+        for value in TAMPERED_CURSORS:
+            with self.subTest(cursor=value):
+                response = self.client.get(reverse('api_product_list'), {'cursor': value})
+                self.assertEqual(response.status_code, 400)
+                response = self.client.get(reverse('product_list'), {'cursor': value})
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(self.ids_of(response.context['page']), first)
@@ -0,0 +1,117 @@
+import json
+
+from django.core.cache import caches
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+
+from products.models import Category, Product, ProductDocument, User, UserProfile, Warehouse
+from products.querybudget import assert_max_queries
+
+from .utils import TEST_CACHES, create_products
+
+
+@override_settings(CACHES=TEST_CACHES)
+class QueryBudgetTests(TestCase):
+    """Число SQL-запросов страниц и API не зависит от числа товаров и не выходит за бюджет"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.manager = User.objects.create_user('manager', password='x', role='manager')
+        UserProfile.objects.create(user=cls.admin, warehouse=cls.warehouse)
+        UserProfile.objects.create(user=cls.manager, warehouse=cls.warehouse)
+        create_products(cls.category, cls.warehouse, 30)
+        create_products(cls.category, cls.other_warehouse, 10, start=100, is_active=False)
+        cls.product = Product.objects.filter(warehouse=cls.warehouse).first()
+        ProductDocument.objects.bulk_create([
+            ProductDocument(product=cls.product, file=f'product_documents/doc{i}.pdf', name=f'Документ {i}',
+                            uploaded_by=cls.admin)
+            for i in range(5)
+        ])
+
+    def setUp(self):
+        for cache in caches.all():
+            cache.clear()
+
+    def get(self, url, user=None, **params):
+        """GET в пределах бюджета представления (``query_budget``); потоковый ответ читается целиком"""
+        self.client.force_login(user or self.admin)
+        budget = resolve(url).func.query_budget
+        with assert_max_queries(budget) as context:
+            response = self.client.get(url, params)
+            content = b''.join(response.streaming_content) if response.streaming else response.content
+        self.assertEqual(response.status_code, 200, content[:500])
+        return response, len(context.captured_queries)
+
+    def test_product_list(self):
+        # Первый запрос заполняет кеш справочников, сравниваются следующие
+        self.get(reverse('product_list'))
+        _, queries = self.get(reverse('product_list'))
+        create_products(self.category, self.warehouse, 20, start=200)
+        _, more_queries = self.get(reverse('product_list'))
+        self.assertEqual(queries, more_queries)
+
+    def test_product_list_filters(self):
+        self.get(reverse('product_list'), warehouse=self.warehouse.pk, category=self.category.pk)
+        self.get(reverse('product_list'), q='товар')
+        self.get(reverse('product_list'), q='TEST-00000001')
+        self.get(reverse('product_list'), user=self.manager)
+
+    def test_product_detail(self):
+        self.get(reverse('product_detail', args=[self.product.pk]))
+        _, queries = self.get(reverse('product_detail', args=[self.product.pk]))
+        ProductDocument.objects.create(product=self.product, file='product_documents/extra.pdf', name='Ещё',
+                                       uploaded_by=self.admin)
+        _, more_queries = self.get(reverse('product_detail', args=[self.product.pk]))
+        self.assertEqual(queries, more_queries)
+
+    def test_warehouse_pages(self):
+        self.get(reverse('warehouse_list'))
+        self.get(reverse('warehouse_detail', args=[self.warehouse.pk]))
+
+    def test_api_product_list(self):
+        response, queries = self.get(reverse('api_product_list'), limit=50)
+        self.assertEqual(len(response.json()['results']), 40)
+        create_products(self.category, self.warehouse, 5, start=300)
+        _, more_queries = self.get(reverse('api_product_list'), limit=50)
+        self.assertEqual(queries, more_queries)
+
+    def test_api_product_detail(self):
+        response, _ = self.get(reverse('api_product_detail', args=[self.product.pk]), fields='name,category')
+        self.assertEqual(response.json()['category'], self.category.pk)
+
+    def test_api_reference_lists(self):
+        self.get(reverse('api_category_list'))
+        self.get(reverse('api_warehouse_list'))
+
+    def test_export(self):
+        # Выгрузка идёт одним запросом по курсору при любом числе строк
+        self.client.force_login(self.admin)
+        with self.assertNumQueries(3):
+            response = self.client.get(reverse('export_products'), {'format': 'jsonl'})
+            lines = b''.join(response.streaming_content).splitlines()
+        self.assertEqual(len(lines), 40)
+
+    def test_export_visibility(self):
+        # Выгрузка показывает те же товары, что API, и без артикула для сотрудников
+        user = User.objects.create_user('user', password='x')
+        self.client.force_login(user)
+        response = self.client.get(reverse('export_products'), {'format': 'jsonl'})
+        rows = [json.loads(line) for line in b''.join(response.streaming_content).splitlines()]
+        api_rows = self.client.get(reverse('api_product_list'), {'limit': 100}).json()['results']
+        self.assertEqual({row['id'] for row in rows}, {row['id'] for row in api_rows})
+        self.assertEqual(len(rows), 30)
+        self.assertNotIn('sku', rows[0])
+
+    def test_export_stream_counted(self):
+        # Строки выгрузки читаются после выхода из middleware, но входят в счёт запросов представления
+        self.client.force_login(self.admin)
+        with self.assertLogs('products.querybudget', 'DEBUG') as logs:
+            response = self.client.get(reverse('export_products'))
+            self.assertEqual(logs.output, [])
+            b''.join(response.streaming_content)
+        self.assertEqual(len(logs.output), 1)
+        self.assertIn('export_products: 3 SQL-запросов', logs.output[0])
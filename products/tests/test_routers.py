@@ -0,0 +1,92 @@
+import tempfile
+
+from django.conf import settings
+from django.db import connections
+from django.test import TransactionTestCase, override_settings
+from django.urls import reverse
+
+from products import routers
+from products.models import Category, User, UserProfile, Warehouse
+
+from .utils import TEST_CACHES
+
+REPLICA = 'replica'
+# Таблицы, которые читает запрос к api_category_list: пользователь с профилем и категории
+REPLICA_MODELS = (User, Warehouse, UserProfile, Category)
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ReplicaRoutingTests(TransactionTestCase):
+    """Чтение с реплики, запись в основную базу, чтение своих записей из основной базы"""
+
+    @classmethod
+    def setUpClass(cls):
+        # Реплика — отдельный файл SQLite. Псевдоним появляется только на время тестов класса:
+        # заданный в databases заранее, он попал бы в проверки запуска тестов до регистрации
+        cls.directory = tempfile.TemporaryDirectory()
+        databases = {**settings.DATABASES, REPLICA: {'ENGINE': 'django.db.backends.sqlite3',
+                                                      'NAME': f'{cls.directory.name}/replica.sqlite3'}}
+        cls.database_settings = override_settings(DATABASES=databases)
+        cls.database_settings.enable()
+        connections.settings[REPLICA] = connections.configure_settings(databases)[REPLICA]
+        cls.databases = {'default', REPLICA}
+        super().setUpClass()
+
+    @classmethod
+    def tearDownClass(cls):
+        super().tearDownClass()
+        del cls.databases
+        connections[REPLICA].close()
+        del connections[REPLICA]
+        del connections.settings[REPLICA]
+        cls.database_settings.disable()
+        cls.directory.cleanup()
+
+    def setUp(self):
+        self.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        self.category = Category.objects.create(name='Инструменты')
+        # Копия основной базы, отличающаяся названием категории
+        with connections[REPLICA].schema_editor() as editor:
+            for model in REPLICA_MODELS:
+                editor.create_model(model)
+        for model in REPLICA_MODELS:
+            model.objects.using(REPLICA).bulk_create(model.objects.using('default').order_by('pk'))
+        Category.objects.using(REPLICA).filter(pk=self.category.pk).update(name='С реплики')
+
+    def tearDown(self):
+        with connections[REPLICA].schema_editor() as editor:
+            for model in reversed(REPLICA_MODELS):
+                editor.delete_model(model)
+
+    def category_name(self):
+        return Category.objects.get(pk=self.category.pk).name
+
+    def test_reads_go_to_replica(self):
+        self.assertEqual(self.category_name(), 'Инструменты')
+        with routers.replica():
+            self.assertEqual(self.category_name(), 'С реплики')
+        self.assertEqual(self.category_name(), 'Инструменты')
+
+    def test_writes_go_to_primary(self):
+        with routers.replica():
+            Category.objects.create(name='Новая')
+        self.assertTrue(Category.objects.filter(name='Новая').exists())
+        self.assertFalse(Category.objects.using(REPLICA).filter(name='Новая').exists())
+
+    def test_read_after_write_stays_on_primary(self):
+        with routers.replica():
+            self.assertEqual(self.category_name(), 'С реплики')
+            Warehouse.objects.create(name='Основной', address='Москва')
+            self.assertEqual(self.category_name(), 'Инструменты')
+        with routers.replica():
+            self.assertEqual(self.category_name(), 'С реплики')
+
+    def test_request_routing(self):
+        self.client.force_login(self.admin)
+        url = reverse('api_category_list')
+        names = lambda response: [category['name'] for category in response.json()['results']]  # noqa: E731
+        self.assertEqual(names(self.client.get(url)), ['С реплики'])
+        # После POST клиент какое-то время читает основную базу
+        response = self.client.post(reverse('api_stock_adjust'), '{}', content_type='application/json')
+        self.assertIn(routers.ReplicaRoutingMiddleware.STICKY_COOKIE, response.cookies)
+        self.assertEqual(names(self.client.get(url)), ['Инструменты'])
@@ -0,0 +1,76 @@
+from decimal import Decimal
+
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from products import search
+from products.models import Category, Product, User, Warehouse
+
+from .utils import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES)
+class SearchTests(TestCase):
+    """Полнотекстовый поиск: нормализация, переиндексация, ранжирование и постраничный вывод"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+
+    def create(self, name, **extra):
+        # Индекс обновляется в on_commit: в TestCase колбэки выполняются явно
+        with self.captureOnCommitCallbacks(execute=True):
+            return Product.objects.create(name=name, category=self.category, warehouse=self.warehouse,
+                                          price=Decimal('10.00'), **extra)
+
+    def search(self, query):
+        return list(search.search_products(Product.objects.all(), query))
+
+    def test_cyrillic_and_yo_folding(self):
+        tree = self.create('Ёлочная игрушка')
+        spruce = self.create('Елка искусственная')
+        for query in ('елочная', 'ЁЛОЧНАЯ', 'ёлоч', 'ИГРУШКА'):
+            self.assertEqual(self.search(query), [tree], query)
+        self.assertEqual(self.search('ёлка'), [spruce])
+
+    def test_all_words_required(self):
+        hammer = self.create('Молоток слесарный')
+        self.create('Молоток столярный')
+        self.assertEqual(self.search('молоток слес'), [hammer])
+
+    def test_reindex_after_category_rename(self):
+        product = self.create('Лопата')
+        self.assertEqual(self.search('садовый'), [])
+        with self.captureOnCommitCallbacks(execute=True):
+            self.category.name = 'Садовый инвентарь'
+            self.category.save()
+        self.assertEqual(self.search('садовый'), [product])
+
+    def test_exact_sku_ranks_first(self):
+        # Название с тем же артикулом весит больше поля sku, но точное совпадение артикула важнее
+        self.create('Переходник для ABC-100 ABC-100', sku='ABC-1000')
+        exact = self.create('Переходник', sku='ABC-100')
+        results = self.search('abc-100')
+        self.assertEqual(results[0], exact)
+        self.assertEqual(len(results), 2)
+
+    def test_cursor_paging_by_rank(self):
+        for i in range(25):
+            # Разное число повторов слова даёт разный rank, одинаковые названия — равный
+            self.create(' '.join(['Молоток'] * (i % 4 + 1)) + f' модель {i}')
+        self.client.force_login(self.admin)
+        seen, cursor = [], None
+        while True:
+            params = {'q': 'молоток', 'limit': 7, 'fields': 'id'}
+            if cursor:
+                params['cursor'] = cursor
+            data = self.client.get(reverse('api_product_list'), params).json()
+            seen += [row['id'] for row in data['results']]
+            cursor = data['next_cursor']
+            if not cursor:
+                break
+        expected = [product.pk for product in self.search('молоток')]
+        self.assertEqual(seen, expected)
+        self.assertEqual(len(set(seen)), 25)
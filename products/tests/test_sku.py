@@ -0,0 +1,65 @@
+import re
+from decimal import Decimal
+
+from django.db import transaction
+from django.test import TestCase, override_settings
+
+from products import sku
+from products.models import Category, Product, SkuSequence, Warehouse
+
+
+@override_settings(SKU_BLOCK_SIZE=5)
+class SkuTests(TestCase):
+    """Выдача артикулов блоками из счётчика"""
+
+    def setUp(self):
+        sku._block = iter(())
+        self.addCleanup(setattr, sku, '_block', iter(()))
+
+    def next_sku(self):
+        """Артикул для товара, сохранённого в отдельной зафиксированной транзакции"""
+        with self.captureOnCommitCallbacks(execute=True), transaction.atomic():
+            return sku.next_sku()
+
+    def last_value(self):
+        return SkuSequence.objects.get(name=sku.SEQUENCE_NAME).last_value
+
+    def test_block_cached_after_commit(self):
+        # add_product и админка сохраняют товар внутри transaction.atomic
+        first = self.next_sku()
+        with transaction.atomic(), self.assertNumQueries(0):
+            rest = [sku.next_sku() for _ in range(4)]
+        self.assertEqual(len({first, *rest}), 5)
+        self.assertEqual(self.last_value(), 5)
+
+    def test_rolled_back_block_not_cached(self):
+        try:
+            with transaction.atomic():
+                rolled_back = sku.next_sku()
+                raise RuntimeError
+        except RuntimeError:
+            pass
+        # Резерв откатился вместе с транзакцией и его номера выдаются заново; остаток блока не кешировался
+        self.assertEqual(self.next_sku(), rolled_back)
+        self.assertEqual(self.last_value(), 5)
+
+    def test_unique_across_blocks(self):
+        skus = [self.next_sku() for _ in range(12)]
+        skus += sku.allocate_skus(7)
+        self.assertEqual(len(set(skus)), 19)
+        self.assertEqual(self.last_value(), 22)
+
+    def test_no_collision_with_legacy_skus(self):
+        # Прежние артикулы: SKU- и 8 случайных символов из A-Z0-9 (generate_sku до выдачи из счётчика)
+        legacy = re.compile(r'^SKU-[A-Z0-9]{8}$')
+        skus = sku.allocate_skus(2000)
+        self.assertFalse([value for value in skus if legacy.match(value)])
+        self.assertEqual(len(set(skus)), 2000)
+
+        category = Category.objects.create(name='Инструменты')
+        warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        Product.objects.create(name='Старый товар', sku='SKU-7K2M9QXA', category=category, warehouse=warehouse,
+                               price=Decimal('1.00'))
+        product = Product.objects.create(name='Новый товар', category=category, warehouse=warehouse,
+                                         price=Decimal('1.00'))
+        self.assertRegex(product.sku, r'^SKU-[A-Z0-9]{9}$')
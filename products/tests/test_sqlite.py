@@ -0,0 +1,106 @@
+import tempfile
+import threading
+import time
+from contextlib import contextmanager
+from io import StringIO
+
+from django.conf import settings
+from django.core.management import CommandError, call_command
+from django.db import DEFAULT_DB_ALIAS, ConnectionHandler, OperationalError
+from django.test import TestCase, TransactionTestCase
+
+
+class SQLiteConcurrencyTests(TransactionTestCase):
+    """Параллельные писатели: "database is locked" в профиле по умолчанию и без ошибок в продакшен-профиле"""
+
+    writers = 4
+    iterations = 20
+
+    @staticmethod
+    @contextmanager
+    def atomic(connection):
+        """Транзакция, как transaction.atomic для SQLite (BEGIN с учётом transaction_mode)"""
+        connection.set_autocommit(False, force_begin_transaction_with_broken_autocommit=True)
+        try:
+            yield
+            connection.commit()
+        except Exception:
+            connection.rollback()
+            raise
+        finally:
+            connection.set_autocommit(True)
+
+    def write_concurrently(self, options):
+        """Писатели читают и пишут в одной транзакции, как stock.apply_batch; возвращает ошибки"""
+        # Отдельная база в файле: тестовая база SQLite в памяти не показывает блокировок между соединениями
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        # Соединения ConnectionHandler свои у каждого потока
+        databases = ConnectionHandler({DEFAULT_DB_ALIAS: {
+            'ENGINE': 'django.db.backends.sqlite3', 'NAME': f'{directory.name}/db.sqlite3', 'OPTIONS': options,
+        }})
+        with databases[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('CREATE TABLE movement (id INTEGER PRIMARY KEY, value TEXT)')
+
+        errors = []
+        start = threading.Barrier(self.writers)
+
+        def writer():
+            connection = databases[DEFAULT_DB_ALIAS]
+            start.wait()
+            try:
+                for _ in range(self.iterations):
+                    with self.atomic(connection), connection.cursor() as cursor:
+                        cursor.execute('SELECT COUNT(*) FROM movement')
+                        time.sleep(0.005)
+                        cursor.execute('INSERT INTO movement (value) VALUES (%s)', ['x'])
+            except OperationalError as e:
+                errors.append(str(e))
+            finally:
+                connection.close()
+
+        threads = [threading.Thread(target=writer) for _ in range(self.writers)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        with databases[DEFAULT_DB_ALIAS].cursor() as cursor:
+            cursor.execute('SELECT COUNT(*) FROM movement')
+            written = cursor.fetchone()[0]
+        databases.close_all()
+        return errors, written
+
+    def test_default_profile_fails(self):
+        errors, _ = self.write_concurrently({})
+        self.assertTrue(errors)
+        self.assertIn('database is locked', errors[0])
+
+    def test_production_profile(self):
+        errors, written = self.write_concurrently(settings.SQLITE_PRODUCTION_OPTIONS)
+        self.assertEqual(errors, [])
+        self.assertEqual(written, self.writers * self.iterations)
+
+
+class SQLiteMaintenanceTests(TestCase):
+    """Команда sqlite_maintenance"""
+
+    def run_command(self, *args):
+        out = StringIO()
+        call_command('sqlite_maintenance', *args, stdout=out)
+        return out.getvalue()
+
+    def test_default_actions(self):
+        output = self.run_command()
+        self.assertIn('PRAGMA optimize', output)
+        self.assertIn('quick_check: ok', output)
+        self.assertNotIn('ANALYZE', output)
+
+    def test_selected_actions(self):
+        output = self.run_command('analyze', 'integrity', '--full-integrity')
+        self.assertIn('ANALYZE', output)
+        self.assertIn('integrity_check: ok', output)
+        self.assertNotIn('PRAGMA optimize', output)
+
+    def test_unknown_action(self):
+        with self.assertRaisesMessage(CommandError, 'Неизвестные действия: vacuum'):
+            self.run_command('vacuum')
@@ -0,0 +1,96 @@
+from decimal import Decimal
+
+from django.db import IntegrityError
+from django.test import TestCase, override_settings
+
+from products import stock, valuation
+from products.models import Category, Product, StockMovement, User, Warehouse
+
+from .utils import TEST_CACHES, interfere
+
+
+@override_settings(CACHES=TEST_CACHES)
+class StockTests(TestCase):
+    """Остатки меняются только через журнал движений"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тверь')
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+
+    def setUp(self):
+        self.hammer = self.create('HAM-1', 10)
+        self.pliers = self.create('PLI-1', 3)
+
+    def create(self, sku, quantity, warehouse=None):
+        product = Product.objects.create(name=sku, sku=sku, category=self.category, price=Decimal('2.50'),
+                                         warehouse=warehouse or self.warehouse)
+        if quantity:
+            stock.receive(product, quantity, reason=stock.OPENING_BALANCE_REASON)
+        return product
+
+    def quantity(self, product):
+        return Product.objects.values_list('quantity', flat=True).get(pk=product.pk)
+
+    def test_move_writes_ledger(self):
+        movement = stock.issue(self.hammer, 4, self.admin, 'Продажа')
+        self.assertEqual(self.quantity(self.hammer), 6)
+        self.assertEqual((movement.kind, movement.quantity, movement.user, movement.reason),
+                         (StockMovement.ISSUE, -4, self.admin, 'Продажа'))
+        self.assertEqual(list(stock.discrepancies()), [])
+        self.assertEqual(valuation.drift(), {})
+
+    def test_move_rejects_insufficient_stock(self):
+        with self.assertRaises(stock.InsufficientStock):
+            stock.issue(self.hammer, 11)
+        self.assertEqual(self.quantity(self.hammer), 10)
+        self.assertEqual(self.hammer.movements.count(), 1)
+
+    def test_move_rejects_wrong_sign(self):
+        for kind, delta in ((StockMovement.RECEIPT, -1), (StockMovement.ISSUE, 1), (StockMovement.ADJUSTMENT, 0)):
+            with self.subTest(kind=kind, delta=delta), self.assertRaises(ValueError):
+                stock.move(self.hammer, kind, delta)
+
+    def test_apply_batch(self):
+        results = stock.apply_batch([('HAM-1', -2), ('PLI-1', 5), ('HAM-1', -3), ('NONE', 1), ('PLI-1', 0)])
+        self.assertEqual(results, [
+            {'line': 1, 'sku': 'HAM-1', 'status': 'ok', 'quantity': 5},
+            {'line': 2, 'sku': 'PLI-1', 'status': 'ok', 'quantity': 8},
+            {'line': 3, 'sku': 'HAM-1', 'status': 'ok', 'quantity': 5},
+            {'line': 4, 'sku': 'NONE', 'status': 'error', 'error': 'товар с таким артикулом не найден'},
+            {'line': 5, 'sku': 'PLI-1', 'status': 'error',
+             'error': 'изменение количества должно быть ненулевым целым числом'},
+        ])
+        self.assertEqual((self.quantity(self.hammer), self.quantity(self.pliers)), (5, 8))
+        self.assertEqual(self.hammer.movements.count(), 3)
+        self.assertEqual(list(stock.discrepancies()), [])
+        self.assertEqual(valuation.drift(), {})
+
+    def test_apply_batch_checks_stock_and_rights(self):
+        other = self.create('OTH-1', 1, warehouse=self.other_warehouse)
+        results = stock.apply_batch(
+            [('PLI-1', -2), ('PLI-1', -2), ('OTH-1', 1)],
+            can_manage=lambda warehouse_id: warehouse_id == self.warehouse.pk,
+        )
+        self.assertEqual([result['error'] for result in results], [
+            'недостаточно товара: остаток 3, изменение -4',
+            'недостаточно товара: остаток 3, изменение -4',
+            'нет прав на товары этого склада',
+        ])
+        self.assertEqual((self.quantity(self.pliers), self.quantity(other)), (3, 1))
+
+    def test_apply_batch_concurrent_issue(self):
+        # Остаток ушёл бы в минус: ограничение в базе откатывает всю пачку
+        with interfere('PLI-1', 0), self.assertRaises(IntegrityError):
+            stock.apply_batch([('HAM-1', 1), ('PLI-1', -3)])
+        self.assertEqual(self.quantity(self.hammer), 10)
+        self.assertEqual(self.hammer.movements.count(), 1)
+
+    def test_reconcile(self):
+        Product.objects.filter(pk=self.hammer.pk).update(quantity=99)
+        self.assertEqual(list(stock.discrepancies()), [self.hammer])
+        self.assertEqual(stock.reconcile([self.hammer.pk, self.pliers.pk], batch_size=1), 2)
+        self.assertEqual(self.quantity(self.hammer), 10)
+        self.assertEqual(list(stock.discrepancies()), [])
@@ -0,0 +1,86 @@
+import hashlib
+import json
+import tempfile
+from decimal import Decimal
+
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.test import TestCase, override_settings
+from django.urls import resolve, reverse
+
+from products.models import Category, DocumentBlob, Product, ProductDocument, User, Warehouse
+from products.querybudget import assert_max_queries, budget_for
+
+from .utils import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES)
+class DocumentUploadTests(TestCase):
+    """Загрузка частями не выдаёт чужой файл по одному лишь хешу"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name='Инструменты')
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.admin = User.objects.create_user('admin', password='x', is_staff=True, role='admin')
+        cls.product = Product.objects.create(name='Молоток', category=cls.category, warehouse=cls.warehouse,
+                                             price=Decimal('10.00'), quantity=10)
+
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        settings = override_settings(MEDIA_ROOT=directory.name, DOCUMENT_UPLOAD_TEMP_DIR=f'{directory.name}/tmp')
+        settings.enable()
+        self.addCleanup(settings.disable)
+        self.client.force_login(self.admin)
+
+    def start(self, data, **payload):
+        return self.client.post(
+            reverse('api_upload_start', args=[self.product.pk]), json.dumps({
+                'filename': 'отчёт.pdf', 'size': len(data), 'sha256': hashlib.sha256(data).hexdigest(), **payload,
+            }), content_type='application/json',
+        ).json()
+
+    def upload(self, data, **payload):
+        state = self.start(data, **payload)
+        self.client.put(state['url'], data, content_type='application/octet-stream',
+                        HTTP_CONTENT_RANGE=f'bytes 0-{len(data) - 1}/{len(data)}')
+        return self.client.post(state['url'] + 'complete/').json()
+
+    def test_known_hash_requires_data(self):
+        data = b'secret' * 100
+        self.upload(data)
+        state = self.start(data)
+        self.assertEqual(state['status'], 'pending')
+        self.assertEqual(ProductDocument.objects.count(), 1)
+
+        # Те же байты ещё раз: документ создаётся, а содержимое хранится один раз
+        document = self.upload(data, name='Копия')['document']
+        self.assertEqual(document['name'], 'Копия')
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_name_defaults_to_filename(self):
+        document = self.upload(b'data')['document']
+        self.assertEqual(document['name'], 'отчёт.pdf')
+
+    def test_form_upload_budget(self):
+        url = reverse('product_detail', args=[self.product.pk])
+        for content in (b'first', b'first'):
+            with assert_max_queries(budget_for(resolve(url).func, 'POST')):
+                response = self.client.post(url, {'file': SimpleUploadedFile('акт.pdf', content)})
+            self.assertEqual(response.status_code, 302)
+        self.assertEqual(list(self.product.documents.values_list('name', flat=True)), ['акт.pdf', 'акт.pdf'])
+        self.assertEqual(DocumentBlob.objects.count(), 1)
+
+    def test_any_viewer_can_upload(self):
+        # Как до загрузки частями: документ прикрепляет любой пользователь, которому виден товар
+        self.client.force_login(User.objects.create_user('client', password='x'))
+        self.assertEqual(self.upload(b'data')['status'], 'complete')
+        url = reverse('product_detail', args=[self.product.pk])
+        self.assertEqual(self.client.post(url, {'file': SimpleUploadedFile('акт.pdf', b'act')}).status_code, 302)
+        self.assertEqual(self.product.documents.count(), 2)
+
+        Product.objects.filter(pk=self.product.pk).update(is_active=False)
+        response = self.client.post(reverse('api_upload_start', args=[self.product.pk]), json.dumps({
+            'filename': 'акт.pdf', 'size': 3, 'sha256': hashlib.sha256(b'act').hexdigest(),
+        }), content_type='application/json')
+        self.assertEqual(response.status_code, 403)
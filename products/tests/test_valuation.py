@@ -0,0 +1,81 @@
+from decimal import Decimal
+from io import StringIO
+
+from django.core.management import call_command
+from django.test import TestCase, override_settings
+
+from products import stock, valuation
+from products.models import Category, InventoryValuation, Product, Warehouse
+
+from .utils import TEST_CACHES
+
+
+@override_settings(CACHES=TEST_CACHES)
+class ValuationTests(TestCase):
+    """Сводка стоимости: полный пересчёт и приращения совпадают с таблицей товаров"""
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.warehouse = Warehouse.objects.create(name='Основной', address='Москва')
+        cls.other_warehouse = Warehouse.objects.create(name='Резервный', address='Тула')
+        cls.category = Category.objects.create(name='Инструменты')
+
+    def create(self, price, quantity, warehouse=None, sku=None):
+        return Product.objects.create(
+            name='Товар', sku=sku or f'VAL-{Product.objects.count():04d}', category=self.category,
+            warehouse=warehouse or self.warehouse, price=Decimal(price), quantity=quantity,
+        )
+
+    def stored(self, warehouse=None):
+        row = InventoryValuation.objects.get(warehouse=warehouse or self.warehouse, category=self.category)
+        return row.item_count, row.units, row.value
+
+    def test_check_after_rebuild_is_clean(self):
+        # SQLite суммирует price * quantity в float: сто слагаемых 99.9 дают 9989.99999999998
+        Product.objects.bulk_create([
+            Product(name='Товар', sku=f'VAL-{i:04d}', category=self.category, warehouse=self.warehouse,
+                    price=Decimal('0.10'), quantity=999)
+            for i in range(100)
+        ])
+        valuation.rebuild()
+        self.assertEqual(valuation.drift(), {})
+        out = StringIO()
+        call_command('rebuild_valuation', '--check', stdout=out)
+        self.assertIn('Сводка совпадает с товарами', out.getvalue())
+
+    def test_incremental_updates(self):
+        product = self.create('19.99', 3)
+        self.assertEqual(self.stored(), (1, 3, Decimal('59.97')))
+
+        product.price = Decimal('20.01')
+        product.save()
+        self.assertEqual(self.stored(), (1, 3, Decimal('60.03')))
+
+        stock.receive(product, 2)
+        self.assertEqual(self.stored(), (1, 5, Decimal('100.05')))
+
+        product.refresh_from_db()
+        product.warehouse = self.other_warehouse
+        product.save()
+        self.assertEqual(self.stored(), (0, 0, Decimal('0.00')))
+        self.assertEqual(self.stored(self.other_warehouse), (1, 5, Decimal('100.05')))
+
+        self.create('0.10', 1, warehouse=self.other_warehouse)
+        product.delete()
+        self.assertEqual(self.stored(self.other_warehouse), (1, 1, Decimal('0.10')))
+        self.assertEqual(valuation.drift(), {})
+
+    def test_bulk_insert(self):
+        products = Product.objects.bulk_create([
+            Product(name='Товар', sku=f'VAL-{i:04d}', category=self.category, warehouse=self.warehouse,
+                    price=Decimal('0.30'), quantity=i)
+            for i in range(4)
+        ])
+        valuation.products_added(products)
+        self.assertEqual(self.stored(), (4, 6, Decimal('1.80')))
+        self.assertEqual(valuation.drift(), {})
+
+    def test_drift_reported(self):
+        self.create('10.00', 1)
+        InventoryValuation.objects.update(units=5)
+        self.assertEqual(list(valuation.drift()), [(self.warehouse.pk, self.category.pk)])
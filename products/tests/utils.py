@@ -0,0 +1,28 @@
+from decimal import Decimal
+from unittest import mock
+
+from products import valuation
+from products.models import Product
+
+TEST_CACHES = {
+    'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-default'},
+    'fragments': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'tests-fragments'},
+}
+
+
+def create_products(category, warehouse, count, start=0, **extra):
+    return Product.objects.bulk_create([
+        Product(name=f'Товар {start + i}', sku=f'TEST-{start + i:08d}', category=category, warehouse=warehouse,
+                price=Decimal('10.00'), quantity=i, **extra)
+        for i in range(count)
+    ])
+
+
+def interfere(sku, quantity):
+    """Параллельное списание после проверки остатка в apply_batch: подменяет остаток перед UPDATE"""
+    add_units = valuation.Deltas.add_units
+
+    def add_units_after_move(self, *args):
+        Product.objects.filter(sku=sku).update(quantity=quantity)
+        add_units(self, *args)
+    return mock.patch.object(valuation.Deltas, 'add_units', add_units_after_move)
@@ -0,0 +1,207 @@
+"""Загрузка документов частями с возобновлением и хранение по хешу.
+
+Клиент создаёт загрузку (``start``), отправляет файл частями с указанием
+смещения (``write_chunk``) и завершает её (``complete``). Части пишутся
+сразу во временный файл в ``DOCUMENT_UPLOAD_TEMP_DIR``, не через память;
+оборвавшаяся загрузка продолжается с последнего принятого байта.
+SHA-256 считается по ходу записи, пока части приходят в один процесс,
+иначе файл перечитывается при завершении.
+
+Содержимое хранится в ``DocumentBlob`` по SHA-256: одинаковые файлы,
+прикреплённые к разным товарам, лежат на диске один раз. Совпадение
+ищется только при завершении, по хешу принятых байт: хеш, заранее
+переданный клиентом, лишь проверяет целостность и не даёт доступа к уже
+хранящемуся файлу.
+"""
+import hashlib
+import os
+import threading
+from collections import OrderedDict
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files import File
+from django.db import IntegrityError, transaction
+from django.utils import timezone
+
+from .models import DocumentBlob, DocumentUpload, ProductDocument
+
+READ_SIZE = 64 * 1024
+# Сколько незавершённых хешей держит процесс; вытесненные пересчитываются по файлу
+MAX_HASHERS = 256
+
+
+class UploadError(Exception):
+    pass
+
+
+class OffsetMismatch(UploadError):
+    """Часть пришла не с того смещения: клиент должен продолжить с ``expected``"""
+
+    def __init__(self, expected):
+        super().__init__(f'Ожидается часть со смещения {expected}')
+        self.expected = expected
+
+
+# id загрузки -> (смещение, hashlib-объект): хеш по ходу записи
+_hashers = OrderedDict()
+_hashers_lock = threading.Lock()
+
+
+def _take_hasher(upload_id, offset):
+    with _hashers_lock:
+        state = _hashers.pop(upload_id, None)
+    return state[1] if state and state[0] == offset else None
+
+
+def _keep_hasher(upload_id, offset, hasher):
+    with _hashers_lock:
+        _hashers[upload_id] = (offset, hasher)
+        while len(_hashers) > MAX_HASHERS:
+            _hashers.popitem(last=False)
+
+
+def temp_path(upload):
+    return os.path.join(settings.DOCUMENT_UPLOAD_TEMP_DIR, f'{upload.pk}.part')
+
+
+def _remove_temp(upload):
+    try:
+        os.remove(temp_path(upload))
+    except FileNotFoundError:
+        pass
+
+
+def _hash_file(path):
+    hasher = hashlib.sha256()
+    with open(path, 'rb') as f:
+        while chunk := f.read(READ_SIZE):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+
+def _attach(product, blob, name, filename, user):
+    return ProductDocument.objects.create(
+        product=product, blob=blob, file=blob.file.name, name=name or filename, uploaded_by=user,
+    )
+
+
+def _store_blob(sha256, size, file, filename):
+    """Blob с этим хешем: существующий или новый из переданного файла"""
+    blob = DocumentBlob.objects.filter(sha256=sha256).first()
+    if blob is not None:
+        return blob
+    blob = DocumentBlob(sha256=sha256, size=size)
+    blob.file.save(filename, file, save=False)
+    try:
+        with transaction.atomic():
+            blob.save()
+    except IntegrityError:
+        # Такой же файл только что сохранила параллельная загрузка
+        blob.file.delete(save=False)
+        blob = DocumentBlob.objects.get(sha256=sha256)
+    return blob
+
+
+def store_uploaded_file(uploaded_file):
+    """Blob для файла, загруженного обычной формой"""
+    hasher = hashlib.sha256()
+    for chunk in uploaded_file.chunks():
+        hasher.update(chunk)
+    uploaded_file.seek(0)
+    return _store_blob(hasher.hexdigest(), uploaded_file.size, uploaded_file, uploaded_file.name)
+
+
+def start(product, user, filename, size, name='', sha256=''):
+    """Создание загрузки; ``sha256`` проверяется при завершении"""
+    if size <= 0:
+        raise UploadError('Размер файла должен быть положительным')
+    if size > settings.DOCUMENT_UPLOAD_MAX_SIZE:
+        raise UploadError(f'Файл больше {settings.DOCUMENT_UPLOAD_MAX_SIZE} байт')
+    upload = DocumentUpload.objects.create(
+        product=product, user=user, filename=os.path.basename(filename)[:255], size=size,
+        name=name, sha256=sha256.lower(),
+    )
+    os.makedirs(settings.DOCUMENT_UPLOAD_TEMP_DIR, exist_ok=True)
+    open(temp_path(upload), 'wb').close()
+    _keep_hasher(upload.pk, 0, hashlib.sha256())
+    return upload
+
+
+def write_chunk(upload, offset, stream, length):
+    """Запись части из потока запроса; возвращает число принятых байт"""
+    if offset != upload.received:
+        raise OffsetMismatch(upload.received)
+    if length <= 0 or offset + length > upload.size:
+        raise UploadError('Часть выходит за пределы файла')
+    if length > settings.DOCUMENT_UPLOAD_CHUNK_SIZE:
+        raise UploadError(f'Часть больше {settings.DOCUMENT_UPLOAD_CHUNK_SIZE} байт')
+
+    hasher = _take_hasher(upload.pk, offset)
+    written = 0
+    try:
+        with open(temp_path(upload), 'r+b') as f:
+            # Хвост оборвавшейся ранее записи отбрасывается
+            f.truncate(offset)
+            f.seek(offset)
+            while written < length:
+                data = stream.read(min(READ_SIZE, length - written))
+                if not data:
+                    break
+                f.write(data)
+                if hasher is not None:
+                    hasher.update(data)
+                written += len(data)
+    except FileNotFoundError:
+        raise UploadError('Временный файл загрузки не найден, начните загрузку заново')
+    finally:
+        # Принятые байты засчитываются, даже если соединение оборвалось посреди части
+        if written:
+            updated = DocumentUpload.objects.filter(pk=upload.pk, received=offset).update(
+                received=offset + written, updated_at=timezone.now(),
+            )
+            if updated:
+                upload.received = offset + written
+                if hasher is not None:
+                    _keep_hasher(upload.pk, upload.received, hasher)
+
+    if upload.received != offset + written:
+        raise OffsetMismatch(DocumentUpload.objects.values_list('received', flat=True).get(pk=upload.pk))
+    if written != length:
+        raise UploadError(f'Получено {written} из {length} байт, продолжите со смещения {upload.received}')
+    return written
+
+
+def complete(upload):
+    """Завершение загрузки: документ товара с содержимым из общего хранилища"""
+    if upload.received != upload.size:
+        raise OffsetMismatch(upload.received)
+
+    path = temp_path(upload)
+    hasher = _take_hasher(upload.pk, upload.size)
+    sha256 = hasher.hexdigest() if hasher is not None else _hash_file(path)
+    if upload.sha256 and upload.sha256 != sha256:
+        abort(upload)
+        raise UploadError('Контрольная сумма не совпадает, файл повреждён при передаче')
+
+    with open(path, 'rb') as f:
+        blob = _store_blob(sha256, upload.size, File(f), upload.filename)
+    document = _attach(upload.product, blob, upload.name, upload.filename, upload.user)
+    abort(upload)
+    return document
+
+
+def abort(upload):
+    _take_hasher(upload.pk, None)
+    _remove_temp(upload)
+    upload.delete()
+
+
+def cleanup(older_than=None):
+    """Удаление загрузок, не получавших данных дольше ``DOCUMENT_UPLOAD_EXPIRY``"""
+    if older_than is None:
+        older_than = timedelta(seconds=settings.DOCUMENT_UPLOAD_EXPIRY)
+    expired = list(DocumentUpload.objects.filter(updated_at__lt=timezone.now() - older_than))
+    for upload in expired:
+        abort(upload)
+    return len(expired)
@@ -1,17 +1,22 @@
 from django.urls import path
-from . import views
+from . import api, async_views, downloads, views
 from django.contrib.auth import views as auth_views
 from django.contrib import admin
 from django.conf.urls.static import static
 from django.conf import settings
 
+# При развёртывании через ASGI страницы каталога обслуживаются асинхронными представлениями
+catalog_views = async_views if settings.ASYNC_VIEWS else views
+
 urlpatterns = [
-    path('', views.product_list, name='product_list'),
-    path('product/<int:pk>/', views.product_detail, name='product_detail'),
+    path('', catalog_views.product_list, name='product_list'),
+    path('product/<int:pk>/', catalog_views.product_detail, name='product_detail'),
     path('profile/', views.profile, name='profile'),
 
     # Управление товарами (только для админов)
     path('products/add/', views.add_product, name='add_product'),
+    path('products/import/', views.import_products, name='import_products'),
+    path('products/export/', views.export_products, name='export_products'),
     path('products/edit/<int:pk>/', views.edit_product, name='edit_product'),
     path('products/delete/<int:pk>/', views.delete_product, name='delete_product'),
 
@@ -23,11 +28,27 @@ urlpatterns = [
 
     # Склады
     path('warehouses/', views.warehouse_list, name='warehouse_list'),
-    path('warehouses/<int:pk>/', views.warehouse_detail, name='warehouse_detail'),
+    path('warehouses/<int:pk>/', catalog_views.warehouse_detail, name='warehouse_detail'),
     path('warehouses/add/', views.warehouse_create, name='warehouse_create'),
     path('warehouses/<int:pk>/edit/', views.warehouse_edit, name='warehouse_edit'),
     path('warehouses/<int:pk>/delete/', views.warehouse_delete, name='warehouse_delete'),
 
+    # Отчёты
+    path('reports/valuation/', views.valuation_report, name='valuation_report'),
+
+    # Документы
+    path('documents/<int:pk>/', downloads.document_download, name='document_download'),
+
+    # JSON API
+    path('api/products/', api.product_list, name='api_product_list'),
+    path('api/products/<int:pk>/', api.product_detail, name='api_product_detail'),
+    path('api/categories/', api.category_list, name='api_category_list'),
+    path('api/warehouses/', api.warehouse_list, name='api_warehouse_list'),
+    path('api/stock/adjust/', api.stock_adjust, name='api_stock_adjust'),
+    path('api/products/<int:pk>/uploads/', api.upload_start, name='api_upload_start'),
+    path('api/uploads/<uuid:upload_id>/', api.upload_detail, name='api_upload_detail'),
+    path('api/uploads/<uuid:upload_id>/complete/', api.upload_complete, name='api_upload_complete'),
+
     # Auth URLs
     path('accounts/login/', auth_views.LoginView.as_view(template_name='registration/login.html'), name='login'),
     path('accounts/logout/', auth_views.LogoutView.as_view(next_page='login'), name='logout'),
@@ -0,0 +1,186 @@
+"""Сводка стоимости остатков по складам и категориям.
+
+``InventoryValuation`` хранит для каждой пары (склад, категория) число
+товаров, сумму остатков и их стоимость (``price * quantity``). Сводка
+обновляется приращениями в той же транзакции, что и товар: сигналы
+сохранения и удаления товара, проведение движений в ``stock.py`` и
+массовые вставки (импорт, генерация данных). Отчёт читает сводку, а не
+таблицу товаров, поэтому его стоимость не зависит от числа товаров.
+Команда ``rebuild_valuation`` ночью пересчитывает сводку одним GROUP BY
+и исправляет накопившиеся расхождения (например, после ``reconcile_stock``).
+"""
+from decimal import Decimal
+
+from django.db import IntegrityError, transaction
+from django.db.models import Count, DecimalField, F, Sum
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from .models import InventoryValuation, Product
+
+VALUE_FIELD = DecimalField(max_digits=18, decimal_places=2)
+# SQLite суммирует price * quantity в float: итог округляется до копеек, как хранимая стоимость
+CENT = Decimal('0.01')
+# Поля товара, от которых зависит сводка, в порядке product_state()
+STATE_FIELDS = (('warehouse', 'warehouse_id'), ('category', 'category_id'), ('price', 'price'), ('quantity', 'quantity'))
+# Товар загружен без части полей (only/defer): его вклад неизвестен, расхождение исправит rebuild
+UNKNOWN = object()
+
+
+def product_state(product):
+    """Вклад товара в сводку: (склад, категория, цена, количество)"""
+    return product.warehouse_id, product.category_id, Decimal(product.price or 0), product.quantity or 0
+
+
+class Deltas:
+    """Накопление приращений по группам (склад, категория) для одного применения"""
+
+    def __init__(self):
+        self.groups = {}
+
+    def add(self, warehouse_id, category_id, items, units, value):
+        group = self.groups.setdefault((warehouse_id, category_id), [0, 0, Decimal(0)])
+        group[0] += items
+        group[1] += units
+        group[2] += value
+
+    def add_state(self, state, sign=1):
+        warehouse_id, category_id, price, quantity = state
+        self.add(warehouse_id, category_id, sign, sign * quantity, sign * price * quantity)
+
+    def add_units(self, warehouse_id, category_id, price, units):
+        self.add(warehouse_id, category_id, 0, units, Decimal(price) * units)
+
+    def apply(self):
+        for (warehouse_id, category_id), (items, units, value) in self.groups.items():
+            if items or units or value:
+                _apply_group(warehouse_id, category_id, items, units, value)
+
+
+def _apply_group(warehouse_id, category_id, items, units, value):
+    rows = InventoryValuation.objects.filter(warehouse_id=warehouse_id, category_id=category_id)
+    changes = {
+        'item_count': F('item_count') + items,
+        'units': F('units') + units,
+        'value': F('value') + value,
+        'updated_at': timezone.now(),
+    }
+    if rows.update(**changes):
+        return
+    try:
+        with transaction.atomic():
+            InventoryValuation.objects.create(
+                warehouse_id=warehouse_id, category_id=category_id, item_count=items, units=units, value=value,
+            )
+    except IntegrityError:
+        # Строку группы только что создала параллельная транзакция
+        rows.update(**changes)
+
+
+def remember(product):
+    """Вклад товара, загруженного из базы (post_init): сохранение заменит его новым"""
+    if product.pk is None:
+        product._valuation_state = None
+    elif any(attname not in product.__dict__ for _, attname in STATE_FIELDS):
+        product._valuation_state = UNKNOWN
+    else:
+        product._valuation_state = product_state(product)
+
+
+def _replace(old_state, new_state):
+    if old_state == new_state:
+        return
+    deltas = Deltas()
+    if old_state is not None:
+        deltas.add_state(old_state, -1)
+    if new_state is not None:
+        deltas.add_state(new_state)
+    deltas.apply()
+
+
+def product_saved(product, created, update_fields=None):
+    old_state = None if created else product._valuation_state
+    if old_state is UNKNOWN:
+        return
+    new_state = product_state(product)
+    if old_state is not None and update_fields is not None:
+        # Поля, не вошедшие в update_fields, в базе не изменились (например, quantity в stock.save_product)
+        new_state = tuple(
+            new if name in update_fields or attname in update_fields else old
+            for (name, attname), old, new in zip(STATE_FIELDS, old_state, new_state)
+        )
+    _replace(old_state, new_state)
+    product._valuation_state = new_state
+
+
+def product_deleted(product):
+    if product._valuation_state is not UNKNOWN:
+        _replace(product._valuation_state, None)
+
+
+def products_added(products):
+    """Учёт товаров, вставленных bulk_create (сигналы не отправляются)"""
+    deltas = Deltas()
+    for product in products:
+        product._valuation_state = product_state(product)
+        deltas.add_state(product._valuation_state)
+    deltas.apply()
+
+
+def stock_moved(product, delta):
+    """Учёт движения, проведённого UPDATE ... SET quantity = quantity + delta"""
+    deltas = Deltas()
+    deltas.add_units(product.warehouse_id, product.category_id, product.price, delta)
+    deltas.apply()
+    state = getattr(product, '_valuation_state', None)
+    if state is not None and state is not UNKNOWN:
+        product._valuation_state = state[:3] + (state[3] + delta,)
+
+
+def totals():
+    """Сводка одним GROUP BY по таблице товаров: {(склад, категория): (товаров, единиц, стоимость)}"""
+    rows = (
+        Product.objects.order_by()
+        .values('warehouse_id', 'category_id')
+        .annotate(
+            items=Count('id'),
+            units=Coalesce(Sum('quantity'), 0),
+            value=Coalesce(Sum(F('price') * F('quantity'), output_field=VALUE_FIELD), Decimal(0),
+                           output_field=VALUE_FIELD),
+        )
+        .values_list('warehouse_id', 'category_id', 'items', 'units', 'value')
+    )
+    return {
+        (warehouse_id, category_id): (items, units, Decimal(value).quantize(CENT))
+        for warehouse_id, category_id, items, units, value in rows
+    }
+
+
+def drift():
+    """Группы, в которых сводка расходится с таблицей товаров: {группа: (в сводке, фактически)}"""
+    actual = totals()
+    stored = {
+        (warehouse_id, category_id): (items, units, Decimal(value).quantize(CENT))
+        for warehouse_id, category_id, items, units, value in InventoryValuation.objects.values_list(
+            'warehouse_id', 'category_id', 'item_count', 'units', 'value')
+        if items or units or value
+    }
+    empty = (0, 0, Decimal(0))
+    return {
+        group: (stored.get(group, empty), actual.get(group, empty))
+        for group in stored.keys() | actual.keys()
+        if stored.get(group, empty) != actual.get(group, empty)
+    }
+
+
+def rebuild():
+    """Полный пересчёт сводки; возвращает число групп"""
+    with transaction.atomic():
+        groups = totals()
+        InventoryValuation.objects.all().delete()
+        InventoryValuation.objects.bulk_create([
+            InventoryValuation(warehouse_id=warehouse_id, category_id=category_id,
+                               item_count=items, units=units, value=value)
+            for (warehouse_id, category_id), (items, units, value) in groups.items()
+        ], batch_size=1000)
+    return len(groups)
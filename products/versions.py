@@ -0,0 +1,24 @@
+"""Номера версий в общем кеше ``default``.
+
+Производные кеши (фрагменты шаблонов, снимок справочников) хранятся под
+ключами с номером версии. Увеличение номера сразу делает старые записи
+недоступными во всех процессах, без удаления каждого ключа.
+"""
+from django.core.cache import caches
+
+
+def get(key):
+    cache = caches['default']
+    version = cache.get(key)
+    if version is None:
+        cache.add(key, 1, timeout=None)
+        version = cache.get(key, 1)
+    return version
+
+
+def bump(key):
+    cache = caches['default']
+    try:
+        cache.incr(key)
+    except ValueError:
+        cache.set(key, 2, timeout=None)
@@ -1,84 +1,117 @@
-from django.db import IntegrityError
+import csv
+import json
+
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.http import HttpResponse, HttpResponseBadRequest, StreamingHttpResponse
 from django.shortcuts import render, redirect, get_object_or_404
 from django.contrib.auth.decorators import login_required, user_passes_test
 from django.contrib import messages
-from django.db.models import Q
+from django.db.models import Count, F, Max, Prefetch, Sum
 from django.views.decorators.http import require_POST
 from django.core.exceptions import PermissionDenied
 
-from .models import Product, Category, ProductDocument, Warehouse, generate_sku
-from .forms import ProductForm, DocumentUploadForm, RegistrationForm, CategoryForm, WarehouseForm
+from . import catalog, fragments, permissions, reference, stock
+from .conditional import conditional_page
+from .pagination import DEFAULT_ORDERING, InvalidCursor, KeysetPaginator
+from .querybudget import query_budget
+from .routers import use_primary
+from .models import Product, Category, InventoryValuation, ProductDocument, UserProfile, Warehouse
+from .forms import (ProductForm, DocumentUploadForm, RegistrationForm, CategoryForm, WarehouseForm,
+                    ProductImportForm)
+from .importers import ImportFormatError, ProductImporter, read_rows
 from django.contrib.auth import login
 from django.utils.html import format_html
 from django.urls import reverse
 from django.utils.safestring import mark_safe
 
+CATALOG_PAGE_SIZE = 24
+WAREHOUSE_PAGE_SIZE = 50
 
-@login_required
-def product_list(request):
-    """Страница каталога с фильтрами и управлением товарами"""
-    query = request.GET.get('q', '').strip()  # Убираем лишние пробелы
-    category_id = request.GET.get('category')
-    warehouse_id = request.GET.get('warehouse')
 
+def _keyset_page(request, queryset, per_page, ordering=DEFAULT_ORDERING):
+    """Страница товаров по курсору из GET-параметра ``cursor``"""
+    paginator = KeysetPaginator(queryset, per_page, ordering)
+    try:
+        return paginator.page(request.GET.get('cursor'))
+    except InvalidCursor:
+        return paginator.page()
 
 
-    # Базовый queryset
-    products = Product.objects.select_related('category', 'warehouse')
-    
-    # Для отладки - выведем все товары до фильтрации
-    all_products = list(Product.objects.all())
+def _changed_at(*values):
+    values = [value for value in values if value is not None]
+    return max(values) if values else None
 
 
-    # Фильтрация по складу
-    if warehouse_id:
-        products = products.filter(warehouse_id=warehouse_id)
-    elif not request.user.is_staff and hasattr(request.user, 'profile') and request.user.profile.warehouse:
-        products = products.filter(warehouse=request.user.profile.warehouse)
+def _catalog_state(request):
+    """Состояние каталога: одно агрегирование по отфильтрованным товарам, без поиска и ранжирования.
 
-    if query:
-        
-        # Поиск по отдельным полям для отладки
-        name_results = list(Product.objects.filter(name__icontains=query))
-        desc_results = list(Product.objects.filter(description__icontains=query))
-        sku_results = list(Product.objects.filter(sku__icontains=query))
-        cat_results = list(Product.objects.filter(category__name__icontains=query))
-        warehouse_results = list(Product.objects.filter(warehouse__name__icontains=query))
+    Результаты поиска и любая страница курсора — подмножество этих товаров,
+    а адрес страницы с ``q`` и ``cursor`` входит в ETag.
+    """
+    return _table_state(catalog.base_catalog(request))
 
 
-        # Разбиваем поисковый запрос на слова
-        search_terms = query.split()
-        
-        # Создаем пустой Q объект
-        search_query = Q()
-        # Для каждого слова добавляем условия поиска
-        for term in search_terms:
-            term_query = (
-                Q(name__icontains=term) |
-                Q(description__icontains=term) |
-                Q(sku__icontains=term) |
-                Q(category__name__icontains=term) |
-                Q(warehouse__name__icontains=term)
-            )
-            search_query |= term_query
-            print(f"\nПоиск по термину '{term}':")
-            print(f"SQL: {term_query}")
-            term_results = list(Product.objects.filter(term_query))
-            print(f"Найдено: {[p.name for p in term_results]}")
-        
-        products = products.filter(search_query)
-        
-        print(f"\nИтоговый SQL запрос: {products.query}")
-        print(f"Найдено товаров: {products.count()}")
-        print("Найденные товары:")
-        for p in products:
-            print(f"- {p.name} (категория: {p.category.name}, склад: {p.warehouse.name})")
-    
-    print("\n=== Конец обработки запроса ===")
+def _product_state_rows(pk):
+    # Срез, а не first(): строка одна, ORDER BY по ней добавил бы сортировку во временном B-дереве
+    return (
+        Product.objects.filter(pk=pk)
+        .annotate(documents_changed=Max('documents__uploaded_at'), document_count=Count('documents'))
+        .values_list('updated_at', 'category__updated_at', 'warehouse__updated_at',
+                     'documents_changed', 'document_count')[:1]
+    )
+
+
+def _product_state_from(rows):
+    if not rows:
+        return None
+    row = rows[0]
+    return _changed_at(*row[:4]), repr(row)
+
+
+def _product_state(request, pk):
+    return _product_state_from(list(_product_state_rows(pk)))
+
+
+def _state_aggregates(**extra):
+    # Удаление строки не обязательно меняет максимальный updated_at, поэтому в отпечатке и число строк
+    return {'changed': Max('updated_at'), 'count': Count('id'), **extra}
+
+
+def _aggregate_state(state):
+    return state['changed'], repr(sorted(state.items()))
+
+
+def _table_state(queryset, **extra):
+    """Состояние списка: время последнего изменения и число строк"""
+    return _aggregate_state(queryset.aggregate(**_state_aggregates(**extra)))
 
-    if category_id:
-        products = products.filter(category_id=category_id)
 
+def _employee_aggregates():
+    # Перевод сотрудника между складами меняет сумму, взвешенную по id профиля
+    return {'employees': Count('warehouse'), 'placement': Sum(F('warehouse_id') * F('id'))}
+
+
+def _warehouse_list_state(request):
+    """Состояние списка складов: склады, их товары и сотрудники тремя агрегатами.
+
+    Перевод сотрудника с одного склада на другой не меняет ни updated_at
+    складов, ни общее число сотрудников, но меняет счётчики на странице.
+    """
+    warehouses = Warehouse.objects.aggregate(**_state_aggregates())
+    products = Product.objects.aggregate(**_state_aggregates())
+    employees = UserProfile.objects.aggregate(**_employee_aggregates())
+    return _changed_at(warehouses['changed'], products['changed']), repr((
+        sorted(warehouses.items()), sorted(products.items()), sorted(employees.items()),
+    ))
+
+
+@query_budget(8)
+@login_required
+@conditional_page(_catalog_state)
+def product_list(request):
+    """Страница каталога с фильтрами и управлением товарами"""
     # Обработка действий с товарами (только для админов и менеджеров склада)
     if request.method == 'POST':
         action = request.POST.get('action')
@@ -87,14 +120,8 @@ def product_list(request):
         if action and product_id:
             product = get_object_or_404(Product, pk=product_id)
             
-            # Проверка прав на управление товаром
-            can_manage = (
-                request.user.is_staff or  # Админ может управлять всеми товарами
-                (hasattr(request.user, 'profile') and  # Менеджер может управлять только товарами своего склада
-                 request.user.profile.warehouse == product.warehouse)
-            )
-            
-            if not can_manage:
+            # Админ может управлять всеми товарами, менеджер — только товарами своего склада
+            if not permissions.can_manage(request.user, product):
                 raise PermissionDenied
             
             if action == 'delete':
@@ -109,38 +136,108 @@ def product_list(request):
             
             return redirect('product_list')
 
-    categories = Category.objects.all()
-    warehouses = Warehouse.objects.all() if request.user.is_staff else None
+    products, ordering = catalog.filter_catalog(request)
+    page = _keyset_page(request, products, CATALOG_PAGE_SIZE, ordering)
+    return render(request, 'products/list.html', _product_list_context(request, page))
 
-    return render(request, 'products/list.html', {
-        'products': products,
-        'categories': categories,
-        'warehouses': warehouses,
-        'search_query': query,
+
+def _product_list_context(request, page):
+    category_id = request.GET.get('category')
+    warehouse_id = request.GET.get('warehouse')
+    references = reference.snapshot()
+    return {
+        'products': page.object_list,
+        'page': page,
+        'categories': references.categories,
+        'warehouses': references.warehouses if request.user.is_staff else None,
+        'search_query': request.GET.get('q', '').strip(),
         'selected_category': int(category_id) if category_id else None,
         'selected_warehouse': int(warehouse_id) if warehouse_id else None,
         'is_staff': request.user.is_staff,
-    })
+        'card_role': fragments.card_role(request.user),
+        'fragment_version': fragments.get_version(),
+    }
+
+# Столбцы выгрузки совпадают со столбцами импорта, поэтому файл можно загрузить обратно
+EXPORT_COLUMNS = (
+    ('id', 'id'), ('sku', 'sku'), ('name', 'name'), ('description', 'description'),
+    ('category', 'category__name'), ('warehouse', 'warehouse__name'),
+    ('price', 'price'), ('quantity', 'quantity'), ('is_active', 'is_active'),
+    ('created_at', 'created_at'), ('updated_at', 'updated_at'),
+)
+EXPORT_CHUNK_SIZE = 2000
+
+
+class Echo:
+    """Псевдобуфер для csv.writer: возвращает строку вместо записи"""
+
+    def write(self, value):
+        return value
+
+
+def _export_columns(user):
+    """Столбцы выгрузки: артикул — только администраторам"""
+    return [(column, lookup) for column, lookup in EXPORT_COLUMNS if user.is_staff or column != 'sku']
+
 
+def _export_csv_rows(columns, rows):
+    writer = csv.writer(Echo())
+    # BOM, чтобы Excel открыл файл в UTF-8
+    yield '\ufeff' + writer.writerow(columns)
+    for row in rows:
+        yield writer.writerow(row)
+
+
+def _export_jsonl_rows(columns, rows):
+    for row in rows:
+        yield json.dumps(dict(zip(columns, row)), cls=DjangoJSONEncoder, ensure_ascii=False) + '\n'
+
+
+@query_budget(3)
+@login_required
+def export_products(request):
+    """Потоковая выгрузка каталога в CSV или JSON Lines с фильтрами каталога"""
+    export_format = request.GET.get('format', 'csv')
+    if export_format not in ('csv', 'jsonl'):
+        return HttpResponseBadRequest('Поддерживаются форматы csv и jsonl')
+
+    products, ordering = catalog.filter_catalog(request)
+    columns = _export_columns(request.user)
+    rows = (
+        products.order_by(*ordering)
+        .values_list(*(lookup for _, lookup in columns))
+        .iterator(chunk_size=EXPORT_CHUNK_SIZE)
+    )
+    columns = [column for column, _ in columns]
+
+    if export_format == 'csv':
+        response = StreamingHttpResponse(_export_csv_rows(columns, rows), content_type='text/csv; charset=utf-8')
+    else:
+        response = StreamingHttpResponse(_export_jsonl_rows(columns, rows),
+                                         content_type='application/x-ndjson; charset=utf-8')
+    response['Content-Disposition'] = f'attachment; filename="products.{export_format}"'
+    return response
+
+
+def _product_detail_queryset():
+    return Product.objects.select_related('category', 'warehouse').prefetch_related(
+        Prefetch('documents', queryset=ProductDocument.objects.select_related('uploaded_by'))
+    )
+
+
+@query_budget(6, POST=9)
 @login_required
+@conditional_page(_product_state)
 def product_detail(request, pk):
     """Детальная страница товара"""
-    product = get_object_or_404(Product.objects.prefetch_related('documents'), pk=pk)
-    
-    # Проверка прав на просмотр товара
-    can_view = (
-        request.user.is_staff or  # Админ может просматривать все товары
-        product.is_active or  # Активные товары видны всем
-        (hasattr(request.user, 'profile') and  # Менеджер может просматривать товары своего склада
-         request.user.profile.warehouse == product.warehouse)
-    )
+    product = get_object_or_404(_product_detail_queryset(), pk=pk)
     
-    if not can_view:
+    if not permissions.can_view(request.user, product):
         raise PermissionDenied
 
     documents = product.documents.all()
 
-    if request.method == 'POST' and request.user.is_authenticated:
+    if request.method == 'POST' and permissions.can_upload(request.user, product):
         form = DocumentUploadForm(request.POST, request.FILES, user=request.user)
         if form.is_valid():
             document = form.save(commit=False)
@@ -155,10 +252,12 @@ def product_detail(request, pk):
         'product': product,
         'documents': documents,
         'form': form,
+        'upload_chunk_size': settings.DOCUMENT_UPLOAD_CHUNK_SIZE,
     })
 
 
 
+@use_primary
 @login_required
 def profile(request):
     """Личный кабинет пользователя"""
@@ -194,7 +293,7 @@ def register(request):
 def add_product(request):
     """Добавление нового товара"""
     # Проверяем права доступа
-    if not (request.user.is_staff or request.user.role == 'manager'):
+    if not permissions.can_add(request.user):
         raise PermissionDenied("У вас нет прав на добавление товаров")
 
     # Получаем предустановленный склад из GET-параметра
@@ -203,7 +302,7 @@ def add_product(request):
     if warehouse_id:
         initial_warehouse = get_object_or_404(Warehouse, pk=warehouse_id)
         # Проверяем, что менеджер может добавлять товары только на свой склад
-        if request.user.role == 'manager' and request.user.profile.warehouse != initial_warehouse:
+        if request.user.role == 'manager' and not permissions.can_manage_warehouse(request.user, initial_warehouse.pk):
             raise PermissionDenied("Вы можете добавлять товары только на свой склад")
 
     if request.method == 'POST':
@@ -212,7 +311,9 @@ def add_product(request):
             product = form.save(commit=False)
             product.created_by = request.user
             try:
-                product.save()
+                with transaction.atomic():
+                    product.save()
+                    stock.record_opening_balances([product], request.user)
                 messages.success(request, f'Товар "{product.name}" успешно сохранен! SKU: {product.sku}')
                 # Если товар был создан со страницы склада, возвращаемся на страницу склада
                 if warehouse_id:
@@ -229,27 +330,60 @@ def add_product(request):
     })
 
 
+@login_required
+def import_products(request):
+    """Пакетный импорт товаров из CSV/XLSX"""
+    if not permissions.can_add(request.user):
+        raise PermissionDenied("У вас нет прав на добавление товаров")
+
+    result = None
+    if request.method == 'POST':
+        form = ProductImportForm(request.POST, request.FILES)
+        if form.is_valid():
+            try:
+                result = ProductImporter(request.user).run(read_rows(form.cleaned_data['file']))
+            except ImportFormatError as e:
+                form.add_error('file', str(e))
+            else:
+                if result.created:
+                    messages.success(request, f'Импортировано товаров: {result.created}')
+                if result.error_count:
+                    messages.error(request, f'Строк с ошибками: {result.error_count}')
+    else:
+        form = ProductImportForm()
+
+    return render(request, 'products/import.html', {
+        'form': form,
+        'result': result,
+        'title': 'Импорт товаров',
+    })
+
+
+@use_primary
 @login_required
 def edit_product(request, pk):
     """Редактирование товара"""
     product = get_object_or_404(Product, pk=pk)
     
-    # Проверка прав на редактирование товара
-    can_edit = (
-        request.user.is_staff or  # Админ может редактировать все товары
-        (hasattr(request.user, 'profile') and  # Менеджер может редактировать только товары своего склада
-         request.user.profile.warehouse == product.warehouse)
-    )
-    
-    if not can_edit:
+    # Админ может редактировать все товары, менеджер — только товары своего склада
+    if not permissions.can_manage(request.user, product):
         raise PermissionDenied
 
     if request.method == 'POST':
+        current_quantity = product.quantity
         form = ProductForm(request.POST, request.FILES, instance=product, user=request.user)
         if form.is_valid():
-            form.save()
-            messages.success(request, f'Товар "{product.name}" успешно обновлен!')
-            return redirect('product_list')
+            # Изменение количества проводится корректировкой от остатка, который видел пользователь,
+            # поэтому движения, проведённые за время редактирования, не теряются
+            seen_quantity = form.cleaned_data['quantity_seen']
+            try:
+                stock.save_product(form.save(commit=False),
+                                   current_quantity if seen_quantity is None else seen_quantity, request.user)
+            except stock.InsufficientStock as e:
+                form.add_error('quantity', str(e))
+            else:
+                messages.success(request, f'Товар "{product.name}" успешно обновлен!')
+                return redirect('product_list')
     else:
         form = ProductForm(instance=product, user=request.user)
 
@@ -265,14 +399,8 @@ def delete_product(request, pk):
     """Удаление товара"""
     product = get_object_or_404(Product, pk=pk)
     
-    # Проверка прав на удаление товара
-    can_delete = (
-        request.user.is_staff or  # Админ может удалять все товары
-        (hasattr(request.user, 'profile') and  # Менеджер может удалять только товары своего склада
-         request.user.profile.warehouse == product.warehouse)
-    )
-    
-    if not can_delete:
+    # Админ может удалять все товары, менеджер — только товары своего склада
+    if not permissions.can_manage(request.user, product):
         raise PermissionDenied
 
     product_name = product.name
@@ -283,6 +411,7 @@ def delete_product(request, pk):
 
 # categories
 @login_required
+@conditional_page(lambda request: _table_state(Category.objects.all()))
 def category_list(request):
     """Список категорий"""
     categories = Category.objects.all()
@@ -307,6 +436,7 @@ def category_add(request):
         'title': 'Добавление категории'
     })
 
+@use_primary
 @user_passes_test(lambda u: u.is_staff)
 def category_edit(request, pk):
     """Редактирование категории"""
@@ -341,28 +471,37 @@ def category_delete(request, pk):
     
     return redirect('category_list')
 
+@query_budget(6)
 @user_passes_test(lambda u: u.is_staff)
+@conditional_page(_warehouse_list_state)
 def warehouse_list(request):
     """Список складов"""
-    warehouses = Warehouse.objects.all()
+    warehouses = Warehouse.objects.with_counts()
     return render(request, 'warehouses/list.html', {
         'warehouses': warehouses,
         'title': 'Склады'
     })
 
+@query_budget(5)
 @user_passes_test(lambda u: u.is_staff)
 def warehouse_detail(request, pk):
     """Детальная информация о складе"""
-    warehouse = get_object_or_404(Warehouse, pk=pk)
-    products = Product.objects.filter(warehouse=warehouse)
-    employees = warehouse.employees.all()
-    
-    return render(request, 'warehouses/detail.html', {
+    warehouse = get_object_or_404(Warehouse.objects.with_counts(), pk=pk)
+    products = Product.objects.filter(warehouse=warehouse).select_related('category')
+    page = _keyset_page(request, products, WAREHOUSE_PAGE_SIZE)
+    employees = warehouse.employees.select_related('user')
+    return render(request, 'warehouses/detail.html', _warehouse_detail_context(warehouse, page, employees))
+
+
+def _warehouse_detail_context(warehouse, page, employees):
+    return {
         'warehouse': warehouse,
-        'products': products,
+        'products': page.object_list,
+        'page': page,
         'employees': employees,
+        'fragment_version': fragments.get_version(),
         'title': f'Склад: {warehouse.name}'
-    })
+    }
 
 @user_passes_test(lambda u: u.is_staff)
 def warehouse_create(request):
@@ -382,6 +521,7 @@ def warehouse_create(request):
         'edit_mode': False
     })
 
+@use_primary
 @user_passes_test(lambda u: u.is_staff)
 def warehouse_edit(request, pk):
     """Редактирование склада"""
@@ -423,3 +563,47 @@ def warehouse_delete(request, pk):
     messages.success(request, f'Склад "{name}" успешно удален!')
     return redirect('warehouse_list')
 
+
+# Отчёты
+VALUATION_COLUMNS = ('Склад', 'Категория', 'Товаров', 'Единиц', 'Стоимость')
+
+
+@query_budget(4)
+@user_passes_test(lambda u: u.is_staff)
+def valuation_report(request):
+    """Стоимость остатков по складам и категориям из сводки InventoryValuation"""
+    rows = (
+        InventoryValuation.objects.filter(item_count__gt=0)
+        .select_related('warehouse', 'category')
+        .order_by(F('warehouse__name').asc(nulls_last=True), 'category__name')
+    )
+    if request.GET.get('format') == 'csv':
+        writer = csv.writer(Echo())
+        lines = [writer.writerow(VALUATION_COLUMNS)] + [
+            writer.writerow([row.warehouse.name if row.warehouse else 'Без склада', row.category.name,
+                             row.item_count, row.units, row.value])
+            for row in rows
+        ]
+        response = HttpResponse('\ufeff' + ''.join(lines), content_type='text/csv; charset=utf-8')
+        response['Content-Disposition'] = 'attachment; filename="valuation.csv"'
+        return response
+
+    warehouses = {}
+    total = {'item_count': 0, 'units': 0, 'value': 0}
+    for row in rows:
+        warehouse = warehouses.setdefault(row.warehouse_id, {
+            'name': row.warehouse.name if row.warehouse else 'Без склада',
+            'rows': [], 'item_count': 0, 'units': 0, 'value': 0,
+        })
+        warehouse['rows'].append(row)
+        for summary in (warehouse, total):
+            summary['item_count'] += row.item_count
+            summary['units'] += row.units
+            summary['value'] += row.value
+
+    return render(request, 'reports/valuation.html', {
+        'warehouses': list(warehouses.values()),
+        'total': total,
+        'updated_at': max((row.updated_at for row in rows), default=None),
+        'title': 'Стоимость остатков',
+    })
@@ -1,10 +1,13 @@
 from django.contrib import admin
 from django.urls import path, include
 from django.conf import settings
-from django.conf.urls.static import static
 from django.contrib.auth import views as auth_views
 
+from products import downloads
+
 urlpatterns = [
     path('admin/', admin.site.urls),  # Стандартная админка
     path('', include('products.urls')),  # Все URL вашего приложения
-] + static(settings.MEDIA_URL, document_root=settings.MEDIA_ROOT)
\ No newline at end of file
+    # Медиафайлы отдаются с проверкой прав, а не через static()
+    path(f'{settings.MEDIA_URL.lstrip("/")}<path:name>', downloads.media_file, name='media_file'),
+]
\ No newline at end of file